@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+# Allow direct execution
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import glob
+import optparse
+import random
+import tempfile
+import timeit
+
+from yt_dlp import YoutubeDL
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.m3u8 import HlsPlaylist
+from yt_dlp.utils import match_filter_func
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def make_formats(count, seed=0):
+    """Generate formats resembling those of a YouTube video"""
+    rng = random.Random(seed)
+    formats = []
+    for i in range(count):
+        kind = rng.choice(('video', 'audio', 'both'))
+        height = rng.choice((144, 240, 360, 480, 720, 1080, 1440, 2160))
+        formats.append({
+            'format_id': str(i),
+            'url': f'https://example.com/{i}.{rng.choice(("mp4", "webm", "m3u8"))}',
+            'protocol': rng.choice(('https', 'm3u8_native', 'http_dash_segments')),
+            'ext': rng.choice(('mp4', 'webm')) if kind != 'audio' else rng.choice(('m4a', 'webm')),
+            'vcodec': rng.choice(('avc1.64001F', 'vp9', 'av01.0.05M.08')) if kind != 'audio' else 'none',
+            'acodec': rng.choice(('mp4a.40.2', 'opus')) if kind != 'video' else 'none',
+            'height': height if kind != 'audio' else None,
+            'width': height * 16 // 9 if kind != 'audio' else None,
+            'fps': rng.choice((24, 30, 60)) if kind != 'audio' else None,
+            'tbr': rng.uniform(50, 10000),
+            'filesize': rng.randrange(10 ** 5, 10 ** 9) if rng.random() > 0.3 else None,
+            'dynamic_range': rng.choice(('SDR', 'HDR10', None)),
+            'language': rng.choice(('en', 'de', None)),
+            'quality': rng.randrange(-1, 10),
+        })
+    return formats
+
+
+@benchmark
+def format_sort(options):
+    """Sort the formats of a video with InfoExtractor._sort_formats"""
+    ie = InfoExtractor(YoutubeDL({'quiet': True, 'format_sort': options.format_sort}))
+    formats = make_formats(options.size)
+
+    def run():
+        ie._sort_formats(list(formats))
+    return run
+
+
+@benchmark
+def match_filter(options):
+    """Filter flat playlist entries and videos with a --match-filter"""
+    match_filter = match_filter_func(options.match_filter or [
+        "!is_live & duration >? 2:00 & like_count >? 100 & title ~= '(?i)cats \\& dogs'"])
+    entries = [{
+        'id': str(i),
+        'title': f'Cats & Dogs {i}',
+        'duration': i * 10,
+        'like_count': i * 1000 if i % 2 else None,
+    } for i in range(options.size)]
+
+    def run():
+        for entry in entries:
+            match_filter(entry, incomplete=True)
+            match_filter(entry)
+    return run
+
+
+@benchmark
+def m3u8_formats(options):
+    """Extract the formats of the master playlists in test/testdata/m3u8"""
+    ie = InfoExtractor(YoutubeDL({'quiet': True}))
+    manifests = []
+    for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '../test/testdata/m3u8/*.m3u8'))):
+        with open(filename, encoding='utf-8') as f:
+            manifests.append(f.read())
+
+    def run():
+        for manifest in manifests:
+            ie._parse_m3u8_formats_and_subtitles(manifest, 'https://example.com/master.m3u8')
+    return run
+
+
+@benchmark
+def m3u8_segments(options):
+    """Parse a media playlist of --size segments and a refresh of it with one more segment"""
+    def make_playlist(first):
+        return '#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXT-X-MEDIA-SEQUENCE:%d\n%s' % (first, ''.join(
+            f'#EXT-X-KEY:METHOD=AES-128,URI="key{i // 100}"\n#EXTINF:6.000,\nsegment{i}.ts\n'
+            for i in range(first, first + options.size)))
+
+    playlist, refresh = make_playlist(0), make_playlist(1)
+
+    def run():
+        m3u8 = HlsPlaylist('https://example.com/index.m3u8')
+        m3u8.feed(playlist)
+        m3u8.feed(refresh)
+    return run
+
+
+@benchmark
+def cache_load(options):
+    """Load --size cached player functions, the way they are loaded for every YouTube video"""
+    ydl = YoutubeDL({'quiet': True, 'cachedir': tempfile.mkdtemp(prefix='yt-dlp-benchmark-')})
+    keys = [f'player-{i}' for i in range(options.size)]
+    for key in keys:
+        ydl.cache.store('youtube-nsig', key, ['a', 'var b=a.split("");' * 100])
+
+    def run():
+        for key in keys:
+            ydl.cache.load('youtube-nsig', key)
+    return run
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [OPTIONS] [BENCHMARK...]')
+    parser.add_option(
+        '-n', '--number', type=int, default=1000,
+        help='Number of times to run each benchmark (default: %default)')
+    parser.add_option(
+        '--size', type=int, default=100,
+        help='Size of the generated input, e.g. the number of formats (default: %default)')
+    parser.add_option(
+        '--format-sort', action='append', default=[],
+        help='Sort order used by format_sort. Can be used multiple times')
+    parser.add_option(
+        '--match-filter', action='append', default=[],
+        help='Filter used by match_filter. Can be used multiple times')
+    parser.add_option(
+        '--list', action='store_true', default=False,
+        help='List the available benchmarks')
+    options, args = parser.parse_args()
+
+    if options.list:
+        for name, func in BENCHMARKS.items():
+            print(f'{name}: {func.__doc__}')
+        return
+    for name in args:
+        if name not in BENCHMARKS:
+            parser.error(f'Unknown benchmark {name!r}. Use --list to see the available benchmarks')
+
+    for name in args or BENCHMARKS:
+        run = BENCHMARKS[name](options)
+        run()  # Warm up the caches
+        elapsed = timeit.timeit(run, number=options.number)
+        print(f'{name}: {elapsed / options.number * 1e6:.1f}us per run ({options.number} runs)')
+
+
+if __name__ == '__main__':
+    main()
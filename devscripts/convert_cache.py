@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+# Allow direct execution
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import optparse
+
+from yt_dlp.cache import convert_cache
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog SOURCE_DIR DESTINATION')
+    parser.add_option(
+        '--force', action='store_true', default=False,
+        help='Add the entries to the destination database if it already exists')
+    options, args = parser.parse_args()
+    if len(args) != 2:
+        parser.error('Expected the source cache directory and the destination database')
+
+    src, dest = args
+    if os.path.exists(dest) and not options.force:
+        parser.error(f'{dest} already exists. Use --force to add the entries to it')
+    print(f'Copied {convert_cache(src, dest)} entries to {dest}')
+
+
+if __name__ == '__main__':
+    main()
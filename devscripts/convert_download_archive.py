@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+# Allow direct execution
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import optparse
+
+from yt_dlp.archive import convert_download_archive
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog SOURCE DESTINATION')
+    parser.add_option(
+        '--force', action='store_true', default=False,
+        help='Add the IDs to the destination archive if it already exists')
+    options, args = parser.parse_args()
+    if len(args) != 2:
+        parser.error('Expected the source and destination archives')
+
+    src, dest = args
+    if os.path.exists(dest) and not options.force:
+        parser.error(f'{dest} already exists. Use --force to add the IDs to it')
+    print(f'{dest} now has {convert_download_archive(src, dest)} IDs')
+
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,7 @@ def main():
 
     _ALL_CLASSES = get_all_ies()  # Must be before import
 
+    from yt_dlp.extractor._dispatch import select_keys
     from yt_dlp.extractor.common import InfoExtractor, SearchInfoExtractor
 
     DummyInfoExtractor = type('InfoExtractor', (InfoExtractor,), {'IE_NAME': NO_ATTR})
@@ -44,6 +45,7 @@ def main():
         *extra_ie_code(DummyInfoExtractor),
         '\nclass LazyLoadSearchExtractor(LazyLoadExtractor):\n    pass\n',
         *build_ies(_ALL_CLASSES, (InfoExtractor, SearchInfoExtractor), DummyInfoExtractor),
+        build_dispatch_keys(select_keys(_ALL_CLASSES, {})),
     ))
 
     with open(lazy_extractors_filename, 'wt', encoding='utf-8') as f:
@@ -86,6 +88,13 @@ def build_ies(ies, bases, attr_base):
     yield f'\n_ALL_CLASSES = [{", ".join(names)}]'
 
 
+def build_dispatch_keys(keys):
+    """Store the keys used by ExtractorIndex so that _VALID_URL need not be parsed at runtime"""
+    items = ''.join(
+        f'\n    {ie.__name__!r}: {tuple(sorted(ie_keys)) if ie_keys else None!r},' for ie, ie_keys in keys.items())
+    return f'\n_DISPATCH_KEYS = {{{items}\n}}'
+
+
 def sort_ies(ies, ignored_bases):
     """find the correct sorting and add the required base classes so that subclasses can be correctly created"""
     classes, returned_classes = ies[:-1], set()
@@ -8,16 +8,20 @@
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+import datetime
 import http.server
 import threading
+import time
 
 from test.helper import FakeYDL, expect_dict, expect_value, http_server_port
+from yt_dlp import YoutubeDL
 from yt_dlp.compat import compat_etree_fromstring
 from yt_dlp.extractor import YoutubeIE, get_info_extractor
 from yt_dlp.extractor.common import InfoExtractor
 from yt_dlp.utils import (
     ExtractorError,
     RegexNotFoundError,
+    SegmentTemplateFragments,
     encode_data_uri,
     strip_jsonp,
 )
@@ -1387,6 +1391,58 @@ def test_parse_mpd_formats(self):
                 expect_value(self, formats, expected_formats, None)
                 expect_value(self, subtitles, expected_subtitles, None)
 
+    def test_parse_mpd_segment_timeline(self):
+        mpd_doc = compat_etree_fromstring(b'''<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT10H">
+  <Period>
+    <AdaptationSet mimeType="video/mp4">
+      <SegmentTemplate timescale="1000" initialization="$RepresentationID$/init.mp4" media="$RepresentationID$/$Time$.m4s">
+        <SegmentTimeline>
+          <S t="0" d="2000" r="17999"/>
+          <S d="1000"/>
+        </SegmentTimeline>
+      </SegmentTemplate>
+      <Representation id="v1" bandwidth="1000000" width="1280" height="720" codecs="avc1.64001f"/>
+    </AdaptationSet>
+  </Period>
+</MPD>''')
+        formats, _ = self.ie._parse_mpd_formats_and_subtitles(mpd_doc, mpd_url='https://example.com/manifest.mpd')
+        fragments = formats[0]['fragments']
+        self.assertIsInstance(fragments, SegmentTemplateFragments)
+        self.assertEqual(len(fragments), 18002)
+        self.assertEqual(fragments[0], {'path': 'v1/init.mp4'})
+        self.assertEqual(fragments[1], {'path': 'v1/0.m4s', 'duration': 2.0})
+        self.assertEqual(fragments[-1], {'path': 'v1/36000000.m4s', 'duration': 1.0})
+
+        # The fragments are written to the info json in their compact form
+        info = YoutubeDL.sanitize_info({'formats': formats}, True)
+        self.assertEqual(info['formats'][0]['fragments']['timeline'], [[0, 2000, 17999], [0, 1000, 0]])
+        self.assertEqual(
+            list(SegmentTemplateFragments.from_dict(info['formats'][0]['fragments'])), list(fragments))
+        info = FakeYDL().process_ie_result({
+            'id': 'test', 'title': 'test', 'extractor': 'test', 'webpage_url': 'https://example.com',
+            **info}, download=False)
+        self.assertEqual(list(info['fragments']), list(fragments))
+
+    def test_parse_mpd_live_availability(self):
+        availability_start_time = datetime.datetime.fromtimestamp(int(time.time()) - 101, datetime.timezone.utc)
+        mpd_doc = compat_etree_fromstring(f'''<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="dynamic" minimumUpdatePeriod="PT2S" timeShiftBufferDepth="PT30S"
+     availabilityStartTime="{availability_start_time:%Y-%m-%dT%H:%M:%SZ}">
+  <Period start="PT0S">
+    <AdaptationSet mimeType="video/mp4">
+      <SegmentTemplate timescale="1000" duration="2000" startNumber="1" media="$RepresentationID$/$Number$.m4s"/>
+      <Representation id="v1" bandwidth="1000000" codecs="avc1.64001f"/>
+    </AdaptationSet>
+  </Period>
+</MPD>'''.encode())
+        formats, _ = self.ie._parse_mpd_formats_and_subtitles(mpd_doc, mpd_url='https://example.com/manifest.mpd')
+        # 50 segments have been produced, of which the last 15 are still in the time shift buffer
+        fragments = formats[0]['fragments']
+        self.assertEqual(len(fragments), 15)
+        self.assertEqual(fragments[0], {'path': 'v1/36.m4s', 'duration': 2.0})
+        self.assertEqual(fragments[-1], {'path': 'v1/50.m4s', 'duration': 2.0})
+
     def test_parse_ism_formats(self):
         _TEST_CASES = [
             (
@@ -1603,6 +1659,31 @@ def test_parse_f4m_formats(self):
                 self.ie._sort_formats(formats)
                 expect_value(self, formats, expected_formats, None)
 
+    def test_sort_formats(self):
+        formats = [
+            {'format_id': 'low', 'url': 'http://example.com/low.mp4', 'height': 360, 'tbr': 500},
+            {'format_id': 'high', 'url': 'http://example.com/high.mp4', 'height': 1080, 'tbr': 3000},
+            {'format_id': 'mid', 'url': 'http://example.com/mid.webm', 'height': 720, 'tbr': 1500},
+        ]
+
+        def sort(*field_preference):
+            sorted_formats = [dict(f) for f in formats]
+            self.ie._sort_formats(sorted_formats, field_preference)
+            return [f['format_id'] for f in sorted_formats]
+
+        self.assertEqual(sort(), ['low', 'mid', 'high'])
+        format_sort = self.ie._format_sorts[((), (), False, False)]
+        self.assertEqual(sort('+res'), ['high', 'mid', 'low'])
+        self.assertEqual(sort('res:720'), ['high', 'low', 'mid'])
+        # The sort orders are reused and do not affect each other
+        self.assertEqual(sort(), ['low', 'mid', 'high'])
+        self.assertIs(self.ie._format_sorts[((), (), False, False)], format_sort)
+        self.assertEqual(len(self.ie._format_sorts), 3)
+
+        self.ie._downloader.params['format_sort'] = ['ext']
+        self.assertEqual(sort(), ['mid', 'low', 'high'])
+        self.assertEqual(len(self.ie._format_sorts), 4)
+
     def test_parse_xspf(self):
         _TEST_CASES = [
             (
@@ -1670,6 +1751,43 @@ def test_response_with_expected_status_returns_content(self):
             expected_status=TEAPOT_RESPONSE_STATUS)
         self.assertEqual(content, TEAPOT_RESPONSE_BODY)
 
+    def test_parallel_extraction_state(self):
+        # The fake IP of an extraction is not shared with the other threads
+        ie = DummyIE(FakeYDL({'geo_bypass_country': 'US'}))
+        ie.initialize()
+        ip, other_ips = ie._x_forwarded_for_ip, []
+
+        def extract():
+            other_ips.append(ie._x_forwarded_for_ip)
+            ie._x_forwarded_for_ip = '127.0.0.1'
+
+        thread = threading.Thread(target=extract)
+        thread.start()
+        thread.join()
+        self.assertEqual(other_ips, [None])
+        self.assertEqual(ie._x_forwarded_for_ip, ip)
+
+        # A slow initialization does not block the other extractors
+        started, release = threading.Event(), threading.Event()
+
+        class SlowIE(InfoExtractor):
+            def _real_initialize(self):
+                started.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=SlowIE(FakeYDL()).initialize)
+        thread.start()
+        try:
+            self.assertTrue(started.wait(5))
+            other = DummyIE(FakeYDL())
+            start = time.time()
+            other.initialize()
+            self.assertLess(time.time() - start, 1)
+            self.assertTrue(other._ready)
+        finally:
+            release.set()
+            thread.join()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -8,20 +8,29 @@
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+import _thread
 import copy
+import io
 import json
+import threading
+import time
 import urllib.error
 
-from test.helper import FakeYDL, assertRegexpMatches
+from test.helper import FakeYDL, assertRegexpMatches, try_rm
 from yt_dlp import YoutubeDL
+from yt_dlp.archive import open_download_archive
 from yt_dlp.compat import compat_os_name
+from yt_dlp.downloader.common import FileDownloader
 from yt_dlp.extractor import YoutubeIE
 from yt_dlp.extractor.common import InfoExtractor
 from yt_dlp.postprocessor.common import PostProcessor
 from yt_dlp.utils import (
+    DownloadError,
     ExtractorError,
     LazyList,
+    MaxDownloadsReached,
     OnDemandPagedList,
+    PostProcessingError,
     int_or_none,
     match_filter_func,
 )
@@ -309,6 +318,35 @@ def test_format_selection_string_ops(self):
         ydl = YDL({'format': '[format_id!*=-]'})
         self.assertRaises(ExtractorError, ydl.process_ie_result, info_dict.copy())
 
+    def test_format_selector_cache(self):
+        ydl = YDL()
+        selector = ydl.build_format_selector('bv*+ba/b')
+        self.assertIs(ydl.build_format_selector('bv*+ba/b'), selector)
+        ydl.params['allow_multiple_audio_streams'] = True
+        self.assertIsNot(ydl.build_format_selector('bv*+ba/b'), selector)
+
+        def select(format_spec, formats):
+            return [f['format_id'] for f in ydl.build_format_selector(format_spec)({
+                'formats': formats,
+                'has_merged_format': any('none' not in (f.get('acodec'), f.get('vcodec')) for f in formats),
+                'incomplete_formats': False,
+            })]
+
+        video = {'ext': 'mp4', 'acodec': 'none', 'vcodec': 'avc1', 'url': TEST_URL}
+        audio = {'ext': 'm4a', 'acodec': 'mp4a', 'vcodec': 'none', 'url': TEST_URL}
+        formats = [
+            {**audio, 'format_id': 'a1'}, {**video, 'format_id': 'v1'},
+            {**audio, 'format_id': 'a2'}, {**video, 'format_id': 'v2'},
+        ]
+        # The cached selector is reused for other formats
+        self.assertEqual(select('bv*+ba/b', formats), ['v2+a2'])
+        self.assertEqual(select('bv*+ba/b', formats[:2]), ['v1+a1'])
+        self.assertEqual(select('bv.2', formats), ['v1'])
+        self.assertEqual(select('wa.2', formats), ['a2'])
+        self.assertEqual(select('bv.3', formats), [])
+        self.assertEqual(select('b', formats), [])
+        self.assertEqual(select('mp4', formats), ['v2'])
+
     def test_youtube_format_selection(self):
         # FIXME: Rewrite in accordance with the new format sorting options
         return
@@ -739,6 +777,15 @@ def gen():
 
         # Empty filename
         test('%(foo|)s-%(bar|)s.%(ext)s', '-.mp4')
+
+        # Internal fields are hidden, whether or not the whole info_dict is used
+        info = {**self.outtmpl_info, '__postprocessors': ['pp'], '__pending_error': 'error'}
+        test('%(__postprocessors)s-%(__pending_error)s', 'NA-NA', info=info)
+        test('%()j', (lambda x: '__pending_error' not in x and 'duration_string' in x), info=info)
+
+        # Compiled templates are reused for other info_dicts
+        test('%(id)s-%(duration+10)d', '1234-100010')
+        test('%(id)s-%(duration+10)d', '5678-20', info={'id': '5678', 'duration': 10})
         # test('%(foo|)s.%(ext)s', ('.mp4', '_.mp4'))  # fixme
         # test('%(foo|)s', ('', '_'))  # fixme
 
@@ -925,14 +972,17 @@ def lazylist_entries(evaluated):
 
         def get_downloaded_info_dicts(params, entries):
             ydl = YDL(params)
-            ydl.process_ie_result({
-                '_type': 'playlist',
-                'id': 'test',
-                'extractor': 'test:playlist',
-                'extractor_key': 'test:playlist',
-                'webpage_url': 'http://example.com',
-                'entries': entries,
-            })
+            try:
+                ydl.process_ie_result({
+                    '_type': 'playlist',
+                    'id': 'test',
+                    'extractor': 'test:playlist',
+                    'extractor_key': 'test:playlist',
+                    'webpage_url': 'http://example.com',
+                    'entries': entries,
+                })
+            finally:
+                try_rm('test.info.json')
             return ydl.downloaded_info_dicts
 
         def test_selection(params, expected_ids, evaluate_all=False):
@@ -1108,7 +1158,10 @@ def _real_extract(self, url):
 
         ydl.add_info_extractor(VideoIE(ydl))
         ydl.add_info_extractor(PlaylistIE(ydl))
-        info = ydl.extract_info('playlist:')
+        try:
+            info = ydl.extract_info('playlist:')
+        finally:
+            try_rm('NA.info.json')
         entries = info['entries']
         self.assertEqual(len(entries), 3)
         self.assertTrue(entries[0] is None)
@@ -1123,6 +1176,230 @@ def _real_extract(self, url):
         self.assertEqual(downloaded['extractor'], 'Video')
         self.assertEqual(downloaded['extractor_key'], 'Video')
 
+    def test_parallel_videos(self):
+        class PlaylistIE(InfoExtractor):
+            _VALID_URL = r'playlist:'
+
+            def _real_extract(self, url):
+                return self.playlist_result([{
+                    'id': str(n),
+                    'title': f'Video {n}',
+                    'url': TEST_URL,
+                    'ext': 'mp4',
+                } for n in range(10)])
+
+        class _YDL(YoutubeDL):
+            active = max_active = 0
+            lock = threading.Lock()
+
+            def process_info(self, info_dict):
+                with self.lock:
+                    self.active += 1
+                    self.max_active = max(self.active, self.max_active)
+                self.to_screen(f'[test] Started {info_dict["id"]}')
+                # The later videos finish first
+                time.sleep((10 - int(info_dict['id'])) / 100)
+                self.to_screen(f'[test] Finished {info_dict["id"]}')
+                with self.lock:
+                    self.active -= 1
+                super().process_info(info_dict)
+
+        def run(params):
+            ydl = _YDL({'simulate': True, 'parallel_videos': 3, **params}, auto_init=False)
+            ydl._out_files.screen = ydl._out_files.out = io.StringIO()
+            ydl.add_info_extractor(PlaylistIE(ydl))
+            try:
+                info = ydl.extract_info('playlist:')
+            finally:
+                output = ydl._out_files.screen.getvalue()
+            return ydl, info, [line for line in output.splitlines() if line.startswith('[test]')]
+
+        ydl, info, output = run({})
+        self.assertEqual([entry['id'] for entry in info['entries']], [str(n) for n in range(10)])
+        self.assertEqual(output, [f'[test] {event} {n}' for n in range(10) for event in ('Started', 'Finished')])
+        self.assertEqual(ydl.max_active, 3)
+
+        class CountPP(PostProcessor):
+            processed = []
+
+            def run(self, info):
+                self.processed.append(info['id'])
+                return [], info
+
+        ydl = _YDL({'simulate': True, 'parallel_videos': 3, 'max_downloads': 4, 'quiet': True}, auto_init=False)
+        ydl.add_info_extractor(PlaylistIE(ydl))
+        ydl.add_post_processor(CountPP(), when='after_video')
+        self.assertRaises(MaxDownloadsReached, ydl.extract_info, 'playlist:')
+        self.assertEqual(ydl._num_downloads, 4)
+        # The videos that were not started because of the limit are not post-processed
+        self.assertEqual(len(CountPP.processed), 4)
+
+    def test_parallel_videos_interrupted(self):
+        events, lock = [], threading.Lock()
+        ydl = YoutubeDL({'parallel_videos': 2, 'quiet': True})
+
+        def download(item):
+            with lock:
+                events.append(('start', item))
+            try:
+                fd = FileDownloader(ydl, {})
+                while True:
+                    fd._hook_progress({'status': 'downloading'}, {})
+                    time.sleep(0.01)
+            finally:
+                time.sleep(0.1)
+                with lock:
+                    events.append(('stop', item))
+
+        threading.Timer(0.2, _thread.interrupt_main).start()
+        with self.assertRaises(KeyboardInterrupt):
+            for _ in ydl._process_concurrently(download, range(5)):
+                pass
+        # The downloads in progress are stopped and waited for, and no more are started
+        self.assertEqual(sorted(events), [('start', 0), ('start', 1), ('stop', 0), ('stop', 1)])
+        self.assertFalse(ydl._interrupted.is_set())
+
+    def test_postprocessing_queue(self):
+        events, lock = [], threading.Lock()
+
+        def record(*event):
+            with lock:
+                events.append(event)
+
+        class _YDL(YoutubeDL):
+            def dl(self, name, info, *args, **kwargs):
+                record('download', info['id'], threading.current_thread().name)
+                time.sleep(0.01)
+                with open(name, 'w') as f:
+                    f.write(info['id'])
+                return True, True
+
+        class SlowPP(PostProcessor):
+            def run(self, info):
+                record('start', info['id'], threading.current_thread().name)
+                time.sleep(0.1)
+                if info['id'] == 'error':
+                    raise PostProcessingError('Failed')
+                record('end', info['id'], threading.current_thread().name)
+                return [], info
+
+        def run(ids, queue_size=2, **params):
+            events.clear()
+            ydl = _YDL({
+                'postprocessing_queue': queue_size,
+                'outtmpl': 'pp-queue-%(id)s.%(ext)s',
+                'download_archive': archive,
+                'quiet': True,
+                'noprogress': True,
+                **params,
+            })
+            ydl.add_post_processor(SlowPP())
+            try:
+                return ydl.process_ie_result({
+                    '_type': 'playlist',
+                    'id': 'test',
+                    'extractor': 'test:playlist',
+                    'extractor_key': 'test:playlist',
+                    'webpage_url': 'http://example.com',
+                    'entries': [{
+                        'id': video_id,
+                        'title': video_id,
+                        'url': TEST_URL,
+                        'ext': 'mp4',
+                    } for video_id in ids],
+                })
+            finally:
+                for video_id in ids:
+                    try_rm(f'pp-queue-{video_id}.mp4')
+
+        archive = set()
+        result = run('123456')
+        # The results are complete once the playlist is done
+        self.assertEqual(
+            [os.path.basename(entry['requested_downloads'][0]['filepath']) for entry in result['entries']],
+            [f'pp-queue-{n}.mp4' for n in '123456'])
+        self.assertEqual(archive, {f'test:playlist {n}' for n in '123456'})
+        # Post-processed in order, in the background
+        self.assertEqual([video_id for event, video_id, _ in events if event == 'end'], list('123456'))
+        self.assertEqual({thread for event, _, thread in events if event != 'download'}, {'PostProcessing_0'})
+        self.assertNotIn('PostProcessing_0', {thread for event, _, thread in events if event == 'download'})
+        # The next videos are downloaded during the post-processing, with at most 2 of them waiting
+        waiting = [
+            sum(e == 'download' for e, _, _ in events[:i]) - sum(e == 'start' for e, _, _ in events[:i])
+            for i, (event, _, _) in enumerate(events) if event == 'download']
+        self.assertEqual(max(waiting), 2)
+
+        # The error is raised in the main thread, and the later downloads are not post-processed
+        archive = set()
+        self.assertRaises(DownloadError, run, ('1', 'error', '3', '4', '5', '6'), 1)
+        self.assertNotIn('5', [video_id for event, video_id, _ in events if event == 'start'])
+        self.assertEqual(archive, {'test:playlist 1'})
+
+        # A video that failed to be post-processed is not recorded, even when the archive is forced
+        archive = set()
+        run(('error', ), ignoreerrors='only_download', force_write_download_archive=True)
+        self.assertEqual(archive, set())
+
+        # A video is post-processed once it is processed, even while another thread processes a playlist
+        events.clear()
+        ydl = _YDL({'postprocessing_queue': 2, 'outtmpl': 'pp-queue-%(id)s.%(ext)s', 'quiet': True, 'noprogress': True})
+        ydl.add_post_processor(SlowPP())
+
+        def process(ie_result):
+            ydl.process_ie_result({
+                'extractor': 'test', 'extractor_key': 'test', 'webpage_url': 'http://example.com', **ie_result})
+            record('returned', ie_result['id'], threading.current_thread().name)
+
+        playlist = threading.Thread(target=process, args=({'_type': 'playlist', 'id': 'test', 'entries': [
+            {'id': video_id, 'title': video_id, 'url': TEST_URL, 'ext': 'mp4'} for video_id in '123']}, ))
+        try:
+            playlist.start()
+            time.sleep(0.05)
+            process({'id': 'single', 'title': 'single', 'url': TEST_URL, 'ext': 'mp4'})
+            playlist.join()
+        finally:
+            for video_id in ('1', '2', '3', 'single'):
+                try_rm(f'pp-queue-{video_id}.mp4')
+        self.assertLess(events.index(('end', 'single', 'PostProcessing_0')),
+                        [event[:2] for event in events].index(('returned', 'single')))
+
+        class VideoIE(InfoExtractor):
+            _VALID_URL = r'video:(?P<id>.+)'
+
+            def _real_extract(self, url):
+                video_id = self._match_id(url)
+                if video_id == 'error':
+                    raise ExtractorError('Failed', expected=True)
+                return {'id': video_id, 'title': video_id, 'url': TEST_URL, 'ext': 'mp4'}
+
+        # The top-level URLs are downloaded during the post-processing of the previous ones
+        events.clear()
+        ydl = _YDL({'postprocessing_queue': 2, 'outtmpl': 'pp-queue-%(id)s.%(ext)s', 'quiet': True, 'noprogress': True},
+                   auto_init=False)
+        ydl.add_info_extractor(VideoIE(ydl))
+        ydl.add_post_processor(SlowPP())
+        try:
+            ydl.download(['video:1', 'video:2', 'video:3'])
+        finally:
+            for video_id in '123':
+                try_rm(f'pp-queue-{video_id}.mp4')
+        self.assertEqual([video_id for event, video_id, _ in events if event == 'end'], list('123'))
+        self.assertLess(events.index(('download', '2', 'MainThread')), events.index(('end', '1', 'PostProcessing_0')))
+
+        # After an error, the queued post-processing is done before the archive is closed
+        try_rm('pp-queue.db')
+        try:
+            with self.assertRaises(DownloadError), _YDL({
+                    'postprocessing_queue': 2, 'outtmpl': 'pp-queue-%(id)s.%(ext)s', 'download_archive': 'pp-queue.db',
+                    'quiet': True, 'noprogress': True}, auto_init=False) as ydl:
+                ydl.add_info_extractor(VideoIE(ydl))
+                ydl.add_post_processor(SlowPP())
+                ydl.download(['video:1', 'video:2', 'video:error'])
+            self.assertEqual(set(open_download_archive('pp-queue.db')), {'video 1', 'video 2'})
+        finally:
+            for filename in ('pp-queue.db', 'pp-queue.db-wal', 'pp-queue.db-shm', 'pp-queue-1.mp4', 'pp-queue-2.mp4'):
+                try_rm(filename)
+
 
 if __name__ == '__main__':
     unittest.main()
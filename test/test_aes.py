@@ -112,6 +112,33 @@ def test_ecb_decrypt(self):
         decrypted = intlist_to_bytes(aes_ecb_decrypt(data, self.key, self.iv))
         self.assertEqual(decrypted.rstrip(b'\x08'), self.secret_msg)
 
+    def test_gcm_decrypt_block_aligned(self):
+        # Test case 3 of the GCM specification
+        key = bytes.fromhex('feffe9928665731c6d6a8f9467308308')
+        nonce = bytes.fromhex('cafebabefacedbaddecaf888')
+        data = bytes.fromhex(
+            '42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e'
+            '21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091473f5985')
+        authentication_tag = bytes.fromhex('4d5c2af327cd64a62cf35abd2ba6fab4')
+        expected = bytes.fromhex(
+            'd9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a72'
+            '1c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b391aafd255')
+
+        self.assertEqual(aes_gcm_decrypt_and_verify_bytes(data, key, authentication_tag, nonce), expected)
+        self.assertRaises(
+            ValueError, aes_gcm_decrypt_and_verify_bytes, data, key, authentication_tag[::-1], nonce)
+
+    def test_cbc_multiple_blocks(self):
+        data = bytes(range(256)) * 4
+        for key in (bytes(range(16)), bytes(range(24)), bytes(range(32))):
+            encrypted = aes_cbc_encrypt(bytes_to_intlist(data), bytes_to_intlist(key), self.iv)
+            self.assertEqual(len(encrypted), len(data))
+            decrypted = aes_cbc_decrypt_bytes(intlist_to_bytes(encrypted), key, intlist_to_bytes(self.iv))
+            self.assertEqual(decrypted, data)
+            self.assertEqual(aes_cbc_encrypt([], bytes_to_intlist(key), self.iv), [])
+            self.assertEqual(intlist_to_bytes(aes_ecb_decrypt(aes_ecb_encrypt(
+                bytes_to_intlist(data), bytes_to_intlist(key)), bytes_to_intlist(key))), data)
+
 
 if __name__ == '__main__':
     unittest.main()
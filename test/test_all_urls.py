@@ -12,6 +12,7 @@
 
 from test.helper import gettestcases
 from yt_dlp.extractor import FacebookIE, YoutubeIE, gen_extractors
+from yt_dlp.extractor._dispatch import ExtractorIndex
 
 
 class TestAllURLsMatching(unittest.TestCase):
@@ -82,6 +83,21 @@ def test_no_duplicates(self):
                         ie.suitable(url),
                         f'{type(ie).__name__} should not match URL {url!r} . That URL belongs to {tc["name"]}.')
 
+    def test_extractor_index(self):
+        ies = {ie.ie_key(): ie for ie in self.ies}
+        index = ExtractorIndex(ies)
+        for tc in gettestcases(include_onlymatching=True):
+            url = tc['url']
+            self.assertIn(tc['name'], dict(index.candidates(url)), f'Index should yield {tc["name"]}IE for URL {url!r}')
+
+        def first_suitable(url):
+            return next(ie_key for ie_key, ie in index.candidates(url) if ie.suitable(url))
+
+        self.assertEqual(first_suitable('ytsearch5:test'), 'YoutubeSearch')
+        self.assertEqual(first_suitable('https://www.YouTube.com/watch?v=BaW_jenozKc'), 'Youtube')
+        self.assertEqual(first_suitable('https://example.com/video'), 'Generic')
+        self.assertLess(len(list(index.candidates('https://example.com/video'))), len(ies) // 10)
+
     def test_keywords(self):
         self.assertMatch(':ytsubs', ['youtube:subscriptions'])
         self.assertMatch(':ytsubscriptions', ['youtube:subscriptions'])
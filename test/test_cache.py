@@ -8,10 +8,13 @@
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+import concurrent.futures
 import shutil
+import time
+import unittest.mock
 
-from test.helper import FakeYDL
-from yt_dlp.cache import Cache
+from test.helper import FakeYDL, try_rm
+from yt_dlp.cache import Cache, SQLiteCacheStore, convert_cache
 
 
 def _is_empty(d):
@@ -23,17 +26,27 @@ def _mkdir(d):
         os.mkdir(d)
 
 
+def _store(cachedir, keys):
+    c = Cache(FakeYDL({'cachedir': cachedir}))
+    for key in keys:
+        c.store('test_cache', key, {'key': key})
+    c.close()
+
+
 class TestCache(unittest.TestCase):
     def setUp(self):
         TEST_DIR = os.path.dirname(os.path.abspath(__file__))
         TESTDATA_DIR = os.path.join(TEST_DIR, 'testdata')
         _mkdir(TESTDATA_DIR)
         self.test_dir = os.path.join(TESTDATA_DIR, 'cache_test')
+        self.test_db = os.path.join(TESTDATA_DIR, 'cache_test.sqlite')
         self.tearDown()
 
     def tearDown(self):
         if os.path.exists(self.test_dir):
             shutil.rmtree(self.test_dir)
+        for suffix in ('', '-wal', '-shm'):
+            try_rm(self.test_db + suffix)
 
     def test_cache(self):
         ydl = FakeYDL({
@@ -52,6 +65,146 @@ def test_cache(self):
         self.assertFalse(os.path.exists(self.test_dir))
         self.assertEqual(c.load('test_cache', 'k.'), None)
 
+    def test_cache_memory(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+        })
+        c = Cache(ydl)
+        obj = {'x': [1, 2]}
+        c.store('test_cache', 'k', obj)
+        c.load('test_cache', 'k')['x'].append(3)
+        # Entries are served from memory, but are not shared with the callers
+        self.assertEqual(c.load('test_cache', 'k'), obj)
+        self.assertEqual(Cache(ydl).load('test_cache', 'k'), obj)
+        self.assertEqual(c.load('test_cache', 'missing'), None)
+        self.assertEqual(
+            {k: v for k, v in c.stats.items() if k != 'bytes_written'},
+            {'memory_hits': 2, 'disk_hits': 0, 'misses': 1, 'bytes_read': 0, 'evictions': 0})
+        self.assertEqual(c.stats['bytes_written'], len(b'{"x": [1, 2]}'))
+
+    def test_cache_expiry(self):
+        class TTLCache(Cache):
+            _SECTION_TTLS = {'test_ttl': 60}
+
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+        })
+        TTLCache(ydl).store('test_ttl', 'k', 1)
+        TTLCache(ydl).store('test_cache', 'k', 1)
+        old = time.time() - 120
+        for section in ('test_ttl', 'test_cache'):
+            os.utime(os.path.join(self.test_dir, section, 'k.json'), (old, old))
+        c = TTLCache(ydl)
+        self.assertEqual(c.load('test_ttl', 'k'), None)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'test_ttl', 'k.json')))
+        self.assertEqual(c.load('test_cache', 'k'), 1)
+
+        # Failing to remove an expired entry, e.g. from a locked database, is only a warning
+        TTLCache(ydl).store('test_ttl', 'k', 1)
+        os.utime(os.path.join(self.test_dir, 'test_ttl', 'k.json'), (old, old))
+        c = TTLCache(ydl)
+        ydl.expect_warning('Unable to remove test_ttl.k from cache')
+        with unittest.mock.patch.object(c._get_store(), 'delete', side_effect=OSError('database is locked')):
+            self.assertEqual(c.load('test_ttl', 'k'), None)
+
+    def test_cache_eviction(self):
+        class SmallCache(Cache):
+            _MAX_DISK_SIZE = 350
+
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+        })
+        # The files of other applications are neither counted nor removed
+        foreign_files = [os.path.join(self.test_dir, 'test_cache', 'foreign.bin'),
+                         os.path.join(self.test_dir, 'test_cache', 'foreign key.json'),
+                         os.path.join(self.test_dir, 'other app', 'k.json')]
+        for fn in foreign_files:
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            with open(fn, 'wb') as f:
+                f.write(b'x' * 1000)
+            os.utime(fn, (0, 0))
+        c = SmallCache(ydl)
+        for i in range(3):
+            c.store('test_cache', f'k{i}', 'x' * 98)
+            fn = os.path.join(self.test_dir, 'test_cache', f'k{i}.json')
+            os.utime(fn, (time.time() - 10 + i, time.time() - 10 + i))
+        # The least recently used entry is removed
+        self.assertEqual(SmallCache(ydl).load('test_cache', 'k0'), 'x' * 98)
+        c.store('test_cache', 'k3', 'x' * 98)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.test_dir, 'test_cache'))), [
+            'foreign key.json', 'foreign.bin', 'k0.json', 'k2.json', 'k3.json'])
+        self.assertEqual(c.stats['evictions'], 1)
+        self.assertEqual(c.load('test_cache', 'k1'), None)
+        self.assertTrue(all(map(os.path.exists, foreign_files)))
+
+    def test_cache_section_eviction(self):
+        for cachedir in (self.test_dir, self.test_db):
+            ydl = FakeYDL({
+                'cachedir': cachedir,
+                'cache_max_size': 250,
+                'cache_section_max_sizes': {'http': 250},
+            })
+            c = Cache(ydl)
+            for i in range(2):
+                c.store('test_cache', f'k{i}', 'x' * 98)
+            # The HTTP responses only evict each other
+            for i in range(3):
+                c.store('http', f'k{i}', 'x' * 98)
+            self.assertEqual(c.stats['evictions'], 1)
+            c = Cache(ydl)
+            self.assertEqual([c.load('test_cache', f'k{i}') for i in range(2)], ['x' * 98] * 2)
+            self.assertEqual(c.load('http', 'k0'), None)
+            self.assertEqual([c.load('http', f'k{i}') for i in (1, 2)], ['x' * 98] * 2)
+            c.store('test_cache', 'k2', 'x' * 98)
+            self.assertEqual(c.load('test_cache', 'k0'), None)
+            self.assertEqual([c.load('http', f'k{i}') for i in (1, 2)], ['x' * 98] * 2)
+            c.remove()
+            c.close()
+
+    def test_cache_ttls_param(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+            'cache_ttls': {'test_cache': 60},
+        })
+        Cache(ydl).store('test_cache', 'k', 1)
+        old = time.time() - 120
+        os.utime(os.path.join(self.test_dir, 'test_cache', 'k.json'), (old, old))
+        self.assertEqual(Cache(ydl).load('test_cache', 'k'), None)
+
+    def test_sqlite_cache(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_db,
+        })
+        c = Cache(ydl)
+        obj = {'x': 1, 'y': ['ä', '\\a', True]}
+        self.assertEqual(c.load('test_cache', 'k.'), None)
+        c.store('test_cache', 'k.', obj)
+        self.assertIsInstance(c._get_store(), SQLiteCacheStore)
+        self.assertFalse(os.path.exists(self.test_dir))
+        self.assertEqual(Cache(ydl).load('test_cache', 'k.'), obj)
+        self.assertEqual(Cache(ydl).load('test_cache2', 'k.'), None)
+        c.remove()
+        self.assertEqual(Cache(ydl).load('test_cache', 'k.'), None)
+        c.close()
+
+    def test_sqlite_cache_concurrent(self):
+        keys = [f'k{i}' for i in range(200)]
+        with concurrent.futures.ProcessPoolExecutor(4) as pool:
+            list(pool.map(_store, [self.test_db] * 4, [keys[i::4] for i in range(4)]))
+        c = Cache(FakeYDL({'cachedir': self.test_db}))
+        self.assertEqual([c.load('test_cache', key) for key in keys], [{'key': key} for key in keys])
+        c.close()
+
+    def test_convert_cache(self):
+        _store(self.test_dir, ['k1', 'k2'])
+        with open(os.path.join(self.test_dir, 'test_cache', 'broken.json'), 'w') as f:
+            f.write('{')
+        self.assertEqual(convert_cache(self.test_dir, self.test_db), 2)
+        c = Cache(FakeYDL({'cachedir': self.test_db}))
+        self.assertEqual(c.load('test_cache', 'k2'), {'key': 'k2'})
+        self.assertEqual(c.load('test_cache', 'broken'), None)
+        c.close()
+
 
 if __name__ == '__main__':
     unittest.main()
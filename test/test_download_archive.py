@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# Allow direct execution
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import concurrent.futures
+
+from test.helper import try_rm
+from yt_dlp.archive import (
+    SQLiteArchive,
+    TextArchive,
+    convert_download_archive,
+    open_download_archive,
+)
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _add(filename, vid_ids):
+    archive = open_download_archive(filename)
+    try:
+        for vid_id in vid_ids:
+            archive.add(vid_id)
+    finally:
+        archive.close()
+
+
+class TestDownloadArchive(unittest.TestCase):
+    def setUp(self):
+        self.text_fn = os.path.join(TEST_DIR, 'testdata', 'archive_test.txt')
+        self.sqlite_fn = os.path.join(TEST_DIR, 'testdata', 'archive_test.sqlite')
+        self.tearDown()
+
+    def tearDown(self):
+        for fn in (self.text_fn, self.sqlite_fn):
+            for suffix in ('', '-wal', '-shm'):
+                try_rm(fn + suffix)
+
+    def assertArchive(self, filename, backend, vid_ids):
+        archive = open_download_archive(filename)
+        try:
+            self.assertIsInstance(archive, backend)
+            self.assertEqual(sorted(archive), sorted(vid_ids))
+            for vid_id in vid_ids:
+                self.assertIn(vid_id, archive)
+            self.assertNotIn('youtube other', archive)
+        finally:
+            archive.close()
+
+    def test_text(self):
+        _add(self.text_fn, ['youtube a', 'youtube b', 'youtube a'])
+        with open(self.text_fn, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'youtube a\nyoutube b\n')
+        self.assertArchive(self.text_fn, TextArchive, ['youtube a', 'youtube b'])
+
+    def test_sqlite(self):
+        _add(self.sqlite_fn, ['youtube a', 'youtube b', 'youtube a'])
+        self.assertArchive(self.sqlite_fn, SQLiteArchive, ['youtube a', 'youtube b'])
+        # Detected by the contents regardless of the extension
+        os.replace(self.sqlite_fn, self.text_fn)
+        self.assertArchive(self.text_fn, SQLiteArchive, ['youtube a', 'youtube b'])
+
+    def test_sqlite_concurrent(self):
+        vid_ids = [f'youtube {i}' for i in range(400)]
+        with concurrent.futures.ProcessPoolExecutor(4) as pool:
+            list(pool.map(_add, [self.sqlite_fn] * 4, [vid_ids[i::4] for i in range(4)]))
+        self.assertArchive(self.sqlite_fn, SQLiteArchive, vid_ids)
+
+    def test_convert(self):
+        with open(self.text_fn, 'w', encoding='utf-8') as f:
+            f.write('youtube a\n\nyoutube b\nyoutube a\n')
+        self.assertEqual(convert_download_archive(self.text_fn, self.sqlite_fn), 2)
+        self.assertArchive(self.sqlite_fn, SQLiteArchive, ['youtube a', 'youtube b'])
+        os.remove(self.text_fn)
+        self.assertEqual(convert_download_archive(self.sqlite_fn, self.text_fn), 2)
+        self.assertArchive(self.text_fn, TextArchive, ['youtube a', 'youtube b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
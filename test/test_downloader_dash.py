@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# Allow direct execution
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import datetime
+import http.server
+import re
+import threading
+import time
+
+from test.helper import http_server_port, try_rm
+from yt_dlp import YoutubeDL
+from yt_dlp.downloader import get_suitable_downloader
+from yt_dlp.downloader.dash import DashSegmentsFD
+from yt_dlp.utils import encodeFilename
+
+
+class FakeLogger:
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+class LiveManifest:
+    """A live manifest of 50ms segments, with a time shift buffer of 10 segments, that ends after 50 segments"""
+
+    def __init__(self):
+        # Between 20 and 40 segments are already available
+        self.availability_start_time = int(time.time()) - 1
+
+    def __call__(self):
+        ended = time.time() - self.availability_start_time > 2.5
+        attributes = 'type="static" mediaPresentationDuration="PT2.5S"' if ended else (
+            'type="dynamic" minimumUpdatePeriod="PT0.1S" timeShiftBufferDepth="PT0.5S" availabilityStartTime="%s"'
+            % datetime.datetime.fromtimestamp(self.availability_start_time, datetime.timezone.utc).isoformat())
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" {attributes}>
+  <Period start="PT0S">
+    <AdaptationSet mimeType="video/mp4">
+      <SegmentTemplate timescale="1000" duration="50" initialization="init-$RepresentationID$.mp4"
+                       media="$RepresentationID$-$Number$.m4s"/>
+      <Representation id="v1" bandwidth="1000000" codecs="avc1.64001f"/>
+    </AdaptationSet>
+    <AdaptationSet mimeType="audio/mp4">
+      <SegmentTemplate timescale="1000" duration="50" initialization="init-$RepresentationID$.mp4"
+                       media="$RepresentationID$-$Number$.m4s"/>
+      <Representation id="a1" bandwidth="128000" codecs="mp4a.40.2"/>
+    </AdaptationSet>
+  </Period>
+</MPD>'''
+
+
+def make_handler(manifest):
+    class HTTPTestRequestHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/live.mpd':
+                content = manifest().encode()
+            else:
+                content = f'[{self.path[1:].split(".")[0]}]'.encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    return HTTPTestRequestHandler
+
+
+class TestLiveDashSegmentsFD(unittest.TestCase):
+    def test_live(self):
+        params = {'logger': FakeLogger(), 'external_downloader': {'dash': 'native'}}
+        ydl = YoutubeDL(params)
+        ie = ydl.get_info_extractor('Generic')
+        httpd = http.server.HTTPServer(('127.0.0.1', 0), make_handler(LiveManifest()))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        formats = ie._extract_mpd_formats(
+            'http://127.0.0.1:%d/live.mpd' % http_server_port(httpd), 'live')
+        filenames = [f'testfile.f{f["format_id"]}.mp4' for f in formats]
+        info_dict = {
+            'id': 'live', 'ext': 'mp4', 'is_live': True, 'url': formats[0]['url'],
+            'protocol': 'http_dash_segments+http_dash_segments',
+            'requested_formats': [{**f, 'filepath': filename} for f, filename in zip(formats, filenames)],
+        }
+        # The formats are followed together by the native downloader
+        self.assertIs(get_suitable_downloader(info_dict, params), DashSegmentsFD)
+        self.assertIsNot(get_suitable_downloader(info_dict, {}), DashSegmentsFD)
+
+        try:
+            self.assertTrue(DashSegmentsFD(ydl, params).real_download('testfile.mp4', info_dict))
+            for format_id, filename in zip(('v1', 'a1'), filenames):
+                with open(encodeFilename(filename)) as f:
+                    init, *segments = re.findall(r'\[([^]]+)\]', f.read())
+                self.assertEqual(init, f'init-{format_id}')
+                # Starts 3 segments from the live edge, and downloads every new segment once
+                first = int(segments[0].split('-')[1])
+                self.assertTrue(18 <= first <= 38, segments)
+                self.assertEqual(segments, [f'{format_id}-{i}' for i in range(first, 51)])
+        finally:
+            httpd.shutdown()
+            for filename in filenames:
+                try_rm(encodeFilename(filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+
+# Allow direct execution
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import concurrent.futures
+import glob
+import http.server
+import io
+import json
+import threading
+import time
+
+from test.helper import http_server_port, try_rm
+from yt_dlp import YoutubeDL
+from yt_dlp.aes import aes_cbc_encrypt
+from yt_dlp.downloader.dash import DashSegmentsFD
+from yt_dlp.downloader.fragment import (
+    ConcurrencyController,
+    FragmentFD,
+    FragmentProgress,
+)
+from yt_dlp.utils import bytes_to_intlist, intlist_to_bytes
+
+
+class FakeLogger:
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+class HedgingFragmentFD(FragmentFD):
+    _HEDGE_MIN_DELAY = 0.2
+
+
+class TestFragmentScheduler(unittest.TestCase):
+    def setUp(self):
+        # Fragments are not actually downloaded, so there is nothing to remove
+        params = {'logger': FakeLogger(), 'keep_fragments': True}
+        self.fd = HedgingFragmentFD(YoutubeDL(params), params)
+        self.fragments = [{'frag_index': i} for i in range(1, 31)]
+
+    def result(self, fragment):
+        return {'fragment_content': None, 'fragment_filename_sanitized': str(fragment['frag_index'])}
+
+    def test_order(self):
+        def download_func(fragment, hedged):
+            time.sleep((fragment['frag_index'] * 7 % 5) / 100)
+            return self.result(fragment)
+
+        with concurrent.futures.ThreadPoolExecutor(4) as pool:
+            results = list(self.fd._download_fragments_unordered({}, self.fragments, download_func, pool, 4))
+        self.assertEqual([fragment['frag_index'] for fragment, _ in results], list(range(1, 31)))
+        self.assertEqual([int(r['fragment_filename_sanitized']) for _, r in results], list(range(1, 31)))
+
+    def test_window(self):
+        started, blocker = [], threading.Event()
+
+        def download_func(fragment, hedged):
+            started.append(fragment['frag_index'])
+            if fragment['frag_index'] == 1:
+                blocker.wait()
+            return self.result(fragment)
+
+        def unblock():
+            started_before.extend(started)
+            blocker.set()
+
+        started_before = []
+        self.fd._HEDGE_MIN_DELAY = 60
+        threading.Timer(0.5, unblock).start()
+        with concurrent.futures.ThreadPoolExecutor(2) as pool:
+            results = list(self.fd._download_fragments_unordered({}, self.fragments, download_func, pool, 2))
+        # Fragments after the window are not started until the first fragment is done
+        self.assertEqual(sorted(started_before), list(range(1, 2 * self.fd._REORDER_WINDOW + 1)))
+        self.assertEqual([fragment['frag_index'] for fragment, _ in results], list(range(1, 31)))
+
+    def test_hedge(self):
+        hedges, blocker = [], threading.Event()
+
+        def download_func(fragment, hedged):
+            if hedged:
+                hedges.append(fragment['frag_index'])
+            elif fragment['frag_index'] == 10:
+                blocker.wait()
+                return {'fragment_content': None, 'fragment_filename_sanitized': None}
+            time.sleep(0.01)
+            return self.result(fragment)
+
+        with concurrent.futures.ThreadPoolExecutor(4) as pool:
+            results = list(self.fd._download_fragments_unordered({}, self.fragments, download_func, pool, 4))
+            blocker.set()
+        self.assertEqual(hedges, [10])
+        self.assertEqual([int(r['fragment_filename_sanitized']) for _, r in results], list(range(1, 31)))
+
+    def test_controller(self):
+        controller = ConcurrencyController(8)
+        controller.limit = 3
+        in_flight, max_in_flight, lock = [0], [0], threading.Lock()
+
+        def download_func(fragment, hedged):
+            with lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            return self.result(fragment)
+
+        with concurrent.futures.ThreadPoolExecutor(8) as pool:
+            results = list(self.fd._download_fragments_unordered(
+                {}, self.fragments, download_func, pool, 8, controller))
+        self.assertEqual([fragment['frag_index'] for fragment, _ in results], list(range(1, 31)))
+        self.assertLessEqual(max_in_flight[0], 3)
+
+
+class TestConcurrencyController(unittest.TestCase):
+    def run_round(self, controller, size, latency):
+        slots = 0
+        while controller.acquire():
+            slots += 1
+        self.assertEqual(slots, controller.limit)
+        start = time.time()
+        time.sleep(latency)
+        for _ in range(slots):
+            controller.release(size, latency)
+        return time.time() - start
+
+    def test_aimd(self):
+        controller = ConcurrencyController(4)
+        self.assertEqual(controller.limit, 2)
+        # The throughput grows with the number of fragments in flight
+        self.run_round(controller, 1000, 0.05)
+        self.assertEqual(controller.limit, 2)
+        self.run_round(controller, 1000, 0.05)
+        self.assertEqual(controller.limit, 2)
+        controller._throughput /= 2
+        self.run_round(controller, 1000, 0.05)
+        self.assertEqual(controller.limit, 3)
+
+        controller.limit = 4
+        controller.throttled()
+        self.assertEqual(controller.limit, 2)
+        # Further responses to requests made before do not halve it again
+        controller.throttled()
+        self.assertEqual(controller.limit, 2)
+
+        # Lower throughput with higher latency
+        self.run_round(controller, 1000, 0.01)
+        self.run_round(controller, 100, 0.05)
+        self.assertEqual(controller.limit, 1)
+
+
+class TestFragmentProgress(unittest.TestCase):
+    def test_concurrent(self):
+        progress = FragmentProgress(100)
+        keys = [object() for _ in range(4)]
+
+        def download(key):
+            for downloaded_bytes in range(0, 1001, 50):
+                progress.update(key, downloaded_bytes, speed=1000)
+                time.sleep(0.001)
+            progress.update(key, 1000, finished=True)
+
+        threads = [threading.Thread(target=download, args=(key,), name=f'worker{i}') for i, key in enumerate(keys)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(progress.downloaded_bytes, 4100)
+        self.assertEqual(progress.completed_bytes, 4100)
+        self.assertGreater(progress.speed, 0)
+        workers = progress.workers
+        self.assertEqual(sorted(workers), ['worker0', 'worker1', 'worker2', 'worker3'])
+        self.assertEqual([w['downloaded_bytes'] for w in workers.values()], [1000] * 4)
+
+    def test_discard_and_total(self):
+        first, second = FragmentProgress(), FragmentProgress()
+        total = FragmentProgress(children=[first, second])
+        first.update('a', 500)
+        time.sleep(0.01)
+        first.update('b', 300)
+        first.discard('b')
+        second.update('c', 200, finished=True)
+        self.assertEqual(first.downloaded_bytes, 500)
+        self.assertEqual(first.completed_bytes, 0)
+        self.assertEqual(total.downloaded_bytes, 700)
+        self.assertEqual(total.completed_bytes, 200)
+        self.assertIsNone(total.eta)
+        first.total_bytes_estimate = second.total_bytes_estimate = 1000
+        self.assertIsNotNone(total.eta)
+
+
+    def test_hedged(self):
+        progress = FragmentProgress()
+        progress.update('first', 500, fragment_index=1)
+        progress.update('second', 300, fragment_index=1)
+        self.assertTrue(progress.update('second', 1000, finished=True, fragment_index=1))
+        # The request that finishes last is not counted
+        self.assertFalse(progress.update('first', 1000, finished=True, fragment_index=1))
+        self.assertFalse(progress.update('late', 200, fragment_index=1))
+        self.assertEqual(progress.downloaded_bytes, 1000)
+        self.assertEqual(progress.completed_bytes, 1000)
+
+
+class KeyServingYDL(YoutubeDL):
+    def __init__(self, key, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.key, self.key_requests = key, []
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+
+    def urlopen(self, req):
+        with self.lock:
+            self.key_requests.append(req.get_full_url())
+            self.active += 1
+            self.max_active = max(self.active, self.max_active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return io.BytesIO(self.key)
+
+
+class TestDecrypter(unittest.TestCase):
+    def test_concurrent(self):
+        key, data = bytes(range(16)), b'fragment data' * 10
+        params = {'logger': FakeLogger()}
+        ydl = KeyServingYDL(key, params)
+        decrypt_fragment = FragmentFD(ydl, params).decrypter({})
+        decrypt_infos = [{'METHOD': 'AES-128', 'URI': f'http://127.0.0.1/key{i}'} for i in range(2)]
+
+        def decrypt(media_sequence):
+            iv = media_sequence.to_bytes(16, 'big')
+            encrypted = intlist_to_bytes(aes_cbc_encrypt(bytes_to_intlist(data), bytes_to_intlist(key), bytes_to_intlist(iv)))
+            return decrypt_fragment({
+                'decrypt_info': decrypt_infos[media_sequence % 2],
+                'media_sequence': media_sequence,
+            }, encrypted)
+
+        with concurrent.futures.ThreadPoolExecutor(4) as pool:
+            self.assertEqual(list(pool.map(decrypt, range(8))), [data] * 8)
+        # Each key is fetched once, and the different keys are fetched concurrently
+        self.assertEqual(sorted(ydl.key_requests), ['http://127.0.0.1/key0', 'http://127.0.0.1/key1'])
+        self.assertEqual(ydl.max_active, 2)
+
+
+class StallingRequestHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(self.path)
+            stall = self.path == '/10.m4s' and self.server.requests.count(self.path) == 1
+        # The first request of fragment 10 gets a response much later than the others
+        if stall:
+            time.sleep(1.5)
+        payload = f'[{self.path[1:-4]}]'.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class HedgingDashSegmentsFD(DashSegmentsFD):
+    _HEDGE_MIN_DELAY = 0.2
+
+
+class TestHedgedRequests(unittest.TestCase):
+    def test_hedged_fragment(self):
+        httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StallingRequestHandler)
+        httpd.lock, httpd.requests = threading.Lock(), []
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        params = {'logger': FakeLogger(), 'concurrent_fragment_downloads': 4}
+        filename = 'testfile.mp4'
+        try:
+            # The second request of the stalled fragment is not merged with the first one
+            self.assertTrue(HedgingDashSegmentsFD(YoutubeDL(params), params).real_download(filename, {
+                'url': f'http://127.0.0.1:{http_server_port(httpd)}/',
+                'ext': 'mp4',
+                'fragment_base_url': f'http://127.0.0.1:{http_server_port(httpd)}/',
+                'fragments': [{'path': f'{i}.m4s'} for i in range(1, 21)],
+            }))
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), b''.join(b'[%d]' % i for i in range(1, 21)))
+            self.assertEqual(httpd.requests.count('/10.m4s'), 2)
+        finally:
+            httpd.shutdown()
+            try_rm(filename)
+
+
+class SlowAppendDashSegmentsFD(DashSegmentsFD):
+    def _prepare_frag_download(self, ctx):
+        super()._prepare_frag_download(ctx)
+        self.memory_dl = ctx['memory_dl']
+
+    def _append_fragment(self, ctx, frag_content):
+        # The workers start downloading the next fragments while this one is appended
+        time.sleep(0.02)
+        super()._append_fragment(ctx, frag_content)
+
+
+class TestInMemoryFragments(unittest.TestCase):
+    def test_concurrent(self):
+        httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StallingRequestHandler)
+        httpd.lock, httpd.requests = threading.Lock(), []
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        params = {'logger': FakeLogger(), 'concurrent_fragment_downloads': 4}
+        filename = 'testfile.mp4'
+        fd = SlowAppendDashSegmentsFD(YoutubeDL(params), params)
+        try:
+            self.assertTrue(fd.real_download(filename, {
+                'url': f'http://127.0.0.1:{http_server_port(httpd)}/',
+                'ext': 'mp4',
+                'fragment_base_url': f'http://127.0.0.1:{http_server_port(httpd)}/',
+                'fragments': [{'path': f'{i}.m4s'} for i in range(1, 41) if i != 10],
+            }))
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), b''.join(b'[%d]' % i for i in range(1, 41) if i != 10))
+            # Every fragment held in memory was released once
+            self.assertEqual(fd.memory_dl._buffered, 0)
+        finally:
+            httpd.shutdown()
+            try_rm(filename)
+
+
+class TestFragmentConnections(unittest.TestCase):
+    def test_single_connection(self):
+        httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StallingRequestHandler)
+        httpd.lock, httpd.requests = threading.Lock(), []
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        params = {'logger': FakeLogger(), 'http_connections': 4, 'keep_fragments': True}
+        filename = 'testfile.mp4'
+        try:
+            self.assertTrue(DashSegmentsFD(YoutubeDL(params), params).real_download(filename, {
+                'url': f'http://127.0.0.1:{http_server_port(httpd)}/',
+                'ext': 'mp4',
+                'fragment_base_url': f'http://127.0.0.1:{http_server_port(httpd)}/',
+                'fragments': [{'path': f'{i}.m4s'} for i in range(1, 6)],
+            }))
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), b''.join(b'[%d]' % i for i in range(1, 6)))
+            # Each fragment is downloaded with a single request
+            self.assertEqual(sorted(httpd.requests), [f'/{i}.m4s' for i in range(1, 6)])
+        finally:
+            httpd.shutdown()
+            for name in glob.glob(f'{filename}*'):
+                try_rm(name)
+
+
+class TestResumeJournal(unittest.TestCase):
+    def setUp(self):
+        params = {'logger': FakeLogger(), 'keep_fragments': True}
+        self.fd = FragmentFD(YoutubeDL(params), params)
+        self.filename = 'testfile.mp4'
+        self.tearDown()
+
+    def tearDown(self):
+        for filename in (self.filename, self.fd.temp_name(self.filename), self.fd.ytdl_filename(self.filename)):
+            try_rm(filename)
+
+    def prepare(self):
+        ctx = {'filename': self.filename, 'total_frags': 5, 'live': False}
+        self.fd._prepare_frag_download(ctx)
+        return ctx
+
+    def append(self, ctx, frag_index, content):
+        ctx.update({'fragment_index': frag_index, 'fragment_filename_sanitized': 'nonexistent'})
+        ctx['extra_state'] = {'last': frag_index}
+        self.fd._append_fragment(ctx, content)
+
+    def test_resume(self):
+        ctx = self.prepare()
+        self.append(ctx, 1, b'a' * 10)
+        self.append(ctx, 2, b'b' * 10)
+        # Interrupted while writing the third fragment and its journal entry
+        ctx['dest_stream'].write(b'c' * 5)
+        ctx['dest_stream'].close()
+        ctx['ytdl_stream'].write('{"index": 3, "off')
+        ctx['ytdl_stream'].close()
+
+        ctx = self.prepare()
+        self.assertEqual(ctx['fragment_index'], 2)
+        self.assertEqual(ctx['extra_state'], {'last': 2})
+        self.assertEqual(ctx['complete_frags_downloaded_bytes'], 20)
+        self.append(ctx, 3, b'c' * 10)
+        ctx['dest_stream'].close()
+        ctx['ytdl_stream'].close()
+        with open(self.fd.temp_name(self.filename), 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 10 + b'b' * 10 + b'c' * 10)
+        with open(self.fd.ytdl_filename(self.filename)) as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+
+        ctx = self.prepare()
+        self.assertEqual((ctx['fragment_index'], ctx['complete_frags_downloaded_bytes']), (3, 30))
+        ctx['dest_stream'].close()
+        ctx['ytdl_stream'].close()
+
+    def test_legacy_format(self):
+        with open(self.fd.temp_name(self.filename), 'wb') as f:
+            f.write(b'a' * 10)
+        with open(self.fd.ytdl_filename(self.filename), 'w') as f:
+            json.dump({'downloader': {'current_fragment': {'index': 1}}}, f)
+        ctx = self.prepare()
+        self.assertEqual((ctx['fragment_index'], ctx['complete_frags_downloaded_bytes']), (1, 10))
+        ctx['dest_stream'].close()
+        ctx['ytdl_stream'].close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+# Allow direct execution
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import http.server
+import threading
+import time
+
+from test.helper import http_server_port, try_rm
+from yt_dlp import YoutubeDL
+from yt_dlp.downloader import get_suitable_downloader
+from yt_dlp.downloader.hls import HlsFD
+from yt_dlp.utils import encodeFilename
+
+
+class FakeLogger:
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+class LiveHlsFD(HlsFD):
+    _LIVE_STALL_TIMEOUT = 3
+
+
+class LivePlaylist:
+    """A live playlist with a sliding window of 4 segments, that gains a segment every time it is loaded until end"""
+
+    def __init__(self, end, *, endlist=True, first=100, last=105):
+        self.end, self.endlist, self.first, self.last = end, endlist, first, last
+
+    def __call__(self):
+        if self.last < self.end:
+            self.last += 1
+        first = max(self.first, self.last - 3)
+        return ''.join((
+            '#EXTM3U\n#EXT-X-TARGETDURATION:0.05\n',
+            f'#EXT-X-MEDIA-SEQUENCE:{first}\n#EXT-X-MAP:URI="init.mp4"\n',
+            *(f'#EXTINF:0.05,\n{i}.m4s\n' for i in range(first, self.last + 1)),
+            '#EXT-X-ENDLIST\n' if self.endlist and self.last >= self.end else ''))
+
+
+class RestartedPlaylist(LivePlaylist):
+    """A live playlist whose media sequence numbers restart at 0 after segment 102"""
+
+    def __call__(self):
+        if self.last < 102:
+            return super().__call__()
+        self.restarted = getattr(self, 'restarted', -1) + 1
+        return ''.join((
+            '#EXTM3U\n#EXT-X-TARGETDURATION:0.05\n#EXT-X-MEDIA-SEQUENCE:0\n#EXT-X-MAP:URI="init.mp4"\n',
+            *(f'#EXTINF:0.05,\n{i}.m4s\n' for i in range(min(self.restarted, 2) + 1)),
+            '#EXT-X-ENDLIST\n' if self.restarted >= 2 else ''))
+
+
+class TimedPlaylist(LivePlaylist):
+    """A live playlist with segments shorter than its target duration, that records when it is loaded"""
+
+    def __call__(self):
+        self.load_times = getattr(self, 'load_times', []) + [time.time()]
+        return super().__call__().replace('TARGETDURATION:0.05', 'TARGETDURATION:0.2').replace('EXTINF:0.05', 'EXTINF:0.01')
+
+
+def make_handler(playlist):
+    class HTTPTestRequestHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/live.m3u8':
+                content = playlist().encode()
+            elif self.path == '/init.mp4':
+                content = b'[init]'
+            elif self.path.endswith('.m4s'):
+                content = f'[{self.path[1:-4]}]'.encode()
+            else:
+                assert False
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    return HTTPTestRequestHandler
+
+
+class TestLiveHlsFD(unittest.TestCase):
+    def download(self, playlist):
+        httpd = http.server.HTTPServer(('127.0.0.1', 0), make_handler(playlist))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        params = {'logger': FakeLogger()}
+        filename = 'testfile.mp4'
+        try_rm(encodeFilename(filename))
+        try:
+            self.assertTrue(LiveHlsFD(YoutubeDL(params), params).real_download(filename, {
+                'url': 'http://127.0.0.1:%d/live.m3u8' % http_server_port(httpd),
+                'ext': 'mp4',
+                'is_live': True,
+            }))
+            with open(encodeFilename(filename), 'rb') as f:
+                return f.read()
+        finally:
+            httpd.shutdown()
+            try_rm(encodeFilename(filename))
+
+    def test_until_endlist(self):
+        # Starts 3 segments from the live edge, and downloads every new segment once
+        self.assertEqual(
+            self.download(LivePlaylist(110)),
+            b'[init]' + b''.join(b'[%d]' % i for i in range(104, 111)))
+
+    def test_until_stalled(self):
+        self.assertEqual(
+            self.download(LivePlaylist(107, endlist=False)),
+            b'[init]' + b''.join(b'[%d]' % i for i in range(104, 108)))
+
+    def test_short_playlist(self):
+        self.assertEqual(
+            self.download(LivePlaylist(103, first=100, last=100)),
+            b'[init]' + b''.join(b'[%d]' % i for i in range(100, 104)))
+
+    def test_restarted_sequence(self):
+        self.assertEqual(
+            self.download(RestartedPlaylist(110, first=100, last=101)),
+            b'[init][100][101][102][0][1][2]')
+
+    def test_reload_interval(self):
+        # A changed playlist is reloaded after the target duration, not after its last segment
+        playlist = TimedPlaylist(108)
+        self.download(playlist)
+        self.assertEqual(len(playlist.load_times), 3)
+        for previous, current in zip(playlist.load_times, playlist.load_times[1:]):
+            self.assertGreaterEqual(current - previous, 0.19)
+
+    def test_suitable_downloader(self):
+        info_dict = {'protocol': 'm3u8_native', 'is_live': True, 'url': 'http://127.0.0.1/live.m3u8'}
+        self.assertIsNot(get_suitable_downloader(info_dict, {}), HlsFD)
+        self.assertIs(get_suitable_downloader(info_dict, {'external_downloader': {'m3u8': 'native'}}), HlsFD)
+
+
+if __name__ == '__main__':
+    unittest.main()
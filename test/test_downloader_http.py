@@ -9,11 +9,13 @@
 
 
 import http.server
+import json
 import re
 import threading
 
 from test.helper import http_server_port, try_rm
 from yt_dlp import YoutubeDL
+from yt_dlp.downloader.fragment import InMemoryFragmentDownloader
 from yt_dlp.downloader.http import HttpFD
 from yt_dlp.utils import encodeFilename
 
@@ -21,6 +23,7 @@
 
 
 TEST_SIZE = 10 * 1024
+TEST_DATA = bytes(i % 251 for i in range(TEST_SIZE))
 
 
 class HTTPTestRequestHandler(http.server.BaseHTTPRequestHandler):
@@ -45,13 +48,14 @@ def send_content_range(self, total=None):
     def serve(self, range=True, content_length=True):
         self.send_response(200)
         self.send_header('Content-Type', 'video/mp4')
-        size = TEST_SIZE
+        size, start = TEST_SIZE, 0
         if range:
             size = self.send_content_range(TEST_SIZE)
+            start = int(self.headers.get('Range', 'bytes=0-')[6:].split('-')[0])
         if content_length:
             self.send_header('Content-Length', size)
         self.end_headers()
-        self.wfile.write(b'#' * size)
+        self.wfile.write(TEST_DATA[start:start + size])
 
     def do_GET(self):
         if self.path == '/regular':
@@ -77,6 +81,20 @@ def error(self, msg):
         pass
 
 
+class MinimalYDL:
+    """A ydl without the attributes of YoutubeDL for --parallel-videos, like the ones of embedders"""
+
+    _MISSING = ('_local', '_rate_limiter', '_sleep_lock', '_output_is_live', '_interrupted')
+
+    def __init__(self, params):
+        self._ydl = YoutubeDL(params)
+
+    def __getattr__(self, name):
+        if name in self._MISSING:
+            raise AttributeError(name)
+        return getattr(self._ydl, name)
+
+
 class TestHttpFD(unittest.TestCase):
     def setUp(self):
         self.httpd = http.server.HTTPServer(
@@ -98,6 +116,18 @@ def download(self, params, ep):
         self.assertEqual(os.path.getsize(encodeFilename(filename)), TEST_SIZE)
         try_rm(encodeFilename(filename))
 
+    def test_minimal_ydl(self):
+        params = {'logger': FakeLogger(), 'ratelimit': 1024 * 1024, 'sleep_interval': 0.01}
+        filename = 'testfile.mp4'
+        try_rm(encodeFilename(filename))
+        try:
+            self.assertTrue(HttpFD(MinimalYDL(params), params).download(filename, {
+                'url': 'http://127.0.0.1:%d/regular' % self.port,
+            })[0])
+            self.assertEqual(os.path.getsize(encodeFilename(filename)), TEST_SIZE)
+        finally:
+            try_rm(encodeFilename(filename))
+
     def download_all(self, params):
         for ep in ('regular', 'no-content-length', 'no-range', 'no-range-no-content-length'):
             self.download(params, ep)
@@ -110,6 +140,74 @@ def test_chunked(self):
             'http_chunk_size': 1000,
         })
 
+    def test_segmented(self):
+        self.download_all({
+            'http_connections': 4,
+        })
+
+        class SegmentedHttpFD(HttpFD):
+            _MIN_SEGMENT_SIZE = 1000
+
+        params = {'logger': FakeLogger(), 'http_connections': 4}
+        downloader = SegmentedHttpFD(YoutubeDL(params), params)
+        filename = 'testfile.mp4'
+        url = 'http://127.0.0.1:%d/regular' % self.port
+        try_rm(encodeFilename(filename))
+        self.assertTrue(downloader.real_download(filename, {'url': url}))
+        with open(encodeFilename(filename), 'rb') as f:
+            self.assertEqual(f.read(), TEST_DATA)
+        self.assertFalse(os.path.exists(encodeFilename(downloader.ytdl_filename(filename))))
+        try_rm(encodeFilename(filename))
+
+        # Resume from the state of an interrupted download
+        tmpfilename = downloader.temp_name(filename)
+        with open(encodeFilename(tmpfilename), 'wb') as f:
+            f.write(TEST_DATA[:1000] + b'\0' * 4120 + TEST_DATA[5120:6500] + b'\0' * (TEST_SIZE - 6500))
+        with open(encodeFilename(downloader.ytdl_filename(filename)), 'w') as f:
+            json.dump({'downloader': {
+                'segments': [[0, 5119, 1000], [5120, TEST_SIZE - 1, 1380]],
+                'total_bytes': TEST_SIZE,
+            }}, f)
+        self.assertTrue(downloader.real_download(filename, {'url': url}))
+        with open(encodeFilename(filename), 'rb') as f:
+            self.assertEqual(f.read(), TEST_DATA)
+        try_rm(encodeFilename(filename))
+
+        # The preallocated file is not resumed by a download over a single connection
+        for url, params in ((f'http://127.0.0.1:{self.port}/no-range', params), (url, {'logger': FakeLogger()})):
+            with open(encodeFilename(tmpfilename), 'wb') as f:
+                f.write(TEST_DATA[:1000] + b'\0' * (TEST_SIZE - 1000))
+            with open(encodeFilename(downloader.ytdl_filename(filename)), 'w') as f:
+                json.dump({'downloader': {'segments': [[0, TEST_SIZE - 1, 1000]], 'total_bytes': TEST_SIZE}}, f)
+            self.assertTrue(SegmentedHttpFD(YoutubeDL(params), params).real_download(filename, {'url': url}))
+            with open(encodeFilename(filename), 'rb') as f:
+                self.assertEqual(f.read(), TEST_DATA)
+            self.assertFalse(os.path.exists(encodeFilename(downloader.ytdl_filename(filename))))
+            try_rm(encodeFilename(filename))
+
+    def test_in_memory_fragment(self):
+        params = {'logger': FakeLogger(), 'noprogress': True}
+        downloader = InMemoryFragmentDownloader(YoutubeDL(params), params, TEST_SIZE + 1)
+        for ep in ('regular', 'no-content-length', 'no-range', 'no-range-no-content-length'):
+            result = downloader.download_fragment({
+                'url': 'http://127.0.0.1:%d/%s' % (self.port, ep),
+            })
+            self.assertEqual(result, (True, TEST_DATA))
+            downloader.release(result[1])
+        self.assertFalse(os.path.exists('-'))
+        self.assertEqual(downloader._buffered, 0)
+
+        url = 'http://127.0.0.1:%d/regular' % self.port
+        _, content = downloader.download_fragment({'url': url})
+        self.assertEqual(downloader.download_fragment({'url': url}), (True, TEST_DATA))
+        # Over the limit; the fragment has to be downloaded to disk
+        self.assertEqual(downloader.download_fragment({'url': url}), (False, None))
+        downloader.release(content)
+        # Releasing a fragment again does not free more memory
+        downloader.release(content)
+        self.assertEqual(downloader._buffered, TEST_SIZE)
+        self.assertEqual(downloader.download_fragment({'url': url}), (True, TEST_DATA))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -8,13 +8,19 @@
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+import concurrent.futures
+import http.cookiejar
 import http.server
+import shutil
 import ssl
 import threading
+import time
+import unittest.mock
 import urllib.request
 
-from test.helper import http_server_port
+from test.helper import http_server_port, try_rm
 from yt_dlp import YoutubeDL
+from yt_dlp.utils import RequestCoalescer, sanitized_Request
 
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -76,6 +82,9 @@ def setUp(self):
         self.server_thread.daemon = True
         self.server_thread.start()
 
+    def tearDown(self):
+        try_rm('video [video].mp4')
+
     def test_nocheckcertificate(self):
         ydl = YoutubeDL({'logger': FakeLogger()})
         self.assertRaises(
@@ -114,6 +123,9 @@ def _run_test(self, **params):
         r = ydl.extract_info('https://127.0.0.1:%d/video.html' % self.port)
         self.assertEqual(r['entries'][0]['url'], 'https://127.0.0.1:%d/vid.mp4' % self.port)
 
+    def tearDown(self):
+        try_rm('video [video].mp4')
+
     def test_certificate_combined_nopass(self):
         self._run_test(client_certificate=os.path.join(self.certdir, 'clientwithkey.crt'))
 
@@ -187,5 +199,277 @@ def test_proxy_with_idn(self):
         self.assertEqual(response, 'normal: http://xn--fiq228c.tw/')
 
 
+class KeepAliveRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        payload = b'x' * (100000 if self.path == '/large' else 10)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        # Close without telling the client, like a server whose keep-alive timeout expired
+        self.close_connection = self.path == '/close'
+
+    def do_POST(self):
+        self.server.posts.append(self.rfile.read(int(self.headers['Content-Length'])))
+        self.do_GET()
+
+
+class TestKeepAlive(unittest.TestCase):
+    def setUp(self):
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveRequestHandler)
+        self.httpd.client_ports = []
+        self.httpd.posts = []
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _fetch(self, ydl, path, read=True):
+        with ydl.urlopen(f'http://127.0.0.1:{self.port}{path}') as response:
+            self.assertEqual(response.status, 200)
+            if read:
+                response.read()
+
+    def test_connection_reuse(self):
+        with YoutubeDL({'logger': FakeLogger()}) as ydl:
+            for _ in range(3):
+                self._fetch(ydl, '/')
+        self.assertEqual(len(self.httpd.client_ports), 3)
+        self.assertEqual(len(set(self.httpd.client_ports)), 1)
+
+    def test_unread_response(self):
+        with YoutubeDL({'logger': FakeLogger()}) as ydl:
+            self._fetch(ydl, '/large', read=False)
+            self._fetch(ydl, '/')
+        self.assertEqual(len(set(self.httpd.client_ports)), 2)
+
+    def test_closed_by_server(self):
+        with YoutubeDL({'logger': FakeLogger()}) as ydl:
+            self._fetch(ydl, '/close')
+            self._fetch(ydl, '/')
+        self.assertEqual(len(set(self.httpd.client_ports)), 2)
+
+    def test_stale_connection_retry(self):
+        # The server closes the connection only once it is reused
+        with unittest.mock.patch('yt_dlp.utils.HTTPConnectionPool._is_dropped', return_value=False), \
+                YoutubeDL({'logger': FakeLogger()}) as ydl:
+            self._fetch(ydl, '/close')
+            self._fetch(ydl, '/')
+            self.assertEqual(len(set(self.httpd.client_ports)), 2)
+            # A POST may have been processed by the server, and is not sent again
+            self._fetch(ydl, '/close')
+            with self.assertRaises(OSError):
+                ydl.urlopen(sanitized_Request(f'http://127.0.0.1:{self.port}/', data=b'data'))
+            self.assertEqual(len(self.httpd.client_ports), 3)
+            with ydl.urlopen(sanitized_Request(f'http://127.0.0.1:{self.port}/', data=b'data')) as response:
+                response.read()
+        self.assertEqual(self.httpd.posts, [b'data'])
+
+    def test_no_keep_alive(self):
+        with YoutubeDL({'logger': FakeLogger(), 'compat_opts': ['no-keep-alive']}) as ydl:
+            for _ in range(3):
+                self._fetch(ydl, '/')
+        self.assertEqual(len(set(self.httpd.client_ports)), 3)
+
+
+class HTTPCacheRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        headers = {
+            '/fresh': {'Cache-Control': 'max-age=60'},
+            '/cookie': {'Cache-Control': 'max-age=60', 'Set-Cookie': 'session=1'},
+            '/etag': {'Cache-Control': 'no-cache', 'ETag': '"v1"'},
+            '/stale': {'Cache-Control': 'max-age=60', 'Age': '60', 'ETag': '"v1"'},
+            '/no-store': {'Cache-Control': 'no-store', 'ETag': '"v1"'},
+            '/vary': {'Cache-Control': 'max-age=60', 'Vary': 'Accept-Language'},
+            '/large': {'Cache-Control': 'max-age=60', 'Transfer-Encoding': 'chunked'},
+        }[self.path]
+        if self.path == '/large':
+            # Too large to be cached, and the size is not known in advance
+            self.send_response(200)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            chunk = b'x' * 1024 * 1024
+            for _ in range(5):
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            # The end of the body is only sent once the response was returned
+            self.server.finished = not self.server.release.wait(5)
+            self.wfile.write(b'%x\r\n%s\r\n0\r\n\r\n' % (len(chunk), chunk))
+            return
+        if 'ETag' in headers and self.headers.get('If-None-Match') == headers['ETag']:
+            self.send_response(304)
+            payload = b''
+            if self.path == '/stale':
+                # The freshness of the stored response is not repeated
+                headers = {'ETag': headers['ETag']}
+        else:
+            self.send_response(200)
+            payload = f'{self.path} {len(self.server.requests)}'.encode()
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class TestHTTPCache(unittest.TestCase):
+    def setUp(self):
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), HTTPCacheRequestHandler)
+        self.httpd.requests = []
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.cachedir = os.path.join(TEST_DIR, 'testdata', 'http_cache_test')
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if os.path.exists(self.cachedir):
+            shutil.rmtree(self.cachedir)
+
+    def _download(self, path, http_cache=('generic', ), headers={}):
+        with YoutubeDL({'logger': FakeLogger(), 'cachedir': self.cachedir, 'http_cache': http_cache}) as ydl:
+            ie = ydl.get_info_extractor('Generic')
+            webpage, urlh = ie._download_webpage_handle(
+                f'http://127.0.0.1:{self.port}{path}', None, note=False, headers=headers)
+            self.assertEqual(urlh.geturl(), f'http://127.0.0.1:{self.port}{path}')
+            return webpage, urlh.headers
+
+    def test_fresh(self):
+        # Fresh responses are reused without a request, also by other processes
+        self.assertEqual(self._download('/fresh')[0], '/fresh 1')
+        webpage, headers = self._download('/fresh')
+        self.assertEqual(webpage, '/fresh 1')
+        self.assertEqual(headers['Cache-Control'], 'max-age=60')
+        self.assertEqual(self.httpd.requests, ['/fresh'])
+
+    def test_revalidation(self):
+        self.assertEqual(self._download('/etag')[0], '/etag 1')
+        self.assertEqual(self._download('/etag')[0], '/etag 1')
+        self.assertEqual(self.httpd.requests, ['/etag', '/etag'])
+        # The stored headers are freshened by a 304 response
+        for _ in range(3):
+            webpage, headers = self._download('/stale')
+            self.assertEqual(webpage, '/stale 3')
+            self.assertEqual(headers['Cache-Control'], 'max-age=60')
+        self.assertEqual(self.httpd.requests, ['/etag', '/etag', '/stale', '/stale'])
+
+    def test_not_cached(self):
+        self.assertEqual(self._download('/no-store')[0], '/no-store 1')
+        self.assertEqual(self._download('/no-store')[0], '/no-store 2')
+        # Only the requests of the listed extractors are cached
+        self.assertEqual(self._download('/fresh', http_cache=['Youtube'])[0], '/fresh 3')
+        self.assertEqual(self._download('/fresh', http_cache=[])[0], '/fresh 4')
+        # The responses to requests with cookies or credentials may be specific to the user
+        self.assertEqual(self._download('/fresh', headers={'Cookie': 'session=1'})[0], '/fresh 5')
+        self.assertEqual(self._download('/fresh', headers={'Authorization': 'Basic dXNlcjpwYXNz'})[0], '/fresh 6')
+        self.assertEqual(self._download('/fresh')[0], '/fresh 7')
+        # Nor are the responses that set cookies
+        self.assertEqual(self._download('/cookie')[0], '/cookie 8')
+        self.assertEqual(self._download('/cookie')[1]['Set-Cookie'], 'session=1')
+        self.assertEqual(self.httpd.requests[-1], '/cookie')
+
+    def test_cookiejar(self):
+        # The cookies of the cookiejar are sent with the requests, so the responses are not shared
+        for login in ('a', 'b'):
+            with YoutubeDL({'logger': FakeLogger(), 'cachedir': self.cachedir, 'http_cache': ['generic']}) as ydl:
+                ydl.cookiejar.set_cookie(http.cookiejar.Cookie(
+                    0, 'login', login, None, False, '127.0.0.1', False, False, '/', False, False,
+                    None, False, None, None, {}))
+                webpage = ydl.get_info_extractor('Generic')._download_webpage(
+                    f'http://127.0.0.1:{self.port}/fresh', None, note=False)
+            self.assertEqual(webpage, f'/fresh {len(self.httpd.requests)}')
+        self.assertEqual(self.httpd.requests, ['/fresh', '/fresh'])
+
+    def test_vary(self):
+        self.assertEqual(self._download('/vary', headers={'Accept-Language': 'en'})[0], '/vary 1')
+        self.assertEqual(self._download('/vary', headers={'Accept-Language': 'en'})[0], '/vary 1')
+        self.assertEqual(self._download('/vary', headers={'Accept-Language': 'de'})[0], '/vary 2')
+        self.assertEqual(self._download('/vary')[0], '/vary 3')
+
+    def test_too_large(self):
+        self.httpd.release, self.httpd.finished = threading.Event(), False
+        with YoutubeDL({'logger': FakeLogger(), 'cachedir': self.cachedir, 'http_cache': ['generic']}) as ydl:
+            urlh = ydl.urlopen(sanitized_Request(
+                f'http://127.0.0.1:{self.port}/large', headers={'Ytdl-http-cache': '1'}))
+            # The body is not read into memory past the size limit
+            self.assertFalse(self.httpd.finished)
+            self.httpd.release.set()
+            self.assertEqual(len(urlh.read()), 6 * 1024 * 1024)
+        self.assertEqual(len(self._download('/large')[0]), 6 * 1024 * 1024)
+        self.assertEqual(self.httpd.requests, ['/large', '/large'])
+
+
+class CoalescingRequestHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(self.path)
+            payload = f'{self.path} {len(self.server.requests)}'.encode()
+        time.sleep(0.2)
+        self.send_response(200)
+        if self.path != '/unknown-length':
+            self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_POST = do_GET
+
+
+class TestRequestCoalescing(unittest.TestCase):
+    def setUp(self):
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), CoalescingRequestHandler)
+        self.httpd.lock, self.httpd.requests = threading.Lock(), []
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _fetch_concurrently(self, path, data=None, count=4, headers={'Ytdl-coalesce': '1'}):
+        with YoutubeDL({'logger': FakeLogger()}) as ydl:
+            with concurrent.futures.ThreadPoolExecutor(count) as executor:
+                return sorted(executor.map(
+                    lambda _: ydl.urlopen(sanitized_Request(
+                        f'http://127.0.0.1:{self.port}{path}', data, headers)).read().decode(), range(count)))
+
+    def test_coalesced(self):
+        self.assertEqual(self._fetch_concurrently('/shared'), ['/shared 1'] * 4)
+        self.assertEqual(self._fetch_concurrently('/unknown-length'), ['/unknown-length 2'] * 4)
+        self.assertEqual(self.httpd.requests, ['/shared', '/unknown-length'])
+
+    def test_not_coalesced(self):
+        # A body bigger than MAX_SIZE is not buffered to be shared, even if its length is not known
+        with unittest.mock.patch.object(RequestCoalescer, 'MAX_SIZE', 4):
+            self.assertEqual(len(set(self._fetch_concurrently('/unknown-length'))), 4)
+            self.assertEqual(len(set(self._fetch_concurrently('/shared'))), 4)
+        self.assertEqual(len(set(self._fetch_concurrently('/post', data=b'data'))), 4)
+        # Only the requests that opt in are coalesced
+        self.assertEqual(len(set(self._fetch_concurrently('/shared', headers={}))), 4)
+        self.assertEqual(len(self.httpd.requests), 16)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Allow direct execution
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+from yt_dlp.m3u8 import HlsPlaylist
+
+MEDIA_PLAYLIST = '''#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:6
+#EXT-X-MEDIA-SEQUENCE:10
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXT-X-KEY:METHOD=AES-128,URI="key.bin",IV=0x0000000000000000000000000000000A
+#EXT-X-MAP:URI="main.mp4",BYTERANGE="700@0"
+#EXTINF:6.0,first
+#EXT-X-BYTERANGE:1000@700
+main.mp4
+#EXTINF:6.0,
+#EXT-X-BYTERANGE:1000
+main.mp4
+#UPLYNK-SEGMENT:1,2,ad
+#EXTINF:5.5,
+https://ads.example.com/ad.ts
+#UPLYNK-SEGMENT:1,2,segment
+#EXT-X-DISCONTINUITY
+#EXT-X-KEY:METHOD=NONE
+#EXTINF:4.5,
+last.ts
+#EXT-X-ENDLIST
+'''
+
+
+class TestHlsPlaylist(unittest.TestCase):
+    def test_media_playlist(self):
+        playlist = HlsPlaylist('https://example.com/hls/index.m3u8', query={'token': ['x']})
+        self.assertEqual(len(playlist.feed(MEDIA_PLAYLIST)), 5)
+        self.assertFalse(playlist.is_master)
+        self.assertEqual((playlist.target_duration, playlist.playlist_type), (6, 'VOD'))
+        self.assertTrue(playlist.endlist)
+        self.assertEqual(playlist.discontinuities, 1)
+        self.assertEqual(playlist.duration, 22)
+
+        init, first, second, ad, last = playlist.segments
+        self.assertTrue(init.is_init)
+        self.assertEqual(init.url, 'https://example.com/hls/main.mp4?token=x')
+        self.assertEqual([segment.byte_range for segment in playlist.segments],
+                         [(0, 700), (700, 1700), (1700, 2700), None, None])
+        self.assertEqual([segment.media_sequence for segment in playlist.segments], [10, 10, 11, 12, 13])
+        self.assertEqual([segment.discontinuity for segment in playlist.segments], [0, 0, 0, 0, 1])
+        self.assertEqual([segment.is_ad for segment in playlist.segments], [False, False, False, True, False])
+        self.assertEqual((first.duration, first.title, second.title), (6, 'first', None))
+        self.assertEqual(ad.url, 'https://ads.example.com/ad.ts?token=x')
+
+        self.assertIs(first.decrypt_info, second.decrypt_info)
+        self.assertEqual(first.decrypt_info, {
+            'METHOD': 'AES-128',
+            'URI': 'https://example.com/hls/key.bin?token=x',
+            'IV': b'\0' * 15 + b'\n',
+        })
+        self.assertEqual(last.decrypt_info, {'METHOD': 'NONE'})
+        self.assertFalse(playlist.has_drm)
+
+    def test_master_playlist(self):
+        with open('./test/testdata/m3u8/img_bipbop_adv_example_fmp4.m3u8', encoding='utf-8') as f:
+            playlist = HlsPlaylist('https://example.com/master.m3u8')
+            playlist.feed(f.read())
+        self.assertTrue(playlist.is_master)
+        self.assertEqual(playlist.segments, [])
+        stream_inf, url = playlist.streams[0]
+        self.assertEqual(url, 'https://example.com/v5/prog_index.m3u8')
+        self.assertEqual(stream_inf['RESOLUTION'], '960x540')
+        self.assertEqual(stream_inf['CODECS'], 'avc1.640020,mp4a.40.2')
+        self.assertEqual({media['TYPE'] for media in playlist.media}, {'AUDIO', 'SUBTITLES', 'CLOSED-CAPTIONS'})
+
+        playlist = HlsPlaylist()
+        playlist.feed('#EXTM3U\n#EXT-X-SESSION-KEY:METHOD=SAMPLE-AES,URI="skd://key"\n')
+        self.assertTrue(playlist.has_drm)
+
+    def test_refresh(self):
+        def live_playlist(first, count):
+            return '#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXT-X-MEDIA-SEQUENCE:%d\n#EXT-X-MAP:URI="init.mp4"\n%s' % (
+                first, ''.join(f'#EXTINF:2.0,\n{i}.m4s\n' for i in range(first, first + count)))
+
+        playlist = HlsPlaylist('https://example.com/live/index.m3u8')
+        self.assertEqual([segment.url for segment in playlist.feed(live_playlist(100, 3))], [
+            'https://example.com/live/init.mp4', 'https://example.com/live/100.m4s',
+            'https://example.com/live/101.m4s', 'https://example.com/live/102.m4s'])
+        self.assertEqual([segment.media_sequence for segment in playlist.feed(live_playlist(101, 4))], [103, 104])
+        self.assertEqual(playlist.feed(live_playlist(102, 3)), [])
+        self.assertEqual(len(playlist.segments), 6)
+        self.assertFalse(playlist.endlist)
+
+    def test_discontinuity_init(self):
+        # Every discontinuity needs its initialization section, even when it is the same
+        playlist = HlsPlaylist('https://example.com/vod/index.m3u8')
+        playlist.feed('#EXTM3U\n#EXT-X-TARGETDURATION:2\n' + '#EXT-X-DISCONTINUITY\n'.join(
+            f'#EXT-X-MAP:URI="init.mp4"\n#EXTINF:2.0,\n{i}.m4s\n' for i in range(3)) + '#EXT-X-ENDLIST\n')
+        self.assertEqual([(segment.is_init, segment.discontinuity) for segment in playlist.segments], [
+            (True, 0), (False, 0), (True, 1), (False, 1), (True, 2), (False, 2)])
+
+        # but it is not repeated by the refreshes of a live playlist
+        playlist = HlsPlaylist('https://example.com/live/index.m3u8')
+        playlist.feed('#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXT-X-MAP:URI="init.mp4"\n#EXTINF:2.0,\n0.m4s\n'
+                      '#EXT-X-DISCONTINUITY\n#EXT-X-MAP:URI="init.mp4"\n#EXTINF:2.0,\n1.m4s\n')
+        self.assertEqual([segment.url for segment in playlist.feed(
+            '#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXT-X-MEDIA-SEQUENCE:1\n#EXT-X-DISCONTINUITY\n'
+            '#EXT-X-MAP:URI="init.mp4"\n#EXTINF:2.0,\n1.m4s\n#EXTINF:2.0,\n2.m4s\n')], [
+            'https://example.com/live/2.m4s'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,6 +26,7 @@
     InAdvancePagedList,
     LazyList,
     OnDemandPagedList,
+    SegmentTemplateFragments,
     age_restricted,
     args_to_str,
     base_url,
@@ -35,6 +36,7 @@
     cli_bool_option,
     cli_option,
     cli_valueless_option,
+    compile_match_str,
     date_from_str,
     datetime_from_str,
     detect_exe_version,
@@ -1377,6 +1379,26 @@ def test_match_str(self):
         self.assertTrue(match_str('!x', {'id': 'foo'}, True))
         self.assertFalse(match_str('x', {'id': 'foo'}, False))
 
+    def test_compile_match_str(self):
+        matches = compile_match_str('duration > 1:00 & title *= cat & !is_live & like_count>?100')
+        self.assertIs(compile_match_str('duration > 1:00 & title *= cat & !is_live & like_count>?100'), matches)
+        self.assertTrue(matches({'duration': 61, 'title': 'cats'}))
+        self.assertFalse(matches({'duration': 60, 'title': 'cats'}))
+        self.assertFalse(matches({'duration': 61, 'title': 'cats', 'like_count': 10}))
+        self.assertFalse(matches({'duration': 61, 'title': 'cats', 'is_live': True}))
+        # The comparison value is only numeric for numeric fields
+        self.assertTrue(compile_match_str('x=1K')({'x': 1000}))
+        self.assertTrue(compile_match_str('x=1K')({'x': '1K'}))
+        self.assertRaises(ValueError, compile_match_str('x*=10'), {'x': 10})
+
+        # Flat playlist entries
+        self.assertFalse(matches({'title': 'dogs'}, incomplete=True))
+        self.assertTrue(matches({'title': 'cats'}, incomplete=True))
+        self.assertTrue(matches({'title': 'cats'}, incomplete={'duration'}))
+        self.assertFalse(matches({'title': 'cats'}, incomplete={'title'}))
+
+        self.assertRaises(ValueError, compile_match_str, 'x > 1 & (y)')
+
     def test_parse_dfxp_time_expr(self):
         self.assertEqual(parse_dfxp_time_expr(None), None)
         self.assertEqual(parse_dfxp_time_expr(''), None)
@@ -1773,6 +1795,32 @@ def test(ll, idx, val, cache):
         ll = reversed(ll)
         test(ll, -15, 14, range(15))
 
+    def test_SegmentTemplateFragments(self):
+        fragments = SegmentTemplateFragments(
+            'seg-%(Time)d-%(Number)d.m4s', 'path', start_number=5, timescale=10,
+            timeline=[(100, 20, 2), (0, 10, 0), (200, 30, 1)], initialization={'path': 'init.mp4'})
+        expected = [
+            {'path': 'init.mp4'},
+            {'path': 'seg-100-5.m4s', 'duration': 2.0},
+            {'path': 'seg-120-6.m4s', 'duration': 2.0},
+            {'path': 'seg-140-7.m4s', 'duration': 2.0},
+            {'path': 'seg-160-8.m4s', 'duration': 1.0},
+            {'path': 'seg-200-9.m4s', 'duration': 3.0},
+            {'path': 'seg-230-10.m4s', 'duration': 3.0},
+        ]
+        self.assertEqual(len(fragments), 7)
+        self.assertEqual(list(fragments), expected)
+        self.assertEqual(fragments[-1], expected[-1])
+        self.assertEqual(fragments[2:5], expected[2:5])
+        self.assertRaises(IndexError, fragments.__getitem__, 7)
+        self.assertEqual(list(SegmentTemplateFragments.from_dict(json.loads(json.dumps(fragments.to_dict())))), expected)
+
+        fragments = SegmentTemplateFragments(
+            'https://example.com/%(Bandwidth)d/%(Number)05d.ts', 'url', bandwidth=800, count=100000, segment_duration=2)
+        self.assertEqual(len(fragments), 100000)
+        self.assertEqual(fragments[99999], {'url': 'https://example.com/800/100000.ts', 'duration': 2})
+        self.assertEqual(fragments.to_dict()['count'], 100000)
+
     def test_format_bytes(self):
         self.assertEqual(format_bytes(0), '0.00B')
         self.assertEqual(format_bytes(1000), '1000.00B')
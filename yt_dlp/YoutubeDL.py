@@ -1,4 +1,5 @@
 import collections
+import concurrent.futures
 import contextlib
 import datetime
 import errno
@@ -17,13 +18,16 @@
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import tokenize
 import traceback
+import types
 import unicodedata
 import urllib.request
 from string import ascii_letters
 
+from .archive import open_download_archive
 from .cache import Cache
 from .compat import HAS_LEGACY as compat_has_legacy
 from .compat import compat_os_name, compat_shlex_quote
@@ -31,6 +35,7 @@
 from .downloader import FFmpegFD, get_suitable_downloader, shorten_protocol_name
 from .downloader.rtmp import rtmpdump_version
 from .extractor import gen_extractor_classes, get_info_extractor
+from .extractor._dispatch import ExtractorIndex
 from .extractor.openload import PhantomJSwrapper
 from .minicurses import format_text
 from .postprocessor import _PLUGIN_CLASSES as plugin_postprocessors
@@ -67,6 +72,8 @@
     ExtractorError,
     GeoRestrictedError,
     HEADRequest,
+    HTTPCacheHandler,
+    HTTPConnectionPool,
     ISO3166Utils,
     LazyList,
     MaxDownloadsReached,
@@ -76,9 +83,12 @@
     PlaylistEntries,
     Popen,
     PostProcessingError,
+    RateLimiter,
     ReExtractInfo,
     RejectedVideoReached,
+    RequestCoalescer,
     SameFileError,
+    SegmentTemplateFragments,
     UnavailableVideoError,
     YoutubeDLCookieProcessor,
     YoutubeDLHandler,
@@ -102,7 +112,6 @@
     int_or_none,
     iri_to_uri,
     join_nonempty,
-    locked_file,
     make_dir,
     make_HTTPS_handler,
     merge_headers,
@@ -271,6 +280,17 @@ class YoutubeDL:
     skip_download:     Skip the actual download of the video file
     cachedir:          Location of the cache files in the filesystem.
                        False to disable filesystem cache.
+    http_cache:        List of the extractors (case-insensitive IE keys) whose
+                       HTTP responses are cached and revalidated in cachedir
+    cache_max_size:    Maximum size in bytes of the entries in cachedir, other
+                       than those of the sections in cache_section_max_sizes.
+                       The least recently used entries are removed over it
+    cache_section_max_sizes: Dictionary of the sections of the cache that have
+                       a maximum size of their own, e.g. {'http': 64 * 1024 * 1024}
+                       for the HTTP responses of http_cache (the default)
+    cache_ttls:        Dictionary of the seconds after which the entries of the
+                       sections of the cache expire, e.g. {'http': 86400}.
+                       None for entries that never expire
     noplaylist:        Download single video instead of a playlist if in doubt.
     age_limit:         An integer representing the user's age in years.
                        Unsuitable videos for the given age are skipped.
@@ -285,13 +305,22 @@ class YoutubeDL:
                        downloaded. None for no limit.
     download_archive:  File name of a file where all downloads are recorded.
                        Videos already present in the file are not downloaded
-                       again.
+                       again. Files with an extension in
+                       yt_dlp.archive.SQLiteArchive.EXTENSIONS (or which
+                       already are SQLite databases) are stored as an indexed
+                       database. Can also be an object with "add" and
+                       "__contains__" methods (e.g. a set) to use as the archive.
     break_on_existing: Stop the download process after attempting to download a
                        file that is in the archive.
     break_on_reject:   Stop the download process when encountering a video that
                        has been filtered out.
     break_per_url:     Whether break_on_reject and break_on_existing
                        should act on each input URL as opposed to for the entire queue
+    parallel_videos:   Number of videos (URLs or playlist entries) to process
+                       in parallel. Their output is written in order, and
+                       ratelimit and the sleep intervals are shared by them.
+                       Videos that were already started are finished when
+                       max_downloads, break_on_existing, etc. are reached
     cookiefile:        File name or text stream from where cookies should be read and dumped to
     cookiesfrombrowser:  A tuple containing the name of the browser, the profile
                        name/pathfrom where cookies are loaded, and the name of the
@@ -350,6 +379,13 @@ class YoutubeDL:
                                          downloaded video fragment.
                        * fragment_count: The number of fragments (= individual
                                          files that will be merged)
+                       * workers: Stats of the threads downloading fragments,
+                                  by thread name. Each is a dict with the
+                                  entries downloaded_bytes, speed (of the
+                                  current fragment) and fragment_index
+                       * total_downloaded_bytes, total_speed, total_eta:
+                                  Progress of all the formats whose fragments
+                                  are downloaded at the same time
 
                        Progress hooks are guaranteed to be called at least once
                        (with status "finished") if the download is successful.
@@ -362,6 +398,12 @@ class YoutubeDL:
 
                        Progress hooks are guaranteed to be called at least twice
                        (with status "started" and "finished") if the processing is successful.
+    postprocessing_queue: Number of downloads that can wait to be post-processed
+                       in the background while the next videos are downloaded.
+                       The post_process, after_move and after_video
+                       postprocessors and the post_hooks run in that thread,
+                       and the results are updated once they are done.
+                       Default is 0: post-process before the next download
     merge_output_format: Extension to use when merging formats.
     final_ext:         Expected final extension; used to detect when the file was
                        already downloaded and converted
@@ -435,7 +477,8 @@ class YoutubeDL:
     nopart, updatetime, buffersize, ratelimit, throttledratelimit, min_filesize,
     max_filesize, test, noresizebuffer, retries, file_access_retries, fragment_retries,
     continuedl, noprogress, xattr_set_filesize, hls_use_mpegts, http_chunk_size,
-    external_downloader_args, concurrent_fragment_downloads.
+    external_downloader_args, concurrent_fragment_downloads, adaptive_fragment_downloads,
+    http_connections.
 
     The following options are used by the post processors:
     ffmpeg_location:   Location of the ffmpeg/avconv binary; either the path
@@ -550,6 +593,8 @@ def __init__(self, params=None, auto_init=True):
         self.params = params
         self._ies = {}
         self._ies_instances = {}
+        self._ie_index = None
+        self._connection_pool = None
         self._pps = {k: [] for k in POSTPROCESS_WHEN}
         self._printed_messages = set()
         self._first_webpage_request = True
@@ -561,6 +606,22 @@ def __init__(self, params=None, auto_init=True):
         self._num_videos = 0
         self._playlist_level = 0
         self._playlist_urls = set()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._output_lock = threading.RLock()
+        self._parallel_slots = threading.Semaphore(self.params.get('parallel_videos') or 1)
+        # Set on Ctrl+C, to stop the videos processed by the other threads
+        self._interrupted = threading.Event()
+        self._sleep_lock = threading.Lock()
+        self._request_coalescer = RequestCoalescer()
+        self._rate_limiter = (
+            RateLimiter(self.params['ratelimit'])
+            if self.params.get('ratelimit') and (self.params.get('parallel_videos') or 1) > 1 else None)
+        self._pp_executor = self._pp_slots = self._pp_error = None
+        if self.params.get('postprocessing_queue'):
+            # A single thread keeps the post-processing in the order of the downloads
+            self._pp_executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='PostProcessing')
+            self._pp_slots = threading.Semaphore(self.params['postprocessing_queue'])
         self.cache = Cache(self)
 
         windows_enable_vt_mode()
@@ -678,6 +739,7 @@ def check_deprecated(param, option, suggestion):
 
         self._parse_outtmpl()
 
+        self._format_selectors = {}
         # Creating format selector here allows us to catch syntax errors before the extraction
         self.format_selector = (
             self.params.get('format') if self.params.get('format') in (None, '-')
@@ -706,23 +768,16 @@ def check_deprecated(param, option, suggestion):
         self._setup_opener()
         register_socks_protocols()
 
-        def preload_download_archive(fn):
-            """Preload the archive, if any is specified"""
-            if fn is None:
-                return False
-            self.write_debug(f'Loading archive file {fn!r}')
-            try:
-                with locked_file(fn, 'r', encoding='utf-8') as archive_file:
-                    for line in archive_file:
-                        self.archive.add(line.strip())
-            except OSError as ioe:
-                if ioe.errno != errno.ENOENT:
-                    raise
-                return False
-            return True
+        def open_archive(archive):
+            """Open the archive, if any is specified"""
+            if archive is None:
+                return set()
+            elif not isinstance(archive, (str, os.PathLike)):
+                return archive
+            self.write_debug(f'Loading archive file {archive!r}')
+            return open_download_archive(archive)
 
-        self.archive = set()
-        preload_download_archive(self.params.get('download_archive'))
+        self.archive = open_archive(self.params.get('download_archive'))
 
     def warn_if_short_id(self, argv):
         if idxs := [
@@ -741,6 +796,8 @@ def warn_if_short_id(self, argv):
     def add_info_extractor(self, ie):
         """Add an InfoExtractor object to the end of the list."""
         ie_key = ie.ie_key()
+        if ie_key not in self._ies:
+            self._ie_index = None
         self._ies[ie_key] = ie
         if not isinstance(ie, type):
             self._ies_instances[ie_key] = ie
@@ -753,6 +810,12 @@ def _get_info_extractor_class(self, ie_key):
             self.add_info_extractor(ie)
         return ie
 
+    def _iter_candidate_ies(self, url):
+        """Yield (ie_key, ie) for the extractors that may be suitable for the URL, in order"""
+        if self._ie_index is None:
+            self._ie_index = ExtractorIndex(self._ies)
+        return self._ie_index.candidates(url)
+
     def get_info_extractor(self, ie_key):
         """
         Get an instance of an IE with name ie_key, it will try to get one from
@@ -811,7 +874,27 @@ def _write_string(self, message, out=None, only_once=False):
             if message in self._printed_messages:
                 return
             self._printed_messages.add(message)
-        write_string(message, out=out, encoding=self.params.get('encoding'))
+        self._write_output(getattr(self._local, 'output', None), message, out)
+
+    def _write_output(self, output, message, out):
+        with self._output_lock:
+            # The output of items processed in parallel is held back until it is their turn
+            while output is not None and output.live:
+                output = output.parent
+            if output is not None:
+                output.messages.append((message, out))
+            else:
+                write_string(message, out=out, encoding=self.params.get('encoding'))
+
+    def _output_is_live(self, output=NO_DEFAULT):
+        """Whether the output of the current thread (or the given output) is being written out"""
+        if output is NO_DEFAULT:
+            output = getattr(self._local, 'output', None)
+        while output is not None:
+            if not output.live:
+                return False
+            output = output.parent
+        return True
 
     def to_stdout(self, message, skip_eol=False, quiet=None):
         """Print message to stdout"""
@@ -871,11 +954,22 @@ def __enter__(self):
         self.save_console_title()
         return self
 
-    def __exit__(self, *args):
+    def __exit__(self, exc_type, *args):
         self.restore_console_title()
-
-        if self.params.get('cookiefile') is not None:
-            self.cookiejar.save(ignore_discard=True, ignore_expires=True)
+        try:
+            # The queued post-processing still uses the archive, cookies etc
+            if self._pp_executor is not None:
+                self._pp_executor.shutdown()
+        finally:
+            self.cache.close()
+            if self.params.get('cookiefile') is not None:
+                self.cookiejar.save(ignore_discard=True, ignore_expires=True)
+            if self._connection_pool is not None:
+                self._connection_pool.close()
+            if callable(getattr(self.archive, 'close', None)):
+                self.archive.close()
+        if exc_type is None and self._pp_executor is not None:
+            self._raise_post_processing_error()
 
     def trouble(self, message=None, tb=None, is_error=True):
         """Determine action to take when a download problem appears.
@@ -1041,6 +1135,7 @@ def _outtmpl_expandpath(outtmpl):
         return expand_path(outtmpl).replace(sep, '')
 
     @staticmethod
+    @functools.lru_cache(maxsize=256)
     def escape_outtmpl(outtmpl):
         ''' Escape any remaining strings like %s, %abc% etc. '''
         return re.sub(
@@ -1068,33 +1163,15 @@ def _copy_infodict(info_dict):
         info_dict.pop('__pending_error', None)
         return info_dict
 
-    def prepare_outtmpl(self, outtmpl, info_dict, sanitize=False):
-        """ Make the outtmpl and info_dict suitable for substitution: ydl.escape_outtmpl(outtmpl) % info_dict
-        @param sanitize    Whether to sanitize the output as a filename.
-                           For backward compatibility, a function can also be passed
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _compile_outtmpl(outtmpl):
+        """
+        Parse the fields of an output template, so that it can be evaluated repeatedly
+        @returns    (parts, needs_infodict) where parts are the literal strings and the
+                    parsed fields of the template, and needs_infodict is whether any
+                    field refers to the whole info_dict
         """
-
-        info_dict.setdefault('epoch', int(time.time()))  # keep epoch consistent once set
-
-        info_dict = self._copy_infodict(info_dict)
-        info_dict['duration_string'] = (  # %(duration>%H-%M-%S)s is wrong if duration > 24hrs
-            formatSeconds(info_dict['duration'], '-' if sanitize else ':')
-            if info_dict.get('duration', None) is not None
-            else None)
-        info_dict['autonumber'] = int(self.params.get('autonumber_start', 1) - 1 + self._num_downloads)
-        info_dict['video_autonumber'] = self._num_videos
-        if info_dict.get('resolution') is None:
-            info_dict['resolution'] = self.format_resolution(info_dict, default=None)
-
-        # For fields playlist_index, playlist_autonumber and autonumber convert all occurrences
-        # of %(field)s to %(field)0Nd for backward compatibility
-        field_size_compat_map = {
-            'playlist_index': number_of_digits(info_dict.get('__last_playlist_index') or 0),
-            'playlist_autonumber': number_of_digits(info_dict.get('n_entries') or 0),
-            'autonumber': self.params.get('autonumber_size') or 5,
-        }
-
-        TMPL_DICT = {}
         EXTERNAL_FORMAT_RE = re.compile(STR_FORMAT_RE_TMPL.format('[^)]*', f'[{STR_FORMAT_TYPES}ljqBUDS]'))
         MATH_FUNCTIONS = {
             '+': float.__add__,
@@ -1116,46 +1193,132 @@ def prepare_outtmpl(self, outtmpl, info_dict, sanitize=False):
                 (?:\|(?P<default>.*?))?
             )$''')
 
-        def _traverse_infodict(k):
-            k = k.split('.')
-            if k[0] == '':
-                k.pop(0)
-            return traverse_obj(info_dict, k, is_user_input=True, traverse_string=True)
+        needs_infodict = False
+
+        def parse_keys(field):
+            nonlocal needs_infodict
+            keys = field.split('.')
+            if keys[0] == '':
+                keys.pop(0)
+            # These are not simple lookups in the info_dict
+            if not keys or keys[0] == ':':
+                needs_infodict = True
+            return tuple(keys)
+
+        def parse_maths(offset_key):
+            maths, operator = [], None
+            while offset_key:
+                item = re.match(
+                    MATH_FIELD_RE if operator else MATH_OPERATORS_RE,
+                    offset_key,
+                )[0]
+                offset_key = offset_key[len(item):]
+                if operator is None:
+                    operator = MATH_FUNCTIONS[item]
+                    continue
+                item, multiplier = (item[1:], -1) if item[0] == '-' else (item, 1)
+                offset = float_or_none(item)
+                maths.append((operator, multiplier, offset, None if offset is not None else parse_keys(item)))
+                operator = None
+            return tuple(maths)
+
+        def parse_key(key):
+            mobj = re.match(INTERNAL_FORMAT_RE, key)
+            initial_field, alternatives = mobj['fields'] if mobj else '', []
+            while mobj:
+                mobj = mobj.groupdict()
+                alternatives.append((
+                    bool(mobj['negate']), parse_keys(mobj['fields']), parse_maths(mobj['maths']),
+                    mobj['strf_format'] and mobj['strf_format'].replace('\\,', ','),
+                    mobj['replacement'], mobj['default'], bool(mobj['alternate'])))
+                if not mobj['alternate']:
+                    break
+                mobj = re.match(INTERNAL_FORMAT_RE, mobj['remaining'][1:])
+            return initial_field, tuple(alternatives)
+
+        parts, last_end = [], 0
+        for outer_mobj in EXTERNAL_FORMAT_RE.finditer(outtmpl):
+            if not outer_mobj.group('has_key'):
+                continue
+            parts.append(outtmpl[last_end:outer_mobj.start()])
+            last_end = outer_mobj.end()
+            key, fmt = outer_mobj.group('key', 'format')
+            parts.append((
+                outer_mobj.group('prefix'), key, '%s\0%s' % (key.replace('%', '%\0'), fmt),
+                fmt, outer_mobj.group('conversion') or '', *parse_key(key)))
+        parts.append(outtmpl[last_end:])
+        return tuple(part for part in parts if part), needs_infodict
+
+    def prepare_outtmpl(self, outtmpl, info_dict, sanitize=False):
+        """ Make the outtmpl and info_dict suitable for substitution: ydl.escape_outtmpl(outtmpl) % info_dict
+        @param sanitize    Whether to sanitize the output as a filename.
+                           For backward compatibility, a function can also be passed
+        """
+
+        info_dict.setdefault('epoch', int(time.time()))  # keep epoch consistent once set
 
-        def get_value(mdict):
+        parts, needs_infodict = self._compile_outtmpl(outtmpl)
+
+        # Fields that are added to (or replaced in) a copy of the info_dict
+        extra_fields = {
+            'duration_string': (  # %(duration>%H-%M-%S)s is wrong if duration > 24hrs
+                formatSeconds(info_dict['duration'], '-' if sanitize else ':')
+                if info_dict.get('duration', None) is not None
+                else None),
+            # Videos processed in parallel keep the numbers they were given
+            'autonumber': int(
+                self.params.get('autonumber_start', 1) - 1 + getattr(self._local, 'num_downloads', self._num_downloads)),
+            'video_autonumber': getattr(self._local, 'num_videos', self._num_videos),
+        }
+        if info_dict.get('resolution') is None:
+            extra_fields['resolution'] = self.format_resolution(info_dict, default=None)
+
+        if needs_infodict:
+            info_dict = self._copy_infodict(info_dict)
+            info_dict.update(extra_fields)
+            extra_fields = {}
+
+        def _traverse_infodict(keys):
+            if needs_infodict:
+                return traverse_obj(info_dict, keys, is_user_input=True, traverse_string=True)
+            # Only the fields that are used are looked up, instead of copying the info_dict
+            if keys[0] in extra_fields:
+                value = extra_fields[keys[0]]
+            elif keys[0] in ('__postprocessors', '__pending_error'):
+                return None
+            else:
+                value = info_dict.get(keys[0])
+            return traverse_obj(value, keys[1:], is_user_input=True, traverse_string=True) if len(keys) > 1 else value
+
+        # For fields playlist_index, playlist_autonumber and autonumber convert all occurrences
+        # of %(field)s to %(field)0Nd for backward compatibility
+        field_size_compat_map = {
+            'playlist_index': lambda: number_of_digits(info_dict.get('__last_playlist_index') or 0),
+            'playlist_autonumber': lambda: number_of_digits(info_dict.get('n_entries') or 0),
+            'autonumber': lambda: self.params.get('autonumber_size') or 5,
+        }
+
+        def get_value(negate, keys, maths, strf_format):
             # Object traversal
-            value = _traverse_infodict(mdict['fields'])
+            value = _traverse_infodict(keys)
             # Negative
-            if mdict['negate']:
+            if negate:
                 value = float_or_none(value)
                 if value is not None:
                     value *= -1
             # Do maths
-            offset_key = mdict['maths']
-            if offset_key:
+            if maths:
                 value = float_or_none(value)
-                operator = None
-                while offset_key:
-                    item = re.match(
-                        MATH_FIELD_RE if operator else MATH_OPERATORS_RE,
-                        offset_key,
-                    )[0]
-                    offset_key = offset_key[len(item):]
-                    if operator is None:
-                        operator = MATH_FUNCTIONS[item]
-                        continue
-                    item, multiplier = (item[1:], -1) if item[0] == '-' else (item, 1)
-                    offset = float_or_none(item)
+                for math_func, multiplier, offset, offset_keys in maths:
                     if offset is None:
-                        offset = float_or_none(_traverse_infodict(item))
+                        offset = float_or_none(_traverse_infodict(offset_keys))
                     try:
-                        value = operator(value, multiplier * offset)
+                        value = math_func(value, multiplier * offset)
                     except (TypeError, ZeroDivisionError):
                         return None
-                    operator = None
             # Datetime formatting
-            if mdict['strf_format']:
-                value = strftime_or_none(value, mdict['strf_format'].replace('\\,', ','))
+            if strf_format:
+                value = strftime_or_none(value, strf_format)
 
             return value
 
@@ -1173,30 +1336,20 @@ def filename_sanitizer(key, value, restricted=self.params.get('restrictfilenames
         def _dumpjson_default(obj):
             return list(obj) if isinstance(obj, (set, LazyList)) else repr(obj)
 
-        def create_key(outer_mobj):
-            if not outer_mobj.group('has_key'):
-                return outer_mobj.group(0)
-            key = outer_mobj.group('key')
-            mobj = re.match(INTERNAL_FORMAT_RE, key)
-            initial_field = mobj['fields'] if mobj else ''
+        def create_key(prefix, key, tmpl_key, fmt, flags, initial_field, alternatives):
             value, replacement, default = None, None, na
-            while mobj:
-                mobj = mobj.groupdict()
-                default = mobj['default'] if mobj['default'] is not None else default
-                value = get_value(mobj)
-                replacement = mobj['replacement']
-                if value is None and mobj['alternate']:
-                    mobj = re.match(INTERNAL_FORMAT_RE, mobj['remaining'][1:])
-                else:
+            for *field, alt_replacement, alt_default, alternate in alternatives:
+                default = alt_default if alt_default is not None else default
+                value = get_value(*field)
+                replacement = alt_replacement
+                if value is not None or not alternate:
                     break
 
-            fmt = outer_mobj.group('format')
             if fmt == 's' and value is not None and key in field_size_compat_map:
-                fmt = f'0{field_size_compat_map[key]:d}d'
+                fmt = f'0{field_size_compat_map[key]():d}d'
 
             value = default if value is None else value if replacement is None else replacement
 
-            flags = outer_mobj.group('conversion') or ''
             str_fmt = f'{fmt[:-1]}s'
             if fmt[-1] == 'l':  # list
                 delim = '\n' if '#' in flags else ', '
@@ -1241,11 +1394,11 @@ def create_key(outer_mobj):
                 if fmt[-1] in 'csr':
                     value = sanitizer(initial_field, value)
 
-            key = '%s\0%s' % (key.replace('%', '%\0'), outer_mobj.group('format'))
-            TMPL_DICT[key] = value
-            return '{prefix}%({key}){fmt}'.format(key=key, fmt=fmt, prefix=outer_mobj.group('prefix'))
+            TMPL_DICT[tmpl_key] = value
+            return f'{prefix}%({tmpl_key}){fmt}'
 
-        return EXTERNAL_FORMAT_RE.sub(create_key, outtmpl), TMPL_DICT
+        TMPL_DICT = {}
+        return ''.join(part if isinstance(part, str) else create_key(*part) for part in parts), TMPL_DICT
 
     def evaluate_outtmpl(self, outtmpl, info_dict, *args, **kwargs):
         outtmpl, info_dict = self.prepare_outtmpl(outtmpl, info_dict, *args, **kwargs)
@@ -1394,8 +1547,11 @@ def extract_info(self, url, download=True, ie_key=None, extra_info=None,
         if not ie_key and force_generic_extractor:
             ie_key = 'Generic'
 
-        ies = {ie_key: self._get_info_extractor_class(ie_key)} if ie_key else self._ies
-        for ie_key, ie in ies.items():
+        if ie_key:
+            ies = {ie_key: self._get_info_extractor_class(ie_key)}.items()
+        else:
+            ies = self._iter_candidate_ies(url)
+        for ie_key, ie in ies:
             if not ie.suitable(url):
                 continue
 
@@ -1558,7 +1714,16 @@ def process_ie_result(self, ie_result, download=True, extra_info=None):
 
         if result_type == 'video':
             self.add_extra_info(ie_result, extra_info)
-            ie_result = self.process_video_result(ie_result, download=download)
+            if getattr(self._local, 'playlist_level', 0) or getattr(self._local, 'defer_post_processing', False):
+                ie_result = self.process_video_result(ie_result, download=download)
+            else:
+                # Only wait for the post-processing of this video, not of those queued by other threads
+                self._local.pending_post_processing = pending = []
+                try:
+                    ie_result = self.process_video_result(ie_result, download=download)
+                finally:
+                    del self._local.pending_post_processing
+                self._wait_for_post_processing(pending)
             self._raise_pending_errors(ie_result)
             additional_urls = (ie_result or {}).get('additional_urls')
             if additional_urls:
@@ -1624,16 +1789,20 @@ def process_ie_result(self, ie_result, download=True, extra_info=None):
                 )
                 return
 
-            self._playlist_level += 1
-            self._playlist_urls.add(webpage_url)
+            with self._lock:
+                self._playlist_level += 1
+                self._playlist_urls.add(webpage_url)
+            self._local.playlist_level = getattr(self._local, 'playlist_level', 0) + 1
             self._fill_common_fields(ie_result, False)
             self._sanitize_thumbnails(ie_result)
             try:
                 return self.__process_playlist(ie_result, download)
             finally:
-                self._playlist_level -= 1
-                if not self._playlist_level:
-                    self._playlist_urls.clear()
+                self._local.playlist_level -= 1
+                with self._lock:
+                    self._playlist_level -= 1
+                    if not self._playlist_level:
+                        self._playlist_urls.clear()
         elif result_type == 'compat_list':
             self.report_warning(
                 'Extractor %s returned a compat_list result. '
@@ -1722,45 +1891,56 @@ def __process_playlist(self, ie_result, download):
         failures = 0
         max_failures = self.params.get('skip_playlist_after_errors') or float('inf')
         self.episode = entries
-        # for i, (playlist_index, entry) in enumerate(entries):
-        #     if lazy:
-        #         resolved_entries.append((playlist_index, entry))
-        #
-        #     # TODO: Add auto-generated fields
-        #     if not entry or self._match_entry(entry, incomplete=True) is not None:
-        #         continue
-        #
-        #     self.to_screen('[download] Downloading video %s of %s' % (
-        #         self._format_screen(i + 1, self.Styles.ID), self._format_screen(n_entries, self.Styles.EMPHASIS)))
-        #
-        #     entry['__x_forwarded_for_ip'] = ie_result.get('__x_forwarded_for_ip')
-        #     if not lazy and 'playlist-index' in self.params.get('compat_opts', []):
-        #         playlist_index = ie_result['requested_entries'][i]
-        #
-        #     entry_result = self.__process_iterable_entry(entry, download, {
-        #         'n_entries': int_or_none(n_entries),
-        #         '__last_playlist_index': max(ie_result['requested_entries'] or (0, 0)),
-        #         'playlist_count': ie_result.get('playlist_count'),
-        #         'playlist_index': playlist_index,
-        #         'playlist_autonumber': i + 1,
-        #         'playlist': title,
-        #         'playlist_id': ie_result.get('id'),
-        #         'playlist_title': ie_result.get('title'),
-        #         'playlist_uploader': ie_result.get('uploader'),
-        #         'playlist_uploader_id': ie_result.get('uploader_id'),
-        #         'extractor': ie_result['extractor'],
-        #         'webpage_url': ie_result['webpage_url'],
-        #         'webpage_url_basename': url_basename(ie_result['webpage_url']),
-        #         'webpage_url_domain': get_domain(ie_result['webpage_url']),
-        #         'extractor_key': ie_result['extractor_key'],
-        #     })
-        #     if not entry_result:
-        #         failures += 1
-        #     if failures >= max_failures:
-        #         self.report_error(
-        #             f'Skipping the remaining entries in playlist "{title}" since {failures} items failed extraction')
-        #         break
-        #     resolved_entries[i] = (playlist_index, entry_result)
+
+        def requested_entries():
+            for i, (playlist_index, entry) in enumerate(entries):
+                if lazy:
+                    resolved_entries.append((playlist_index, entry))
+                yield i, playlist_index, entry
+
+        def process_entry(args):
+            i, playlist_index, entry = args
+            # TODO: Add auto-generated fields
+            if not entry or self._match_entry(entry, incomplete=True) is not None:
+                return None
+
+            self.to_screen('[download] Downloading video %s of %s' % (
+                self._format_screen(i + 1, self.Styles.ID), self._format_screen(n_entries, self.Styles.EMPHASIS)))
+
+            entry['__x_forwarded_for_ip'] = ie_result.get('__x_forwarded_for_ip')
+            if not lazy and 'playlist-index' in self.params.get('compat_opts', []):
+                playlist_index = ie_result['requested_entries'][i]
+
+            return playlist_index, self.__process_iterable_entry(entry, download, {
+                'n_entries': int_or_none(n_entries),
+                '__last_playlist_index': max(ie_result['requested_entries'] or (0, 0)),
+                'playlist_count': ie_result.get('playlist_count'),
+                'playlist_index': playlist_index,
+                'playlist_autonumber': i + 1,
+                'playlist': title,
+                'playlist_id': ie_result.get('id'),
+                'playlist_title': ie_result.get('title'),
+                'playlist_uploader': ie_result.get('uploader'),
+                'playlist_uploader_id': ie_result.get('uploader_id'),
+                'extractor': ie_result['extractor'],
+                'webpage_url': ie_result['webpage_url'],
+                'webpage_url_basename': url_basename(ie_result['webpage_url']),
+                'webpage_url_domain': get_domain(ie_result['webpage_url']),
+                'extractor_key': ie_result['extractor_key'],
+            })
+
+        for (i, *_), result in self._process_concurrently(process_entry, requested_entries()):
+            if result is None:
+                continue
+            playlist_index, entry_result = result
+            if not entry_result:
+                failures += 1
+            if failures >= max_failures:
+                self.report_error(
+                    f'Skipping the remaining entries in playlist "{title}" since {failures} items failed extraction')
+                break
+            resolved_entries[i] = (playlist_index, entry_result)
+        self._wait_for_post_processing()
 
         # Update with processed data
         ie_result['requested_entries'], ie_result['entries'] = tuple(zip(*resolved_entries)) or ([], [])
@@ -1899,6 +2079,15 @@ def can_merge():
         )
 
     def build_format_selector(self, format_spec):
+        check_formats = self.params.get('check_formats') == 'selected'
+        allow_multiple_streams = {'audio': self.params.get('allow_multiple_audio_streams', False),
+                                  'video': self.params.get('allow_multiple_video_streams', False)}
+
+        # The same spec is usually selected from for every video
+        cache_key = (format_spec, check_formats, *allow_multiple_streams.values())
+        if cache_key in self._format_selectors:
+            return self._format_selectors[cache_key]
+
         def syntax_error(note, start):
             message = (
                 'Invalid format specification: '
@@ -1911,11 +2100,6 @@ def syntax_error(note, start):
         GROUP = 'GROUP'
         FormatSelector = collections.namedtuple('FormatSelector', ['type', 'selector', 'filters'])
 
-        allow_multiple_streams = {'audio': self.params.get('allow_multiple_audio_streams', False),
-                                  'video': self.params.get('allow_multiple_video_streams', False)}
-
-        check_formats = self.params.get('check_formats') == 'selected'
-
         def _parse_filter(tokens):
             filter_parts = []
             for type, string, start, _, _ in tokens:
@@ -2054,7 +2238,9 @@ def _merge(formats_pair):
                 else:
                     output_ext = 'mkv'
 
-            filtered = lambda *keys: filter(None, (traverse_obj(fmt, *keys) for fmt in formats_info))
+            # Same as traverse_obj(fmt, *keys), which is slow in this hot path
+            filtered = lambda *keys: filter(None, (
+                next((fmt[key] for key in keys if fmt.get(key) is not None), None) for fmt in formats_info))
 
             new_dict = {
                 'requested_formats': formats_info,
@@ -2185,7 +2371,16 @@ def selector_function(ctx):
 
                     def selector_function(ctx):
                         formats = list(ctx['formats'])
-                        matches = list(filter(filter_f, formats)) if filter_f is not None else formats
+                        if check_formats:
+                            matches = list(filter(filter_f, formats))
+                        else:
+                            # Only the formats up to the requested one need to be checked
+                            matches = list(itertools.islice(
+                                filter(filter_f, reversed(formats) if format_reverse else formats), format_idx))
+                            if matches:
+                                if len(matches) == format_idx:
+                                    yield matches[-1]
+                                return
                         if not matches:
                             if format_fallback and ctx['incomplete_formats']:
                                 # for extractors with incomplete formats (audio only (soundcloud)
@@ -2238,7 +2433,8 @@ def restore_last_token(self):
                 self.counter -= 1
 
         parsed_selector = _parse_format_selection(iter(TokenIterator(tokens)))
-        return _build_selector_function(parsed_selector)
+        self._format_selectors[cache_key] = _build_selector_function(parsed_selector)
+        return self._format_selectors[cache_key]
 
     def _calc_headers(self, info_dict):
         res = merge_headers(self.params['http_headers'], info_dict.get('http_headers') or {})
@@ -2359,7 +2555,9 @@ def _raise_pending_errors(self, info):
 
     def process_video_result(self, info_dict, download=True):
         assert info_dict.get('_type', 'video') == 'video'
-        self._num_videos += 1
+        with self._lock:
+            self._num_videos += 1
+            self._local.num_videos = self._num_videos
 
         if 'id' not in info_dict:
             raise ExtractorError('Missing "id" field in extractor result', ie=info_dict['extractor'])
@@ -2478,6 +2676,9 @@ def is_wellformed(f):
             sanitize_string_field(format, 'format_id')
             sanitize_numeric_fields(format)
             format['url'] = sanitize_url(format['url'])
+            if isinstance(format.get('fragments'), dict):
+                # Compact fragments from an info json
+                format['fragments'] = SegmentTemplateFragments.from_dict(format['fragments'])
             if not format.get('format_id'):
                 format['format_id'] = str(i)
             else:
@@ -2633,31 +2834,40 @@ def to_screen(*msg):
                         'section_title': chapter.get('title'),
                         'section_number': chapter.get('index'),
                     })
-                downloaded_formats.append(new_info)
                 try:
                     self.process_info(new_info)
                 except MaxDownloadsReached:
                     max_downloads_reached = True
+                    if new_info.pop('__not_started', False):
+                        break
+                downloaded_formats.append(new_info)
                 self._raise_pending_errors(new_info)
-                # Remove copied info
-                for key, val in tuple(new_info.items()):
-                    if info_dict.get(key) == val:
-                        new_info.pop(key)
                 if max_downloads_reached:
                     break
 
-            write_archive = {f.get('__write_download_archive', False) for f in downloaded_formats}
-            assert write_archive.issubset({True, False, 'ignore'})
-            if True in write_archive and False not in write_archive:
-                self.record_download_archive(info_dict)
-
-            info_dict['requested_downloads'] = downloaded_formats
-            info_dict = self.run_all_pps('after_video', info_dict)
+            def post_process_video():
+                for new_info in downloaded_formats:
+                    # Remove copied info
+                    for key, val in tuple(new_info.items()):
+                        if info_dict.get(key) == val:
+                            new_info.pop(key)
+
+                write_archive = {f.get('__write_download_archive', False) for f in downloaded_formats}
+                assert write_archive.issubset({True, False, 'ignore'})
+                if True in write_archive and False not in write_archive:
+                    self.record_download_archive(info_dict)
+
+                info_dict['requested_downloads'] = downloaded_formats
+                self._replace_info_dict(info_dict, self.run_all_pps('after_video', info_dict))
+                # We update the info dict with the selected best quality format (backwards compatibility)
+                info_dict.update(best_format)
+
+            if downloaded_formats:
+                self._run_post_processing_stage(post_process_video, queue=False)
             if max_downloads_reached:
                 raise MaxDownloadsReached()
-
-        # We update the info dict with the selected best quality format (backwards compatibility)
-        info_dict.update(best_format)
+        else:
+            info_dict.update(best_format)
         return info_dict
 
     def process_subtitles(self, video_id, normal_subtitles, automatic_captions):
@@ -2863,7 +3073,14 @@ def process_info(self, info_dict):
 
         # Does nothing under normal operation - for backward compatibility of process_info
         self.post_extract(info_dict)
-        self._num_downloads += 1
+        with self._lock:
+            # Videos processed in parallel may have been started while the others were being downloaded
+            if (self.params.get('parallel_videos') or 1) > 1 and (
+                    self._num_downloads >= float(self.params.get('max_downloads') or 'inf')):
+                info_dict['__not_started'] = True
+                raise MaxDownloadsReached()
+            self._num_downloads += 1
+            self._local.num_downloads = self._num_downloads
 
         # info_dict['_filename'] needs to be set for backward compatibility
         info_dict['_filename'] = full_filename = self.prepare_filename(info_dict, warn=True)
@@ -2977,15 +3194,12 @@ def _write_link_file(link_type):
             return
 
         def replace_info_dict(new_info):
-            nonlocal info_dict
-            if new_info == info_dict:
-                return
-            info_dict.clear()
-            info_dict.update(new_info)
+            self._replace_info_dict(info_dict, new_info)
 
         new_info, files_to_move = self.pre_process(info_dict, 'before_dl', files_to_move)
         replace_info_dict(new_info)
 
+        post_processed = False
         if self.params.get('skip_download'):
             info_dict['filepath'] = temp_filename
             info_dict['__finaldir'] = os.path.dirname(os.path.abspath(encodeFilename(full_filename)))
@@ -3208,24 +3422,92 @@ def ffmpeg_fixup(cndn, msg, cls):
                     ffmpeg_fixup(downloader == 'web_socket_fragment', 'Malformed duration detected', FFmpegFixupDurationPP)
 
                 fixup()
-                try:
-                    replace_info_dict(self.post_process(dl_filename, info_dict, files_to_move))
-                except PostProcessingError as err:
-                    self.report_error('Postprocessing: %s' % str(err))
-                    return
-                try:
-                    for ph in self._post_hooks:
-                        ph(info_dict['filepath'])
-                except Exception as err:
-                    self.report_error('post hooks: %s' % str(err))
-                    return
-                info_dict['__write_download_archive'] = True
+
+                def post_process():
+                    try:
+                        replace_info_dict(self.post_process(dl_filename, info_dict, files_to_move))
+                    except PostProcessingError as err:
+                        self.report_error('Postprocessing: %s' % str(err))
+                        return
+                    try:
+                        for ph in self._post_hooks:
+                            ph(info_dict['filepath'])
+                    except Exception as err:
+                        self.report_error('post hooks: %s' % str(err))
+                        return
+                    # Set by the thread that post-processes, since only it may modify info_dict
+                    info_dict['__write_download_archive'] = True
+
+                self._run_post_processing_stage(post_process)
+                post_processed = True
 
         assert info_dict is original_infodict  # Make sure the info_dict was modified in-place
-        if self.params.get('force_write_download_archive'):
+        if self.params.get('force_write_download_archive') and not post_processed:
             info_dict['__write_download_archive'] = True
         check_max_downloads()
 
+    @staticmethod
+    def _replace_info_dict(info_dict, new_info):
+        """Update info_dict in-place to be new_info"""
+        if new_info == info_dict:
+            return
+        info_dict.clear()
+        info_dict.update(new_info)
+
+    def _run_post_processing_stage(self, func, queue=True):
+        """
+        Call func, which post-processes a download, after the calls made before it
+
+        With postprocessing_queue, func is called in the background so that the next
+        video can be downloaded meanwhile. If queue is set and the queue is full, this waits
+        for the post-processing to catch up. An error raised by an earlier call is raised here
+        """
+        if self._pp_executor is None or getattr(self._local, 'post_processing', False):
+            return func()
+        self._raise_post_processing_error()
+        state = {**vars(self._local), 'post_processing': True}
+
+        def run():
+            if queue:
+                self._pp_slots.release()
+            vars(self._local).update(state)
+            try:
+                with self._lock:
+                    if self._pp_error is not None:
+                        return  # The downloads queued after an error are not post-processed
+                func()
+            except BaseException as e:
+                with self._lock:
+                    self._pp_error = self._pp_error or e
+            finally:
+                vars(self._local).clear()
+
+        if queue:
+            self._pp_slots.acquire()
+        future = self._pp_executor.submit(run)
+        pending = getattr(self._local, 'pending_post_processing', None)
+        if pending is not None:
+            pending.append(future)
+
+    def _raise_post_processing_error(self):
+        with self._lock:
+            error, self._pp_error = self._pp_error, None
+        if error is not None:
+            raise error
+
+    def _wait_for_post_processing(self, futures=None):
+        """
+        Wait for the queued downloads to be post-processed
+        @param futures  The futures of _run_post_processing_stage to wait for (default: all of them)
+        """
+        if self._pp_executor is None or getattr(self._local, 'post_processing', False):
+            return
+        if futures is None:
+            # The calls are run in order, so the earlier ones are done once this one is
+            futures = [self._pp_executor.submit(lambda: None)]
+        concurrent.futures.wait(futures)
+        self._raise_post_processing_error()
+
     def __download_wrapper(self, func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
@@ -3243,6 +3525,102 @@ def wrapper(*args, **kwargs):
                     self.to_stdout(json.dumps(self.sanitize_info(res)))
         return wrapper
 
+    def _process_concurrently(self, func, items):
+        """
+        Call func with each of the items, in up to parallel_videos threads at once
+
+        The output of each call is held back until the calls for the items before it are done.
+        Once a call fails, no more items are started, and the error is raised after
+        the calls that were already started are done
+        @returns    Generator of (item, return value of the call) in the order of the items
+        """
+        max_workers = self.params.get('parallel_videos') or 1
+        if max_workers <= 1:
+            for item in items:
+                yield item, func(item)
+            return
+
+        parent_output = getattr(self._local, 'output', None)
+        playlist_level = getattr(self._local, 'playlist_level', 0)
+        defer_post_processing = getattr(self._local, 'defer_post_processing', False)
+
+        def worker(future, output, item):
+            self._local.output = output
+            self._local.playlist_level = playlist_level
+            self._local.defer_post_processing = defer_post_processing
+            with self._parallel_slots:
+                try:
+                    if self._interrupted.is_set():
+                        raise KeyboardInterrupt()
+                    future.set_result(func(item))
+                except BaseException as e:
+                    future.set_exception(e)
+
+        def wait(future):
+            # A worker waiting for the items of a playlist does not take up a slot
+            if parent_output is not None:
+                self._parallel_slots.release()
+            try:
+                while not future.done():
+                    concurrent.futures.wait((future, ), 1)
+            finally:
+                if parent_output is not None:
+                    self._parallel_slots.acquire()
+
+        def finish(output):
+            with self._output_lock:
+                output.live = True
+                for message, out in output.messages:
+                    self._write_output(output, message, out)
+                output.messages.clear()
+
+        items, pending, exhausted, error = iter(items), collections.deque(), False, None
+        try:
+            while True:
+                while not exhausted and len(pending) < max_workers and error is None and not any(
+                        future.done() and future.exception() for _, future, _ in pending):
+                    item = next(items, NO_DEFAULT)
+                    if item is NO_DEFAULT:
+                        exhausted = True
+                        break
+                    output = types.SimpleNamespace(parent=parent_output, messages=[], live=False)
+                    future = concurrent.futures.Future()
+                    pending.append((item, future, output))
+                    threading.Thread(target=worker, args=(future, output, item), daemon=True).start()
+                if not pending:
+                    break
+                item, future, output = pending[0]
+                finish(output)
+                wait(future)
+                pending.popleft()
+                if error is None and future.exception() is not None:
+                    error = future.exception()
+                if error is None:
+                    yield item, future.result()
+        except GeneratorExit:
+            # The remaining items are not needed, but the calls already started have to be finished
+            for _, future, output in pending:
+                finish(output)
+                wait(future)
+            raise
+        except KeyboardInterrupt:
+            # The workers that did not start are cancelled, and the others are stopped at their next
+            # progress update (see FileDownloader._hook_progress) and waited for, so that they are not
+            # killed in the middle of writing a file
+            self._interrupted.set()
+            if parent_output is None:
+                self.to_screen('[info] Interrupted by user; waiting for the videos in progress to stop')
+            try:
+                for _, future, output in pending:
+                    finish(output)
+                    wait(future)
+            finally:
+                if parent_output is None:
+                    self._interrupted.clear()
+            raise
+        if error is not None:
+            raise error
+
     def download(self, url_list):
         """Download a given list of URLs."""
         url_list = variadic(url_list)  # Passing a single URL is a common mistake
@@ -3253,9 +3631,17 @@ def download(self, url_list):
                 and self.params.get('max_downloads') != 1):
             raise SameFileError(outtmpl)
 
-        for url in url_list:
-            self.__download_wrapper(self.extract_info)(
-                url, force_generic_extractor=self.params.get('force_generic_extractor', False))
+        # Like the entries of a playlist, the videos are post-processed while the next URLs are downloaded.
+        # With --dump-single-json, each result is printed and so has to be complete once it is returned
+        self._local.defer_post_processing = not self.params.get('dump_single_json')
+        try:
+            for _ in self._process_concurrently(functools.partial(
+                    self.__download_wrapper(self.extract_info),
+                    force_generic_extractor=self.params.get('force_generic_extractor', False)), url_list):
+                pass
+        finally:
+            self._local.defer_post_processing = False
+        self._wait_for_post_processing()
 
         return self._download_retcode
 
@@ -3299,6 +3685,8 @@ def filter_fn(obj):
                 return {k: filter_fn(v) for k, v in obj.items() if not reject(k, v)}
             elif isinstance(obj, (list, tuple, set, LazyList)):
                 return list(map(filter_fn, obj))
+            elif isinstance(obj, SegmentTemplateFragments):
+                return filter_fn(obj.to_dict())
             elif obj is None or isinstance(obj, (str, int, float, bool)):
                 return obj
             else:
@@ -3396,7 +3784,7 @@ def _make_archive_id(self, info_dict):
             if not url:
                 return
             # Try to find matching extractor for the URL and take its ie_key
-            for ie_key, ie in self._ies.items():
+            for ie_key, ie in self._iter_candidate_ies(url):
                 if ie.suitable(url):
                     extractor = ie_key
                     break
@@ -3422,8 +3810,6 @@ def record_download_archive(self, info_dict):
         vid_id = self._make_archive_id(info_dict)
         assert vid_id
         self.write_debug(f'Adding to archive: {vid_id}')
-        with locked_file(fn, 'a', encoding='utf-8') as archive_file:
-            archive_file.write(vid_id + '\n')
         self.archive.add(vid_id)
 
     @staticmethod
@@ -3601,7 +3987,8 @@ def urlopen(self, req):
         """ Start an HTTP download """
         if isinstance(req, str):
             req = sanitized_Request(req)
-        return self._opener.open(req, timeout=self._socket_timeout)
+        return self._request_coalescer.open(
+            functools.partial(self._opener.open, timeout=self._socket_timeout), req)
 
     def print_debug_header(self):
         if not self.params.get('verbose'):
@@ -3741,8 +4128,11 @@ def _setup_opener(self):
         proxy_handler = PerRequestProxyHandler(proxies)
 
         debuglevel = 1 if self.params.get('debug_printtraffic') else 0
-        https_handler = make_HTTPS_handler(self.params, debuglevel=debuglevel)
-        ydlh = YoutubeDLHandler(self.params, debuglevel=debuglevel)
+        if 'no-keep-alive' not in self.params.get('compat_opts', []):
+            self._connection_pool = HTTPConnectionPool()
+        https_handler = make_HTTPS_handler(
+            self.params, debuglevel=debuglevel, connection_pool=self._connection_pool)
+        ydlh = YoutubeDLHandler(self.params, debuglevel=debuglevel, connection_pool=self._connection_pool)
         redirect_handler = YoutubeDLRedirectHandler()
         data_handler = urllib.request.DataHandler()
 
@@ -3756,8 +4146,10 @@ def file_open(*args, **kwargs):
             raise urllib.error.URLError('file:// scheme is explicitly disabled in yt-dlp for security reasons')
         file_handler.file_open = file_open
 
-        opener = urllib.request.build_opener(
-            proxy_handler, https_handler, cookie_processor, ydlh, redirect_handler, data_handler, file_handler)
+        handlers = [proxy_handler, https_handler, cookie_processor, ydlh, redirect_handler, data_handler, file_handler]
+        if self.params.get('http_cache'):
+            handlers.append(HTTPCacheHandler(self.cache))
+        opener = urllib.request.build_opener(*handlers)
 
         # Delete the default user-agent header, which would otherwise apply in
         # cases where our custom HTTP handler doesn't come into play
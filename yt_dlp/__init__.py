@@ -191,7 +191,10 @@ def validate_minmax(min_val, max_val, min_name, max_name=None):
     validate_positive('autonumber start', opts.autonumber_start)
     validate_positive('autonumber size', opts.autonumber_size, True)
     validate_positive('concurrent fragments', opts.concurrent_fragment_downloads, True)
+    validate_positive('HTTP connections', opts.http_connections, True)
+    validate_positive('parallel videos', opts.parallel_videos, True)
     validate_positive('playlist start', opts.playliststart, True)
+    validate_positive('post-processing queue', opts.postprocessing_queue)
     if opts.playlistend != -1:
         validate_minmax(opts.playliststart, opts.playlistend, 'playlist start', 'playlist end')
 
@@ -286,6 +289,8 @@ def parse_bytes(name, value):
     opts.max_filesize = parse_bytes('max filesize', opts.max_filesize)
     opts.buffersize = parse_bytes('buffer size', opts.buffersize)
     opts.http_chunk_size = parse_bytes('http chunk size', opts.http_chunk_size)
+    opts.cache_max_size = parse_bytes('cache max size', opts.cache_max_size)
+    opts.http_cache_max_size = parse_bytes('http cache max size', opts.http_cache_max_size)
 
     # Output templates
     def validate_outtmpl(tmpl, msg):
@@ -759,6 +764,9 @@ def parse_options(argv=None):
         'skip_unavailable_fragments': opts.skip_unavailable_fragments,
         'keep_fragments': opts.keep_fragments,
         'concurrent_fragment_downloads': opts.concurrent_fragment_downloads,
+        'adaptive_fragment_downloads': opts.adaptive_fragment_downloads,
+        'http_connections': opts.http_connections,
+        'parallel_videos': opts.parallel_videos,
         'buffersize': opts.buffersize,
         'noresizebuffer': opts.noresizebuffer,
         'http_chunk_size': opts.http_chunk_size,
@@ -811,6 +819,9 @@ def parse_options(argv=None):
         'max_views': opts.max_views,
         'daterange': opts.date,
         'cachedir': opts.cachedir,
+        'http_cache': opts.http_cache,
+        'cache_max_size': opts.cache_max_size,
+        'cache_section_max_sizes': {'http': opts.http_cache_max_size} if opts.http_cache_max_size else None,
         'youtube_print_sig_code': opts.youtube_print_sig_code,
         'age_limit': opts.age_limit,
         'download_archive': opts.download_archive,
@@ -853,6 +864,7 @@ def parse_options(argv=None):
         'external_downloader': opts.external_downloader,
         'download_ranges': opts.download_ranges,
         'force_keyframes_at_cuts': opts.force_keyframes_at_cuts,
+        'postprocessing_queue': opts.postprocessing_queue,
         'list_thumbnails': opts.list_thumbnails,
         'playlist_items': opts.playlist_items,
         'xattr_set_filesize': opts.xattr_set_filesize,
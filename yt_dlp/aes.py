@@ -1,5 +1,7 @@
 import base64
-from math import ceil
+import functools
+import hmac
+import struct
 
 from .compat import compat_ord
 from .dependencies import Cryptodome_AES
@@ -17,11 +19,11 @@ def aes_gcm_decrypt_and_verify_bytes(data, key, tag, nonce):
 else:
     def aes_cbc_decrypt_bytes(data, key, iv):
         """ Decrypt bytes with AES-CBC using native implementation since pycryptodome is unavailable """
-        return intlist_to_bytes(aes_cbc_decrypt(*map(bytes_to_intlist, (data, key, iv))))
+        return _cbc_decrypt_bytes(data, key, iv)
 
     def aes_gcm_decrypt_and_verify_bytes(data, key, tag, nonce):
         """ Decrypt bytes with AES-GCM using native implementation since pycryptodome is unavailable """
-        return intlist_to_bytes(aes_gcm_decrypt_and_verify(*map(bytes_to_intlist, (data, key, tag, nonce))))
+        return _gcm_decrypt_and_verify_bytes(data, key, tag, nonce)
 
 
 def unpad_pkcs7(data):
@@ -40,16 +42,7 @@ def aes_ecb_encrypt(data, key, iv=None):
     @param {int[]} iv          Unused for this mode
     @returns {int[]}           encrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
-
-    encrypted_data = []
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        encrypted_data += aes_encrypt(block, expanded_key)
-    encrypted_data = encrypted_data[:len(data)]
-
-    return encrypted_data
+    return list(_ecb_bytes(bytes(data), bytes(key), _encrypt_block))
 
 
 def aes_ecb_decrypt(data, key, iv=None):
@@ -61,16 +54,7 @@ def aes_ecb_decrypt(data, key, iv=None):
     @param {int[]} iv          Unused for this mode
     @returns {int[]}           decrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
-
-    encrypted_data = []
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        encrypted_data += aes_decrypt(block, expanded_key)
-    encrypted_data = encrypted_data[:len(data)]
-
-    return encrypted_data
+    return list(_ecb_bytes(bytes(data), bytes(key), _decrypt_block))
 
 
 def aes_ctr_decrypt(data, key, iv):
@@ -94,21 +78,7 @@ def aes_ctr_encrypt(data, key, iv):
     @param {int[]} iv          16-Byte initialization vector
     @returns {int[]}           encrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
-    counter = iter_vector(iv)
-
-    encrypted_data = []
-    for i in range(block_count):
-        counter_block = next(counter)
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        block += [0] * (BLOCK_SIZE_BYTES - len(block))
-
-        cipher_counter_block = aes_encrypt(counter_block, expanded_key)
-        encrypted_data += xor(block, cipher_counter_block)
-    encrypted_data = encrypted_data[:len(data)]
-
-    return encrypted_data
+    return list(_ctr_bytes(bytes(data), bytes(key), bytes(iv)))
 
 
 def aes_cbc_decrypt(data, key, iv):
@@ -120,21 +90,7 @@ def aes_cbc_decrypt(data, key, iv):
     @param {int[]} iv          16-Byte IV
     @returns {int[]}           decrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
-
-    decrypted_data = []
-    previous_cipher_block = iv
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        block += [0] * (BLOCK_SIZE_BYTES - len(block))
-
-        decrypted_block = aes_decrypt(block, expanded_key)
-        decrypted_data += xor(decrypted_block, previous_cipher_block)
-        previous_cipher_block = block
-    decrypted_data = decrypted_data[:len(data)]
-
-    return decrypted_data
+    return list(_cbc_decrypt_bytes(bytes(data), bytes(key), bytes(iv)))
 
 
 def aes_cbc_encrypt(data, key, iv):
@@ -146,23 +102,19 @@ def aes_cbc_encrypt(data, key, iv):
     @param {int[]} iv          16-Byte IV
     @returns {int[]}           encrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
-
-    encrypted_data = []
-    previous_cipher_block = iv
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        remaining_length = BLOCK_SIZE_BYTES - len(block)
-        block += [remaining_length] * remaining_length
-        mixed_block = xor(block, previous_cipher_block)
+    rk, rounds = _encryption_key(bytes(key))
+    # Only a partial last block is padded
+    remaining_length = -len(data) % BLOCK_SIZE_BYTES
+    data = bytes(data) + bytes([remaining_length] * remaining_length)
+    words = struct.unpack(f'>{len(data) // 4}I', data)
 
-        encrypted_block = aes_encrypt(mixed_block, expanded_key)
-        encrypted_data += encrypted_block
-
-        previous_cipher_block = encrypted_block
-
-    return encrypted_data
+    encrypted = []
+    c0, c1, c2, c3 = struct.unpack('>4I', bytes(iv))
+    for i in range(0, len(words), 4):
+        c0, c1, c2, c3 = _encrypt_block(
+            words[i] ^ c0, words[i + 1] ^ c1, words[i + 2] ^ c2, words[i + 3] ^ c3, rk, rounds)
+        encrypted += (c0, c1, c2, c3)
+    return list(struct.pack(f'>{len(encrypted)}I', *encrypted))
 
 
 def aes_gcm_decrypt_and_verify(data, key, tag, nonce):
@@ -175,37 +127,7 @@ def aes_gcm_decrypt_and_verify(data, key, tag, nonce):
     @param {int[]} nonce       IV (recommended 12-Byte)
     @returns {int[]}           decrypted data
     """
-
-    # XXX: check aes, gcm param
-
-    hash_subkey = aes_encrypt([0] * BLOCK_SIZE_BYTES, key_expansion(key))
-
-    if len(nonce) == 12:
-        j0 = nonce + [0, 0, 0, 1]
-    else:
-        fill = (BLOCK_SIZE_BYTES - (len(nonce) % BLOCK_SIZE_BYTES)) % BLOCK_SIZE_BYTES + 8
-        ghash_in = nonce + [0] * fill + bytes_to_intlist((8 * len(nonce)).to_bytes(8, 'big'))
-        j0 = ghash(hash_subkey, ghash_in)
-
-    # TODO: add nonce support to aes_ctr_decrypt
-
-    # nonce_ctr = j0[:12]
-    iv_ctr = inc(j0)
-
-    decrypted_data = aes_ctr_decrypt(data, key, iv_ctr + [0] * (BLOCK_SIZE_BYTES - len(iv_ctr)))
-    pad_len = len(data) // 16 * 16
-    s_tag = ghash(
-        hash_subkey,
-        data
-        + [0] * (BLOCK_SIZE_BYTES - len(data) + pad_len)        # pad
-        + bytes_to_intlist((0 * 8).to_bytes(8, 'big')           # length of associated data
-                           + ((len(data) * 8).to_bytes(8, 'big')))  # length of data
-    )
-
-    if tag != aes_ctr_encrypt(s_tag, key, j0):
-        raise ValueError("Mismatching authentication tag")
-
-    return decrypted_data
+    return list(_gcm_decrypt_and_verify_bytes(*map(bytes, (data, key, tag, nonce))))
 
 
 def aes_encrypt(data, expanded_key):
@@ -217,6 +139,9 @@ def aes_encrypt(data, expanded_key):
     @returns {int[]}             16-Byte cipher
     """
     rounds = len(expanded_key) // BLOCK_SIZE_BYTES - 1
+    if len(data) == BLOCK_SIZE_BYTES and rounds in (10, 12, 14):
+        rk = struct.unpack(f'>{len(expanded_key) // 4}I', bytes(expanded_key))
+        return list(struct.pack('>4I', *_encrypt_block(*struct.unpack('>4I', bytes(data)), rk, rounds)))
 
     data = xor(data, expanded_key[:BLOCK_SIZE_BYTES])
     for i in range(1, rounds + 1):
@@ -238,6 +163,9 @@ def aes_decrypt(data, expanded_key):
     @returns {int[]}             16-Byte state
     """
     rounds = len(expanded_key) // BLOCK_SIZE_BYTES - 1
+    if len(data) == BLOCK_SIZE_BYTES and rounds in (10, 12, 14):
+        dk = _inverse_key_schedule(struct.unpack(f'>{len(expanded_key) // 4}I', bytes(expanded_key)), rounds)
+        return list(struct.pack('>4I', *_decrypt_block(*struct.unpack('>4I', bytes(data)), dk, rounds)))
 
     for i in range(rounds, 0, -1):
         data = xor(data, expanded_key[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES])
@@ -499,6 +427,174 @@ def ghash(subkey, data):
     return last_y
 
 
+# The rest of the implementation works on the state as four 32-bit big-endian words, merging
+# SubBytes, ShiftRows and MixColumns into lookups of precomputed tables (T-tables)
+
+def _gf_mul(a, b):
+    return 0 if a == 0 or b == 0 else RIJNDAEL_EXP_TABLE[(RIJNDAEL_LOG_TABLE[a] + RIJNDAEL_LOG_TABLE[b]) % 0xFF]
+
+
+def _rotate_tables(table):
+    tables = [tuple(table)]
+    for _ in range(3):
+        tables.append(tuple((x >> 8) | ((x & 0xFF) << 24) for x in tables[-1]))
+    return tables
+
+
+_TE0, _TE1, _TE2, _TE3 = _rotate_tables(
+    _gf_mul(s, 2) << 24 | s << 16 | s << 8 | _gf_mul(s, 3) for s in SBOX)
+_TD0, _TD1, _TD2, _TD3 = _rotate_tables(
+    _gf_mul(s, 14) << 24 | _gf_mul(s, 9) << 16 | _gf_mul(s, 13) << 8 | _gf_mul(s, 11) for s in SBOX_INV)
+_SBOX1, _SBOX2, _SBOX3 = ([s << shift for s in SBOX] for shift in (8, 16, 24))
+_SBOX_INV1, _SBOX_INV2, _SBOX_INV3 = ([s << shift for s in SBOX_INV] for shift in (8, 16, 24))
+
+
+def _encrypt_block(s0, s1, s2, s3, rk, rounds):
+    te0, te1, te2, te3 = _TE0, _TE1, _TE2, _TE3
+    s0, s1, s2, s3 = s0 ^ rk[0], s1 ^ rk[1], s2 ^ rk[2], s3 ^ rk[3]
+    for k in range(4, rounds * 4, 4):
+        s0, s1, s2, s3 = (
+            te0[s0 >> 24] ^ te1[s1 >> 16 & 0xFF] ^ te2[s2 >> 8 & 0xFF] ^ te3[s3 & 0xFF] ^ rk[k],
+            te0[s1 >> 24] ^ te1[s2 >> 16 & 0xFF] ^ te2[s3 >> 8 & 0xFF] ^ te3[s0 & 0xFF] ^ rk[k + 1],
+            te0[s2 >> 24] ^ te1[s3 >> 16 & 0xFF] ^ te2[s0 >> 8 & 0xFF] ^ te3[s1 & 0xFF] ^ rk[k + 2],
+            te0[s3 >> 24] ^ te1[s0 >> 16 & 0xFF] ^ te2[s1 >> 8 & 0xFF] ^ te3[s2 & 0xFF] ^ rk[k + 3])
+    k = rounds * 4
+    return (
+        _SBOX3[s0 >> 24] ^ _SBOX2[s1 >> 16 & 0xFF] ^ _SBOX1[s2 >> 8 & 0xFF] ^ SBOX[s3 & 0xFF] ^ rk[k],
+        _SBOX3[s1 >> 24] ^ _SBOX2[s2 >> 16 & 0xFF] ^ _SBOX1[s3 >> 8 & 0xFF] ^ SBOX[s0 & 0xFF] ^ rk[k + 1],
+        _SBOX3[s2 >> 24] ^ _SBOX2[s3 >> 16 & 0xFF] ^ _SBOX1[s0 >> 8 & 0xFF] ^ SBOX[s1 & 0xFF] ^ rk[k + 2],
+        _SBOX3[s3 >> 24] ^ _SBOX2[s0 >> 16 & 0xFF] ^ _SBOX1[s1 >> 8 & 0xFF] ^ SBOX[s2 & 0xFF] ^ rk[k + 3])
+
+
+def _decrypt_block(s0, s1, s2, s3, dk, rounds):
+    td0, td1, td2, td3 = _TD0, _TD1, _TD2, _TD3
+    s0, s1, s2, s3 = s0 ^ dk[0], s1 ^ dk[1], s2 ^ dk[2], s3 ^ dk[3]
+    for k in range(4, rounds * 4, 4):
+        s0, s1, s2, s3 = (
+            td0[s0 >> 24] ^ td1[s3 >> 16 & 0xFF] ^ td2[s2 >> 8 & 0xFF] ^ td3[s1 & 0xFF] ^ dk[k],
+            td0[s1 >> 24] ^ td1[s0 >> 16 & 0xFF] ^ td2[s3 >> 8 & 0xFF] ^ td3[s2 & 0xFF] ^ dk[k + 1],
+            td0[s2 >> 24] ^ td1[s1 >> 16 & 0xFF] ^ td2[s0 >> 8 & 0xFF] ^ td3[s3 & 0xFF] ^ dk[k + 2],
+            td0[s3 >> 24] ^ td1[s2 >> 16 & 0xFF] ^ td2[s1 >> 8 & 0xFF] ^ td3[s0 & 0xFF] ^ dk[k + 3])
+    k = rounds * 4
+    return (
+        _SBOX_INV3[s0 >> 24] ^ _SBOX_INV2[s3 >> 16 & 0xFF] ^ _SBOX_INV1[s2 >> 8 & 0xFF] ^ SBOX_INV[s1 & 0xFF] ^ dk[k],
+        _SBOX_INV3[s1 >> 24] ^ _SBOX_INV2[s0 >> 16 & 0xFF] ^ _SBOX_INV1[s3 >> 8 & 0xFF] ^ SBOX_INV[s2 & 0xFF] ^ dk[k + 1],
+        _SBOX_INV3[s2 >> 24] ^ _SBOX_INV2[s1 >> 16 & 0xFF] ^ _SBOX_INV1[s0 >> 8 & 0xFF] ^ SBOX_INV[s3 & 0xFF] ^ dk[k + 2],
+        _SBOX_INV3[s3 >> 24] ^ _SBOX_INV2[s2 >> 16 & 0xFF] ^ _SBOX_INV1[s1 >> 8 & 0xFF] ^ SBOX_INV[s0 & 0xFF] ^ dk[k + 3])
+
+
+@functools.lru_cache(maxsize=64)
+def _encryption_key(key):
+    """@returns (expanded key as words, number of rounds)"""
+    expanded_key = bytes(key_expansion(list(key)))
+    return struct.unpack(f'>{len(expanded_key) // 4}I', expanded_key), len(key) // 4 + 6
+
+
+@functools.lru_cache(maxsize=64)
+def _inverse_key_schedule(rk, rounds):
+    """Round keys of the equivalent inverse cipher, in the order they are used"""
+    def inv_mix_column(w):
+        return (_TD0[SBOX[w >> 24]] ^ _TD1[SBOX[w >> 16 & 0xFF]]
+                ^ _TD2[SBOX[w >> 8 & 0xFF]] ^ _TD3[SBOX[w & 0xFF]])
+
+    dk = []
+    for r in range(rounds, -1, -1):
+        words = rk[r * 4: r * 4 + 4]
+        dk.extend(words if r in (0, rounds) else map(inv_mix_column, words))
+    return tuple(dk)
+
+
+def _decryption_key(key):
+    rk, rounds = _encryption_key(key)
+    return _inverse_key_schedule(rk, rounds), rounds
+
+
+def _to_words(data):
+    """Zero-pad the data to whole blocks and unpack it into words"""
+    data += bytes(-len(data) % BLOCK_SIZE_BYTES)
+    return struct.unpack(f'>{len(data) // 4}I', data)
+
+
+def _ecb_bytes(data, key, block_func):
+    rk, rounds = (_decryption_key if block_func is _decrypt_block else _encryption_key)(key)
+    words = _to_words(data)
+    result = []
+    for i in range(0, len(words), 4):
+        result += block_func(*words[i:i + 4], rk, rounds)
+    return struct.pack(f'>{len(result)}I', *result)[:len(data)]
+
+
+def _cbc_decrypt_bytes(data, key, iv):
+    dk, rounds = _decryption_key(key)
+    words = _to_words(data)
+    result = [0] * len(words)
+    p0, p1, p2, p3 = struct.unpack('>4I', iv)
+    for i in range(0, len(words), 4):
+        c0, c1, c2, c3 = words[i:i + 4]
+        d0, d1, d2, d3 = _decrypt_block(c0, c1, c2, c3, dk, rounds)
+        result[i:i + 4] = d0 ^ p0, d1 ^ p1, d2 ^ p2, d3 ^ p3
+        p0, p1, p2, p3 = c0, c1, c2, c3
+    return struct.pack(f'>{len(result)}I', *result)[:len(data)]
+
+
+def _keystream(key, counter, length):
+    rk, rounds = _encryption_key(key)
+    keystream = []
+    for _ in range(-(-length // BLOCK_SIZE_BYTES)):
+        keystream += _encrypt_block(
+            counter >> 96, counter >> 64 & 0xFFFFFFFF, counter >> 32 & 0xFFFFFFFF, counter & 0xFFFFFFFF, rk, rounds)
+        counter = (counter + 1) & (1 << 128) - 1
+    return struct.pack(f'>{len(keystream)}I', *keystream)[:length]
+
+
+def _xor_bytes(data1, data2):
+    return (int.from_bytes(data1, 'big') ^ int.from_bytes(data2, 'big')).to_bytes(len(data1), 'big')
+
+
+def _ctr_bytes(data, key, iv):
+    return _xor_bytes(data, _keystream(key, int.from_bytes(iv, 'big'), len(data)))
+
+
+def _gf_mul_128(x, y):
+    # NIST SP 800-38D, Algorithm 1
+    z = 0
+    for i in range(127, -1, -1):
+        if x >> i & 1:
+            z ^= y
+        y = (y >> 1) ^ (0xE1 << 120) if y & 1 else y >> 1
+    return z
+
+
+def _ghash(subkey, data):
+    # NIST SP 800-38D, Algorithm 2
+    last_y = 0
+    for i in range(0, len(data), BLOCK_SIZE_BYTES):
+        last_y = _gf_mul_128(last_y ^ int.from_bytes(data[i:i + BLOCK_SIZE_BYTES], 'big'), subkey)
+    return last_y
+
+
+def _gcm_decrypt_and_verify_bytes(data, key, tag, nonce):
+    hash_subkey = int.from_bytes(_keystream(key, 0, BLOCK_SIZE_BYTES), 'big')
+    if len(nonce) == 12:
+        j0 = int.from_bytes(nonce + b'\0\0\0\1', 'big')
+    else:
+        fill = (BLOCK_SIZE_BYTES - (len(nonce) % BLOCK_SIZE_BYTES)) % BLOCK_SIZE_BYTES + 8
+        j0 = _ghash(hash_subkey, nonce + bytes(fill) + (8 * len(nonce)).to_bytes(8, 'big'))
+
+    decrypted_data = _xor_bytes(data, _keystream(key, (j0 + 1) & (1 << 128) - 1, len(data)))
+    s_tag = _ghash(
+        hash_subkey,
+        data
+        + bytes(-len(data) % BLOCK_SIZE_BYTES)  # pad
+        + (0 * 8).to_bytes(8, 'big')             # length of associated data
+        + (len(data) * 8).to_bytes(8, 'big'))    # length of data
+
+    if not hmac.compare_digest(tag, _xor_bytes(s_tag.to_bytes(16, 'big'), _keystream(key, j0, BLOCK_SIZE_BYTES))):
+        raise ValueError("Mismatching authentication tag")
+
+    return decrypted_data
+
+
 __all__ = [
     'aes_ctr_decrypt',
     'aes_cbc_decrypt',
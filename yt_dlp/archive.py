@@ -0,0 +1,154 @@
+import errno
+import itertools
+import os
+import threading
+
+from .dependencies import sqlite3
+from .utils import YoutubeDLError, locked_file
+
+
+class TextArchive:
+    """
+    Download archive stored as a text file with one ID per line
+
+    The whole file is loaded into memory when opened
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._ids = set()
+        try:
+            with locked_file(filename, 'r', encoding='utf-8') as archive_file:
+                for line in archive_file:
+                    self._ids.add(line.strip())
+        except OSError as ioe:
+            if ioe.errno != errno.ENOENT:
+                raise
+
+    def __contains__(self, vid_id):
+        return vid_id in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, vid_id):
+        self.add_many((vid_id, ))
+
+    def add_many(self, vid_ids):
+        vid_ids = [vid_id for vid_id in vid_ids if vid_id not in self._ids]
+        if not vid_ids:
+            return
+        with locked_file(self.filename, 'a', encoding='utf-8') as archive_file:
+            archive_file.write(''.join(f'{vid_id}\n' for vid_id in vid_ids))
+        self._ids.update(vid_ids)
+
+    def close(self):
+        pass
+
+
+class SQLiteArchive:
+    """
+    Download archive stored as an SQLite database
+
+    The IDs are looked up in the index of the database instead of being loaded into
+    memory, and any number of processes can record downloads to the same archive
+    """
+
+    MAGIC = b'SQLite format 3\0'
+    EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+    # Number of IDs inserted per transaction by add_many
+    BATCH_SIZE = 10000
+    # Seconds to wait for the writer of another process
+    TIMEOUT = 60
+
+    def __init__(self, filename):
+        if not sqlite3:
+            raise YoutubeDLError(
+                f'Unable to open download archive {filename!r}: '
+                'SQLite archives require a python interpreter compiled with sqlite3 support')
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filename, timeout=self.TIMEOUT, isolation_level=None, check_same_thread=False)
+        # In WAL mode, readers are never blocked by the writer
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS archive (id TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    @classmethod
+    def suitable(cls, filename):
+        try:
+            with open(filename, 'rb') as f:
+                header = f.read(len(cls.MAGIC))
+        except FileNotFoundError:
+            header = None
+        # The file may also have just been created by another process
+        if header:
+            return header == cls.MAGIC
+        return os.path.splitext(filename)[1].lower() in cls.EXTENSIONS
+
+    def __contains__(self, vid_id):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM archive WHERE id = ?', (vid_id, )).fetchone() is not None
+
+    def __iter__(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT id FROM archive').fetchall()
+        return (vid_id for vid_id, in rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM archive').fetchone()[0]
+
+    def add(self, vid_id):
+        self.add_many((vid_id, ))
+
+    def add_many(self, vid_ids):
+        vid_ids = iter(vid_ids)
+        while True:
+            batch = [(vid_id, ) for vid_id in itertools.islice(vid_ids, self.BATCH_SIZE)]
+            if not batch:
+                break
+            with self._lock:
+                # Taking the write lock right away avoids deadlocking with other writers
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._conn.executemany('INSERT OR IGNORE INTO archive (id) VALUES (?)', batch)
+                except BaseException:
+                    self._conn.execute('ROLLBACK')
+                    raise
+                self._conn.execute('COMMIT')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_download_archive(filename):
+    """Open the download archive with the backend suitable for the file"""
+    if SQLiteArchive.suitable(filename):
+        return SQLiteArchive(filename)
+    return TextArchive(filename)
+
+
+def convert_download_archive(src, dest):
+    """
+    Copy the IDs of a download archive into another, e.g. a text archive into an SQLite one
+    @returns    Number of IDs in the destination archive
+    """
+    dest_archive = open_download_archive(dest)
+    try:
+        if SQLiteArchive.suitable(src):
+            src_archive = SQLiteArchive(src)
+            try:
+                dest_archive.add_many(src_archive)
+            finally:
+                src_archive.close()
+        else:
+            # Text archives are streamed rather than loaded into memory
+            with locked_file(src, 'r', encoding='utf-8') as archive_file:
+                dest_archive.add_many(filter(None, (line.strip() for line in archive_file)))
+        return len(dest_archive)
+    finally:
+        dest_archive.close()
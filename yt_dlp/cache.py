@@ -1,17 +1,291 @@
+import collections
 import contextlib
-import errno
 import json
 import os
 import re
 import shutil
+import threading
+import time
 import traceback
 
-from .utils import expand_path, write_json_file
+from .dependencies import sqlite3
+from .utils import YoutubeDLError, expand_path, format_bytes, write_json_file
+
+# Sections and keys are also used as file names by DirectoryCacheStore
+_NAME_RE = re.compile(r'^[a-zA-Z0-9_.-]+$')
+
+
+def _budget(max_sizes, section):
+    """@returns The key of max_sizes that limits the size of the section"""
+    return section if section in max_sizes else None
+
+
+def _section_sizes(max_sizes, entries):
+    """@returns The total size of the (_, _, size, section, _) entries for each key of max_sizes"""
+    sizes = dict.fromkeys(max_sizes, 0)
+    for _, _, size, section, _ in entries:
+        sizes[_budget(max_sizes, section)] += size
+    return sizes
+
+
+class DirectoryCacheStore:
+    """Cache entries stored as one JSON file per key under <cachedir>/<section>/"""
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def _get_cache_fn(self, section, key, dtype='json'):
+        return os.path.join(self.root_dir, section, f'{key}.{dtype}')
+
+    def read(self, section, key):
+        """@returns (time the entry was stored, JSON of the entry), or None if there is no such entry"""
+        cache_fn = self._get_cache_fn(section, key)
+        try:
+            mtime = os.path.getmtime(cache_fn)
+            with open(cache_fn, encoding='utf-8') as cachef:
+                json_data = cachef.read()
+        except OSError:
+            return None
+        # The access time is not reliably updated, so it is set for the eviction
+        with contextlib.suppress(OSError):
+            os.utime(cache_fn, (time.time(), mtime))
+        return mtime, json_data
+
+    def write(self, section, key, data):
+        """@returns The size of the stored entry"""
+        cache_fn = self._get_cache_fn(section, key)
+        os.makedirs(os.path.dirname(cache_fn), exist_ok=True)
+        write_json_file(data, cache_fn)
+        return os.path.getsize(cache_fn)
+
+    def delete(self, section, key):
+        with contextlib.suppress(OSError):
+            os.remove(self._get_cache_fn(section, key))
+
+    def evict(self, max_sizes, is_expired):
+        """
+        Remove the expired entries, and the least recently used ones while the cache is too big
+        @param max_sizes    {section: maximum size} of the sections that have a size of their own,
+                            and {None: maximum size} of all the other sections
+        @returns (size of the sections as in max_sizes, (section, key) of the removed entries)
+        """
+        files = []
+        with contextlib.suppress(OSError):
+            for section in os.listdir(self.root_dir):
+                section_dir = os.path.join(self.root_dir, section)
+                if not _NAME_RE.match(section) or not os.path.isdir(section_dir):
+                    continue
+                with contextlib.suppress(OSError):
+                    for name in os.listdir(section_dir):
+                        # The cache dir may be shared with other applications, whose files are left alone
+                        key, ext = os.path.splitext(name)
+                        fn = os.path.join(section_dir, name)
+                        if ext != '.json' or not _NAME_RE.match(key) or not os.path.isfile(fn):
+                            continue
+                        with contextlib.suppress(OSError):
+                            stat = os.stat(fn)
+                            files.append((max(stat.st_atime, stat.st_mtime), stat.st_mtime, stat.st_size, section, fn))
+
+        sizes, removed = _section_sizes(max_sizes, files), []
+        for _, mtime, file_size, section, fn in sorted(files):
+            budget = _budget(max_sizes, section)
+            if sizes[budget] <= max_sizes[budget] and not is_expired(section, mtime):
+                continue
+            with contextlib.suppress(OSError):
+                os.remove(fn)
+                sizes[budget] -= file_size
+                removed.append((section, os.path.splitext(os.path.basename(fn))[0]))
+        return sizes, removed
+
+    def clear(self):
+        if all(term not in self.root_dir for term in ('cache', 'tmp')):
+            raise Exception(
+                f'Not removing directory {self.root_dir} - this does not look like a cache dir'
+            )
+        if os.path.exists(self.root_dir):
+            shutil.rmtree(self.root_dir)
+
+    def close(self):
+        pass
+
+
+class SQLiteCacheStore:
+    """
+    Cache entries stored in a single SQLite database
+
+    Any number of processes can share the same database
+    """
+
+    MAGIC = b'SQLite format 3\0'
+    EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+    # Seconds to wait for the writer of another process
+    TIMEOUT = 60
+    # Seconds after which the access time of an entry is updated again when it is read
+    ATIME_RESOLUTION = 24 * 60 * 60
+
+    def __init__(self, filename):
+        if not sqlite3:
+            raise YoutubeDLError(
+                f'Unable to open cache {filename!r}: '
+                'SQLite caches require a python interpreter compiled with sqlite3 support')
+        self.filename = filename
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filename, timeout=self.TIMEOUT, isolation_level=None, check_same_thread=False)
+        # In WAL mode, readers are never blocked by the writer
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS cache (
+            section TEXT, key TEXT, data TEXT, mtime REAL, atime REAL,
+            PRIMARY KEY (section, key)) WITHOUT ROWID''')
+
+    @classmethod
+    def suitable(cls, filename):
+        try:
+            with open(filename, 'rb') as f:
+                header = f.read(len(cls.MAGIC))
+        except OSError:
+            header = None
+        # The file may also have just been created by another process
+        if header:
+            return header == cls.MAGIC
+        return os.path.splitext(filename)[1].lower() in cls.EXTENSIONS
+
+    def read(self, section, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT mtime, atime, data FROM cache WHERE section = ? AND key = ?', (section, key)).fetchone()
+            if row is None:
+                return None
+            mtime, atime, json_data = row
+            # Every update is a write, which would serialize the readers of all the processes
+            now = time.time()
+            if atime < now - self.ATIME_RESOLUTION:
+                self._conn.execute(
+                    'UPDATE cache SET atime = ? WHERE section = ? AND key = ?', (now, section, key))
+        return mtime, json_data
+
+    def write(self, section, key, data):
+        json_data = json.dumps(data, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (section, key, data, mtime, atime) VALUES (?, ?, ?, ?, ?)',
+                (section, key, json_data, now, now))
+        return len(json_data.encode())
+
+    def delete(self, section, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM cache WHERE section = ? AND key = ?', (section, key))
+
+    def evict(self, max_sizes, is_expired):
+        with self._lock:
+            entries = self._conn.execute(
+                'SELECT MAX(atime, mtime), mtime, LENGTH(CAST(data AS BLOB)), section, key FROM cache').fetchall()
+        sizes, removed = _section_sizes(max_sizes, entries), []
+        for _, mtime, entry_size, section, key in sorted(entries):
+            budget = _budget(max_sizes, section)
+            if sizes[budget] <= max_sizes[budget] and not is_expired(section, mtime):
+                continue
+            sizes[budget] -= entry_size
+            removed.append((section, key))
+        if not removed:
+            return sizes, removed
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany('DELETE FROM cache WHERE section = ? AND key = ?', removed)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return sizes, removed
+
+    def clear(self):
+        # The database may be in use by other processes, so only its entries are removed
+        with self._lock:
+            self._conn.execute('DELETE FROM cache')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def import_directory(self, root_dir):
+        """
+        Copy the entries of a directory cache into the database
+        @returns    Number of imported entries
+        """
+        entries = []
+        for section in os.listdir(root_dir):
+            section_dir = os.path.join(root_dir, section)
+            if not os.path.isdir(section_dir):
+                continue
+            for name in os.listdir(section_dir):
+                key, ext = os.path.splitext(name)
+                if ext != '.json':
+                    continue
+                fn = os.path.join(section_dir, name)
+                try:
+                    with open(fn, encoding='utf-8') as f:
+                        json_data = f.read()
+                    json.loads(json_data)
+                    stat = os.stat(fn)
+                except (OSError, ValueError):
+                    continue
+                entries.append((section, key, json_data, stat.st_mtime, max(stat.st_atime, stat.st_mtime)))
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Entries stored by yt-dlp since are more recent
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO cache (section, key, data, mtime, atime) VALUES (?, ?, ?, ?, ?)', entries)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return len(entries)
 
 
 class Cache:
+    """
+    Cache of downloaded information
+
+    The cachedir is either a directory with one JSON file per entry, or an SQLite database
+    if it has a .db, .sqlite or .sqlite3 extension. Loaded and stored entries are also kept
+    in memory, so that the same entry is not read from the disk repeatedly. Entries of the
+    sections in _SECTION_TTLS (or the cache_ttls param) expire after that many seconds, and
+    the least recently used entries are removed once the cache grows over _MAX_DISK_SIZE
+    (or cache_max_size) bytes. The sections in _SECTION_MAX_DISK_SIZES (or the
+    cache_section_max_sizes param) have a size of their own instead
+    """
+
+    # Number and total size of the entries kept in memory
+    _MEMORY_ENTRIES = 256
+    _MEMORY_SIZE = 16 * 1024 * 1024
+    _MAX_DISK_SIZE = 64 * 1024 * 1024
+    # Large HTTP responses should not evict e.g. the player functions
+    _SECTION_MAX_DISK_SIZES = {
+        'http': 64 * 1024 * 1024,
+    }
+    # Seconds after which the entries of a section expire.
+    # Players are replaced every few days, and their functions are never used again
+    _SECTION_TTLS = {
+        'http': 7 * 24 * 60 * 60,
+        'youtube-nsig': 30 * 24 * 60 * 60,
+        'youtube-sigfuncs': 30 * 24 * 60 * 60,
+    }
+
     def __init__(self, ydl):
         self._ydl = ydl
+        self._store = None
+        # (section, key) -> (time the entry was stored, JSON of the entry)
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        # Size of the sections on the disk, as in _max_disk_sizes
+        self._disk_sizes = None
+        self.stats = dict.fromkeys(('memory_hits', 'disk_hits', 'misses', 'bytes_read', 'bytes_written', 'evictions'), 0)
 
     def _get_root_dir(self):
         res = self._ydl.params.get('cachedir')
@@ -20,35 +294,77 @@ def _get_root_dir(self):
             res = os.path.join(cache_root, 'yt-dlp')
         return expand_path(res)
 
-    def _get_cache_fn(self, section, key, dtype):
-        assert re.match(r'^[a-zA-Z0-9_.-]+$', section), \
-            'invalid section %r' % section
-        assert re.match(r'^[a-zA-Z0-9_.-]+$', key), 'invalid key %r' % key
-        return os.path.join(
-            self._get_root_dir(), section, f'{key}.{dtype}')
+    def _get_store(self):
+        with self._lock:
+            if self._store is None:
+                root_dir = self._get_root_dir()
+                self._store = (SQLiteCacheStore if SQLiteCacheStore.suitable(root_dir) else DirectoryCacheStore)(root_dir)
+            return self._store
+
+    @staticmethod
+    def _check_key(section, key):
+        assert _NAME_RE.match(section), 'invalid section %r' % section
+        assert _NAME_RE.match(key), 'invalid key %r' % key
 
     @property
     def enabled(self):
         return self._ydl.params.get('cachedir') is not False
 
+    @property
+    def _max_disk_sizes(self):
+        return {
+            **self._SECTION_MAX_DISK_SIZES,
+            **(self._ydl.params.get('cache_section_max_sizes') or {}),
+            None: self._ydl.params.get('cache_max_size') or self._MAX_DISK_SIZE,
+        }
+
+    def _is_expired(self, section, mtime):
+        ttl = {**self._SECTION_TTLS, **(self._ydl.params.get('cache_ttls') or {})}.get(section)
+        return ttl is not None and mtime + ttl < time.time()
+
+    def _remember(self, section, key, mtime, json_data):
+        with self._lock:
+            self._forget((section, key))
+            self._memory[section, key] = mtime, json_data
+            self._memory_size += len(json_data)
+            while len(self._memory) > self._MEMORY_ENTRIES or self._memory_size > self._MEMORY_SIZE:
+                self._forget(next(iter(self._memory)))
+
+    def _forget(self, entry_key):
+        entry = self._memory.pop(entry_key, None)
+        if entry:
+            self._memory_size -= len(entry[1])
+
+    def _count(self, stat, value=1):
+        with self._lock:
+            self.stats[stat] += value
+
     def store(self, section, key, data, dtype='json'):
         assert dtype in ('json',)
 
         if not self.enabled:
             return
 
-        fn = self._get_cache_fn(section, key, dtype)
+        self._check_key(section, key)
         try:
-            try:
-                os.makedirs(os.path.dirname(fn))
-            except OSError as ose:
-                if ose.errno != errno.EEXIST:
-                    raise
             self._ydl.write_debug(f'Saving {section}.{key} to cache')
-            write_json_file(data, fn)
+            size = self._get_store().write(section, key, data)
         except Exception:
             tb = traceback.format_exc()
-            self._ydl.report_warning(f'Writing cache to {fn!r} failed: {tb}')
+            self._ydl.report_warning(f'Writing {section}.{key} to cache {self._get_root_dir()!r} failed: {tb}')
+            return
+        # The entry is kept as JSON, so that every load gives a new object as if it was read from the disk
+        self._remember(section, key, time.time(), json.dumps(data, ensure_ascii=False))
+        self._count('bytes_written', size)
+
+        max_sizes = self._max_disk_sizes
+        budget = _budget(max_sizes, section)
+        with self._lock:
+            if self._disk_sizes is not None:
+                self._disk_sizes[budget] = self._disk_sizes.get(budget, 0) + size
+            disk_sizes = self._disk_sizes
+        if disk_sizes is None or disk_sizes[budget] > max_sizes[budget]:
+            self._evict()
 
     def load(self, section, key, dtype='json', default=None):
         assert dtype in ('json',)
@@ -56,34 +372,94 @@ def load(self, section, key, dtype='json', default=None):
         if not self.enabled:
             return default
 
-        cache_fn = self._get_cache_fn(section, key, dtype)
-        with contextlib.suppress(OSError):
+        self._check_key(section, key)
+        with self._lock:
+            entry = self._memory.get((section, key))
+            if entry:
+                self._memory.move_to_end((section, key))
+        if entry and not self._is_expired(section, entry[0]):
+            self._count('memory_hits')
+            return json.loads(entry[1])
+
+        try:
+            store = self._get_store()
+            entry = store.read(section, key)
+        except Exception as e:
+            self._ydl.report_warning(f'Unable to read cache {self._get_root_dir()!r}: {e}')
+            entry = None
+        if entry and self._is_expired(section, entry[0]):
+            self._ydl.write_debug(f'Removing expired {section}.{key} from cache')
             try:
-                with open(cache_fn, encoding='utf-8') as cachef:
-                    self._ydl.write_debug(f'Loading {section}.{key} from cache')
-                    return json.load(cachef)
+                store.delete(section, key)
+            except Exception as e:
+                self._ydl.report_warning(f'Unable to remove {section}.{key} from cache {self._get_root_dir()!r}: {e}')
+        elif entry:
+            self._ydl.write_debug(f'Loading {section}.{key} from cache')
+            mtime, json_data = entry
+            try:
+                data = json.loads(json_data)
             except ValueError:
-                try:
-                    file_size = os.path.getsize(cache_fn)
-                except OSError as oe:
-                    file_size = str(oe)
-                self._ydl.report_warning(f'Cache retrieval from {cache_fn} failed ({file_size})')
+                self._ydl.report_warning(f'Cache retrieval of {section}.{key} failed ({len(json_data)} bytes)')
+            else:
+                self._remember(section, key, mtime, json_data)
+                self._count('disk_hits')
+                self._count('bytes_read', len(json_data.encode()))
+                return data
 
+        self._count('misses')
         return default
 
+    def _evict(self):
+        """Remove the expired entries, and the least recently used ones while the cache is too big"""
+        try:
+            disk_sizes, removed = self._get_store().evict(self._max_disk_sizes, self._is_expired)
+        except Exception as e:
+            self._ydl.report_warning(f'Unable to clean up cache {self._get_root_dir()!r}: {e}')
+            return
+        with self._lock:
+            self._disk_sizes = disk_sizes
+            self.stats['evictions'] += len(removed)
+            for entry_key in removed:
+                self._forget(entry_key)
+
+    def report_stats(self):
+        if any(self.stats.values()):
+            self._ydl.write_debug(
+                'Cache: {memory_hits} memory hits, {disk_hits} disk hits, {misses} misses, '
+                '{read} read, {written} written, {evictions} evicted'.format(
+                    **self.stats, read=format_bytes(self.stats['bytes_read']),
+                    written=format_bytes(self.stats['bytes_written'])))
+
+    def close(self):
+        self.report_stats()
+        with self._lock:
+            store, self._store = self._store, None
+        if store:
+            store.close()
+
     def remove(self):
         if not self.enabled:
             self._ydl.to_screen('Cache is disabled (Did you combine --no-cache-dir and --rm-cache-dir?)')
             return
 
         cachedir = self._get_root_dir()
-        if all(term not in cachedir for term in ('cache', 'tmp')):
-            raise Exception(
-                f'Not removing directory {cachedir} - this does not look like a cache dir'
-            )
-
         self._ydl.to_screen(f'Removing cache dir {cachedir} .', skip_eol=True)
-        if os.path.exists(cachedir):
-            self._ydl.to_screen('.', skip_eol=True)
-            shutil.rmtree(cachedir)
+        self._get_store().clear()
+        self._ydl.to_screen('.', skip_eol=True)
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._disk_sizes = None
         self._ydl.to_screen('.')
+
+
+def convert_cache(src, dest):
+    """
+    Copy the entries of a directory cache into an SQLite cache
+    @returns    Number of copied entries
+    """
+    store = SQLiteCacheStore(expand_path(dest))
+    try:
+        return store.import_directory(expand_path(src))
+    finally:
+        store.close()
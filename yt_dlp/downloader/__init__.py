@@ -13,7 +13,8 @@ def get_suitable_downloader(info_dict, params={}, default=NO_DEFAULT, protocol=N
         return FFmpegFD
     elif (set(downloaders) == {DashSegmentsFD}
           and not (to_stdout and len(protocols) > 1)
-          and set(protocols) == {'http_dash_segments_generator'}):
+          # Only the native downloader is suitable for live DASH, and it has to download all the formats together
+          and (set(protocols) == {'http_dash_segments_generator'} or info_copy.get('is_live'))):
         return DashSegmentsFD
     elif len(downloaders) == 1:
         return downloaders[0]
@@ -109,10 +110,10 @@ def _get_suitable_downloader(info_dict, protocol, params, default):
         return FFmpegFD
 
     if protocol in ('m3u8', 'm3u8_native'):
-        if info_dict.get('is_live'):
-            return FFmpegFD
-        elif (external_downloader or '').lower() == 'native':
+        if (external_downloader or '').lower() == 'native':
             return HlsFD
+        elif info_dict.get('is_live'):
+            return FFmpegFD
         elif protocol == 'm3u8_native' and get_suitable_downloader(
                 info_dict, params, None, protocol='m3u8_frag_urls', to_stdout=info_dict['to_stdout']):
             return HlsFD
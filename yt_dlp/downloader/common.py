@@ -82,6 +82,8 @@ def __init__(self, ydl, params):
         self._set_ydl(ydl)
         self._progress_hooks = []
         self.params = params
+        # Videos processed in parallel only show the progress of the one whose output is being written
+        self._ydl_output = getattr(getattr(ydl, '_local', None), 'output', None)
         self._prepare_multiline_status()
         self.add_progress_hook(self.report_progress)
 
@@ -182,6 +184,10 @@ def slow_down(self, start_time, now, byte_counter):
         rate_limit = self.params.get('ratelimit')
         if rate_limit is None or byte_counter == 0:
             return
+        rate_limiter = getattr(self.ydl, '_rate_limiter', None)
+        if rate_limiter:
+            rate_limiter.slow_down(start_time, byte_counter)
+            return
         if now is None:
             now = time.time()
         elapsed = now - start_time
@@ -294,6 +300,9 @@ def _finish_multiline_status(self):
     )
 
     def _report_progress_status(self, s, default_template):
+        output_is_live = getattr(self.ydl, '_output_is_live', None)
+        if output_is_live and not output_is_live(self._ydl_output):
+            return
         for name, style in self.ProgressStyles.items_:
             name = f'_{name}_str'
             if name not in s:
@@ -430,8 +439,10 @@ def download(self, filename, info_dict, subtitle=False):
             sleep_interval = random.uniform(
                 min_sleep_interval, self.params.get('max_sleep_interval') or min_sleep_interval)
         if sleep_interval > 0:
-            self.to_screen(f'[download] Sleeping {sleep_interval:.2f} seconds ...')
-            time.sleep(sleep_interval)
+            # Downloads of videos processed in parallel are started one sleep apart
+            with getattr(self.ydl, '_sleep_lock', None) or contextlib.nullcontext():
+                self.to_screen(f'[download] Sleeping {sleep_interval:.2f} seconds ...')
+                time.sleep(sleep_interval)
 
         ret = self.real_download(filename, info_dict)
         self._finish_multiline_status()
@@ -442,6 +453,10 @@ def real_download(self, filename, info_dict):
         raise NotImplementedError('This method must be implemented by subclasses')
 
     def _hook_progress(self, status, info_dict):
+        # The downloads of the other threads of --parallel-videos are stopped on Ctrl+C
+        interrupted = getattr(self.ydl, '_interrupted', None)
+        if interrupted and interrupted.is_set():
+            raise KeyboardInterrupt()
         if not self._progress_hooks:
             return
         status['info_dict'] = info_dict
@@ -2,7 +2,7 @@
 
 from . import get_suitable_downloader
 from .fragment import FragmentFD
-from ..utils import urljoin
+from ..utils import base_url, network_exceptions, parse_duration, urljoin
 
 
 class DashSegmentsFD(FragmentFD):
@@ -12,20 +12,25 @@ class DashSegmentsFD(FragmentFD):
     """
 
     FD_NAME = 'dashsegments'
+    # Number of segments before the end of a live manifest to start downloading from
+    _LIVE_START_SEGMENTS = 3
+    # Number of segment durations after which a live manifest that stopped changing is considered ended
+    _LIVE_STALL_TIMEOUT = 10
 
     def real_download(self, filename, info_dict):
-        if info_dict.get('is_live') and set(info_dict['protocol'].split('+')) != {'http_dash_segments_generator'}:
-            self.report_error('Live DASH videos are not supported')
-
         real_start = time.time()
-        real_downloader = get_suitable_downloader(
-            info_dict, self.params, None, protocol='dash_frag_urls', to_stdout=(filename == '-'))
-
         requested_formats = [{**info_dict, **fmt} for fmt in info_dict.get('requested_formats', [])]
+        if any(map(self._is_live_manifest, requested_formats or [info_dict])):
+            # Following a live manifest is not currently supported for external downloaders
+            real_downloader = None
+        else:
+            real_downloader = get_suitable_downloader(
+                info_dict, self.params, None, protocol='dash_frag_urls', to_stdout=(filename == '-'))
+
         args = []
         for fmt in requested_formats or [info_dict]:
             try:
-                fragment_count = 1 if self.params.get('test') else len(fmt['fragments'])
+                fragment_count = 1 if self.params.get('test') else None if self._is_live_manifest(fmt) else len(fmt['fragments'])
             except TypeError:
                 fragment_count = None
             ctx = {
@@ -53,13 +58,89 @@ def real_download(self, filename, info_dict):
 
         return self.download_and_append_fragments_multiple(*args)
 
+    @staticmethod
+    def _is_live_manifest(fmt):
+        return fmt.get('is_live') and not callable(fmt['fragments'])
+
+    def _load_live_manifest(self, ie, fmt):
+        """
+        Reload the manifest of a live format
+        @returns    (fragments of the format, minimumUpdatePeriod, whether the manifest is still dynamic)
+        """
+        urlh = self.ydl.urlopen(self._prepare_url(fmt, fmt.get('manifest_url') or fmt['url']))
+        mpd_url = urlh.geturl()
+        mpd_doc = ie._parse_xml(urlh.read().decode('utf-8', 'ignore'), fmt.get('id'))
+        formats, _ = ie._parse_mpd_formats_and_subtitles(mpd_doc, mpd_base_url=base_url(mpd_url), mpd_url=mpd_url)
+        # The format id may have been prefixed by the extractor
+        new_fmt = next((f for f in formats if f.get('manifest_stream_number') == fmt.get('manifest_stream_number')
+                        and fmt['format_id'].endswith(f['format_id'])), None)
+        if not new_fmt or not new_fmt.get('fragments'):
+            self.report_warning(f'Format {fmt["format_id"]} is no longer in the live manifest')
+            return [], None, False
+        return new_fmt['fragments'], parse_duration(mpd_doc.get('minimumUpdatePeriod')), mpd_doc.get('type') == 'dynamic'
+
+    def _live_fragments(self, fmt):
+        """
+        Follow a live manifest, generating the fragments of its segments as they become available
+
+        The manifest is reloaded every minimumUpdatePeriod, or every segment duration if that is
+        shorter. Following stops once the manifest is no longer dynamic, or once it has not changed
+        for _LIVE_STALL_TIMEOUT segment durations
+        """
+        def fragment_key(fragment):
+            return fragment.get('url') or fragment.get('path')
+
+        ie = self.ydl.get_info_extractor('Generic')
+        fragments, update_period, is_dynamic = fmt['fragments'], None, True
+        last_key, init, segment_duration = None, None, 2
+        last_load = last_change = time.time()
+        try:
+            while True:
+                fragments = list(fragments)
+                if len(fragments) > 1 and fragments[0].get('duration') is None and fragments[-1].get('duration'):
+                    # The initialization segment may change with the period
+                    if fragments[0] != init:
+                        init = fragments[0]
+                        yield init
+                    fragments = fragments[1:]
+                keys = [fragment_key(fragment) for fragment in fragments]
+                if last_key is None:
+                    # Start close to the live edge
+                    new_fragments = fragments[-self._LIVE_START_SEGMENTS:]
+                else:
+                    # Fragments that were downloaded may still be listed, even after the stream ended
+                    new_fragments = fragments[keys.index(last_key) + 1:] if last_key in keys else fragments
+                yield from new_fragments
+                if not is_dynamic:
+                    return
+
+                if new_fragments:
+                    last_key, last_change = fragment_key(new_fragments[-1]), last_load
+                    segment_duration = new_fragments[-1].get('duration') or segment_duration
+                elif last_load - last_change > self._LIVE_STALL_TIMEOUT * segment_duration:
+                    self.to_screen(
+                        f'[{self.FD_NAME}] The live manifest has not been updated for '
+                        f'{last_load - last_change:.0f} seconds; stopping')
+                    return
+                delay = min(update_period or segment_duration, segment_duration)
+                time.sleep(max(last_load + (delay if new_fragments else delay / 2) - time.time(), 0))
+                last_load = time.time()
+                try:
+                    fragments, update_period, is_dynamic = self._load_live_manifest(ie, fmt)
+                except network_exceptions as err:
+                    self.report_warning(f'Unable to refresh the live manifest: {err}')
+                    fragments = []
+        except KeyboardInterrupt:
+            self.to_screen(f'[{self.FD_NAME}] Interrupted by user; no longer following the live manifest')
+
     def _resolve_fragments(self, fragments, ctx):
         fragments = fragments(ctx) if callable(fragments) else fragments
         return [next(iter(fragments))] if self.params.get('test') else fragments
 
     def _get_fragments(self, fmt, ctx):
         fragment_base_url = fmt.get('fragment_base_url')
-        fragments = self._resolve_fragments(fmt['fragments'], ctx)
+        fragments = self._resolve_fragments(
+            self._live_fragments(fmt) if self._is_live_manifest(fmt) else fmt['fragments'], ctx)
 
         frag_index = 0
         for i, fragment in enumerate(fragments):
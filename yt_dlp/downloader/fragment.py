@@ -1,12 +1,17 @@
+import collections
 import concurrent.futures
 import contextlib
+import functools
 import http.client
+import io
 import json
 import math
 import os
 import struct
+import threading
 import time
 import urllib.error
+import urllib.parse
 
 from .common import FileDownloader
 from .http import HttpFD
@@ -17,16 +22,276 @@
     encodeFilename,
     error_to_compat_str,
     sanitized_Request,
+    timeconvert,
     traverse_obj,
 )
 
 
 class HttpQuietDownloader(HttpFD):
+    def __init__(self, ydl, params):
+        super().__init__(ydl, params)
+        self._retry_hooks = []
+
     def to_screen(self, *args, **kargs):
         pass
 
     to_console_title = to_screen
 
+    def add_retry_hook(self, hook):
+        """Add a function to be called with the error whenever a request is retried"""
+        self._retry_hooks.append(hook)
+
+    def report_retry(self, err, count, retries):
+        for hook in self._retry_hooks:
+            hook(err)
+        super().report_retry(err, count, retries)
+
+
+class InMemoryFragmentDownloader(HttpQuietDownloader):
+    """
+    Downloads fragments into memory instead of temporary files
+
+    At most max_buffered bytes of fragments are held at a time. Once over the limit,
+    download_fragment returns False so that the fragment can be downloaded to disk instead.
+    A fragment is held until it is released, and releasing it again does nothing
+    """
+
+    def __init__(self, ydl, params, max_buffered):
+        # HttpFD writes to "-" like to stdout: the stream is kept open and retries
+        # resume from the byte count, so it need not be a real file
+        super().__init__(ydl, {**params, 'continuedl': False, 'xattr_set_filesize': False})
+        self.max_buffered = max_buffered
+        self._buffered = 0
+        self._held = {}  # id -> content of the fragments held
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def sanitize_open(self, filename, open_mode):
+        assert filename == '-'
+        if 'a' not in open_mode or self._local.buffer is None:
+            self._local.buffer = io.BytesIO()
+        return self._local.buffer, filename
+
+    def try_utime(self, filename, last_modified_hdr):
+        return timeconvert(last_modified_hdr) if last_modified_hdr else None
+
+    def download_fragment(self, info_dict):
+        """
+        Download the fragment into memory
+        @returns    (success, content); content is None if the fragment was not downloaded
+        """
+        with self._lock:
+            if self._buffered >= self.max_buffered:
+                return False, None
+        self._local.buffer = None
+        try:
+            success, _ = self.download('-', info_dict)
+        finally:
+            buffer, self._local.buffer = self._local.buffer, None
+        if not success:
+            return True, None
+        content = buffer.getvalue() if buffer else b''
+        with self._lock:
+            self._hold(content)
+        return True, content
+
+    def _hold(self, content):
+        self._held[id(content)] = content
+        self._buffered += len(content)
+
+    def _release(self, content):
+        if self._held.pop(id(content), None) is None:
+            return False
+        self._buffered -= len(content)
+        return True
+
+    def release(self, content):
+        with self._lock:
+            self._release(content)
+
+    def replace(self, content, new_content):
+        """Account for new_content in place of the buffered content"""
+        with self._lock:
+            if self._release(content):
+                self._hold(new_content)
+        return new_content
+
+
+class FragmentProgress:
+    """
+    Thread-safe progress of the fragments of a download
+
+    The bytes of all the fragments being downloaded are counted as they arrive, and the
+    speed is measured over the last SPEED_WINDOW seconds, so that both are right when
+    fragments are downloaded concurrently. A fragment that is requested twice is only
+    counted once. A tracker with children sums up their progress
+    """
+
+    SPEED_WINDOW = 3
+
+    def __init__(self, downloaded_bytes=0, children=()):
+        self.children = children
+        self.total_bytes_estimate = None
+        self._lock = threading.Lock()
+        self._completed_bytes = self._downloaded_bytes = downloaded_bytes
+        self._in_flight = {}
+        self._completed_fragments = set()
+        self._workers = {}
+        self._transferred = 0
+        self._samples = collections.deque([(time.time(), 0)])
+
+    def update(self, key, downloaded_bytes, finished=False, fragment_index=None, **worker_stats):
+        """
+        Record the progress of a fragment
+        @param key              Identifies a single download of the fragment
+        @param downloaded_bytes Bytes of the fragment downloaded so far
+        @param fragment_index   Index of the fragment; the downloads of a fragment
+                                that already finished once are not counted
+        @param worker_stats     Stats to report for the current thread
+        @returns                Whether the progress was counted
+        """
+        now, worker = time.time(), threading.current_thread().name
+        with self._lock:
+            if fragment_index is not None and fragment_index in self._completed_fragments:
+                self._downloaded_bytes -= self._in_flight.pop(key, 0)
+                return False
+            delta = downloaded_bytes - self._in_flight.pop(key, 0)
+            if finished:
+                self._completed_bytes += downloaded_bytes
+                if fragment_index is not None:
+                    self._completed_fragments.add(fragment_index)
+            else:
+                self._in_flight[key] = downloaded_bytes
+            self._downloaded_bytes += delta
+            self._transferred += max(delta, 0)
+            self._samples.append((now, self._transferred))
+            while len(self._samples) > 2 and now - self._samples[1][0] > self.SPEED_WINDOW:
+                self._samples.popleft()
+            stats = self._workers.setdefault(worker, {'downloaded_bytes': 0})
+            stats['downloaded_bytes'] += max(delta, 0)
+            stats.update(worker_stats, fragment_index=fragment_index)
+        return True
+
+    def discard(self, key):
+        """Forget the fragment, e.g. since its download failed"""
+        with self._lock:
+            self._downloaded_bytes -= self._in_flight.pop(key, 0)
+
+    @property
+    def completed_bytes(self):
+        """Bytes of the fragments that are completely downloaded"""
+        if self.children:
+            return sum(child.completed_bytes for child in self.children)
+        return self._completed_bytes
+
+    @property
+    def downloaded_bytes(self):
+        """Bytes of all the fragments, including the ones being downloaded"""
+        if self.children:
+            return sum(child.downloaded_bytes for child in self.children)
+        return self._downloaded_bytes
+
+    @property
+    def speed(self):
+        if self.children:
+            return sum(child.speed or 0 for child in self.children) or None
+        with self._lock:
+            (start, start_bytes), (now, now_bytes) = self._samples[0], self._samples[-1]
+        return FileDownloader.calc_speed(start, now, now_bytes - start_bytes)
+
+    @property
+    def eta(self):
+        if self.children:
+            estimates = [child.total_bytes_estimate for child in self.children]
+            total = None if None in estimates else sum(estimates)
+        else:
+            total = self.total_bytes_estimate
+        speed = self.speed
+        if total is None or not speed:
+            return None
+        return max(int((total - self.downloaded_bytes) / speed), 0)
+
+    @property
+    def workers(self):
+        """Stats of the threads that downloaded fragments, by thread name"""
+        with self._lock:
+            return {worker: dict(stats) for worker, stats in self._workers.items()}
+
+
+class ConcurrencyController:
+    """
+    Limit of the fragment requests in flight to a host, adjusted to the observed performance
+
+    The limit is adjusted after every round of as many fragments as the limit: it is raised
+    by one if the round had a higher throughput than the previous one, and lowered by one if
+    the throughput dropped while the latency of the requests rose. When the server responds
+    with HTTP 429 or 503, the limit is halved (at most once per request latency)
+    """
+
+    START = 2
+    # Relative changes of throughput and latency that are not just noise
+    INCREASE_THRESHOLD = 1.05
+    DECREASE_THRESHOLD = 0.9
+    LATENCY_THRESHOLD = 1.5
+
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = min(self.START, max_limit)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._throughput = self._min_latency = None
+        self._latency = 1
+        self._last_decrease = 0
+        self._start_round()
+
+    def _start_round(self):
+        self._round_start, self._round_bytes, self._round_latencies = time.time(), 0, []
+
+    def acquire(self):
+        """Take a slot for a request, if the limit allows it"""
+        with self._lock:
+            if self._in_flight >= self.limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, size=None, latency=None):
+        """
+        Free the slot of a finished request
+        @param size, latency    Of the fragment, if it was downloaded successfully
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if size is None:
+                return
+            self._round_bytes += size
+            self._round_latencies.append(latency)
+            self._min_latency = min(latency, self._min_latency or latency)
+            if len(self._round_latencies) < self.limit:
+                return
+
+            throughput = self._round_bytes / max(time.time() - self._round_start, 0.001)
+            self._latency = sum(self._round_latencies) / len(self._round_latencies)
+            if self._throughput is not None:
+                if throughput > self._throughput * self.INCREASE_THRESHOLD:
+                    self.limit = min(self.limit + 1, self.max_limit)
+                elif (throughput < self._throughput * self.DECREASE_THRESHOLD
+                        and self._latency > self._min_latency * self.LATENCY_THRESHOLD):
+                    self.limit = max(self.limit - 1, 1)
+            self._throughput = throughput
+            self._start_round()
+
+    def throttled(self):
+        """Record that the server asked to slow down"""
+        with self._lock:
+            now = time.time()
+            if now - self._last_decrease < self._latency:
+                return
+            self._last_decrease = now
+            self.limit = max(self.limit // 2, 1)
+            self._throughput = None
+            self._start_round()
+
 
 class FragmentFD(FileDownloader):
     """
@@ -38,8 +303,12 @@ class FragmentFD(FileDownloader):
                         and hlsnative only)
     skip_unavailable_fragments:
                         Skip unavailable fragments (DASH and hlsnative only)
+    adaptive_fragment_downloads:
+                        Adjust the number of fragments downloaded concurrently
+                        from each host, up to concurrent_fragment_downloads
     keep_fragments:     Keep downloaded fragments on disk after downloading is
-                        finished
+                        finished. Otherwise, the fragments are held in memory
+                        and only written to disk if too many are pending
     concurrent_fragment_downloads:  The number of threads to use for native hls and dash downloads
     _no_ytdl_file:      Don't use .ytdl file
 
@@ -47,8 +316,8 @@ class FragmentFD(FileDownloader):
     bookkeeping file with download state and metadata (in future such files will
     be used for any incomplete download handled by yt-dlp). This file is
     used to properly handle resuming, check download file consistency and detect
-    potential errors. The file has a .ytdl extension and represents a standard
-    JSON file of the following format:
+    potential errors. The file has a .ytdl extension and starts with a line
+    of JSON of the following format:
 
     extractor:
         Dictionary of extractor related data. TBD.
@@ -58,12 +327,36 @@ class FragmentFD(FileDownloader):
             current_fragment:
                 Dictionary with current (being downloaded) fragment data:
                 index:  0-based index of current fragment among all fragments
+                offset: Size of the downloaded file up to that fragment
             fragment_count:
                 Total count of fragments
+            extra_state:
+                State of the specific downloader
+
+    Rather than rewriting the file, a line of JSON with the index and offset is
+    appended to it for every fragment written to the downloaded file, along with
+    extra_state and fragment_count if they changed. The last complete line
+    supersedes the ones before it; the file is compacted when resuming.
 
     This feature is experimental and file format may change in future.
     """
 
+    # Fragments pending to be appended are downloaded to disk above this size
+    _MAX_BUFFERED_FRAGMENT_BYTES = 128 * 1024 * 1024
+    # Number of fragments per worker that may be downloaded ahead of the first unfinished one
+    _REORDER_WINDOW = 4
+    # A fragment blocking the others is requested again once it has taken
+    # this many times the median fragment download time (but at least _HEDGE_MIN_DELAY seconds)
+    _HEDGE_FACTOR = 3
+    _HEDGE_MIN_DELAY = 5
+
+    def __init__(self, ydl, params):
+        super().__init__(ydl, params)
+        self._concurrency_controllers = {}
+        self._concurrency_lock = threading.Lock()
+        self._decryption_keys = {}
+        self._decryption_key_lock = threading.Lock()
+
     def report_retry_fragment(self, err, frag_index, count, retries):
         self.to_screen(
             '\r[download] Got server HTTP error: %s. Retrying fragment %d (attempt %d of %s) ...'
@@ -89,48 +382,95 @@ def _read_ytdl_file(self, ctx):
         assert 'ytdl_corrupt' not in ctx
         stream, _ = self.sanitize_open(self.ytdl_filename(ctx['filename']), 'r')
         try:
-            ytdl_data = json.loads(stream.read())
-            ctx['fragment_index'] = ytdl_data['downloader']['current_fragment']['index']
-            if 'extra_state' in ytdl_data['downloader']:
-                ctx['extra_state'] = ytdl_data['downloader']['extra_state']
+            header, *journal = stream.read().split('\n')
+            downloader = json.loads(header)['downloader']
+            ctx['fragment_index'] = downloader['current_fragment']['index']
+            ctx['fragment_offset'] = downloader['current_fragment'].get('offset')
+            if 'extra_state' in downloader:
+                ctx['extra_state'] = downloader['extra_state']
         except Exception:
             ctx['ytdl_corrupt'] = True
+            return
         finally:
             stream.close()
 
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:  # Cut short by an interruption
+                break
+            ctx['fragment_index'], ctx['fragment_offset'] = entry['index'], entry['offset']
+            if 'extra_state' in entry:
+                ctx['extra_state'] = entry['extra_state']
+
     def _write_ytdl_file(self, ctx):
         frag_index_stream, _ = self.sanitize_open(self.ytdl_filename(ctx['filename']), 'w')
         try:
             downloader = {
                 'current_fragment': {
                     'index': ctx['fragment_index'],
+                    'offset': ctx.get('fragment_offset') or 0,
                 },
             }
             if 'extra_state' in ctx:
                 downloader['extra_state'] = ctx['extra_state']
             if ctx.get('fragment_count') is not None:
                 downloader['fragment_count'] = ctx['fragment_count']
-            frag_index_stream.write(json.dumps({'downloader': downloader}))
+            frag_index_stream.write(json.dumps({'downloader': downloader}) + '\n')
         finally:
             frag_index_stream.close()
+        ctx['ytdl_journaled'] = (json.dumps(ctx.get('extra_state')), ctx.get('fragment_count'))
+
+    def _append_ytdl_journal(self, ctx):
+        entry = {
+            'index': ctx['fragment_index'],
+            'offset': ctx['dest_stream'].tell(),
+        }
+        extra_state, fragment_count = json.dumps(ctx.get('extra_state')), ctx.get('fragment_count')
+        last_extra_state, last_fragment_count = ctx['ytdl_journaled']
+        if extra_state != last_extra_state:
+            entry['extra_state'] = ctx['extra_state']
+        if fragment_count is not None and fragment_count != last_fragment_count:
+            entry['fragment_count'] = fragment_count
+        ctx['ytdl_journaled'] = (extra_state, fragment_count)
+        ctx['ytdl_stream'].write(json.dumps(entry) + '\n')
+        ctx['ytdl_stream'].flush()
 
     def _download_fragment(self, ctx, frag_url, info_dict, headers=None, request_data=None):
-        fragment_filename = '%s-Frag%d' % (ctx['tmpfilename'], ctx['fragment_index'])
+        fragment_filename = '%s-Frag%d%s' % (
+            ctx['tmpfilename'], ctx['fragment_index'], '.hedge' if ctx.get('hedged') else '')
         fragment_info_dict = {
             'url': frag_url,
             'http_headers': headers or info_dict.get('http_headers'),
             'request_data': request_data,
             'ctx_id': ctx.get('ctx_id'),
+            'frag_index': ctx['fragment_index'],
         }
-        success, _ = ctx['dl'].download(fragment_filename, fragment_info_dict)
-        if not success:
-            return False
+        if ctx.get('fragment_content') is not None:  # Not appended, e.g. when retrying
+            ctx['memory_dl'].release(ctx.pop('fragment_content'))
+        in_memory, frag_content = False, None
+        try:
+            if ctx.get('memory_dl'):
+                in_memory, frag_content = ctx['memory_dl'].download_fragment(fragment_info_dict)
+            if in_memory:
+                if frag_content is None:
+                    return False
+                ctx['fragment_content'] = frag_content
+            else:
+                success, _ = ctx['dl'].download(fragment_filename, fragment_info_dict)
+                if not success:
+                    return False
+                ctx['fragment_filename_sanitized'] = fragment_filename
+        finally:
+            if ctx.get('progress'):
+                ctx['progress'].discard(id(fragment_info_dict))
         if fragment_info_dict.get('filetime'):
             ctx['fragment_filetime'] = fragment_info_dict.get('filetime')
-        ctx['fragment_filename_sanitized'] = fragment_filename
         return True
 
     def _read_fragment(self, ctx):
+        if ctx.get('fragment_content') is not None:
+            return ctx['fragment_content']
         if not ctx.get('fragment_filename_sanitized'):
             return None
         try:
@@ -150,10 +490,14 @@ def _append_fragment(self, ctx, frag_content):
             ctx['dest_stream'].flush()
         finally:
             if self.__do_ytdl_file(ctx):
-                self._write_ytdl_file(ctx)
-            if not self.params.get('keep_fragments', False):
-                self.try_remove(encodeFilename(ctx['fragment_filename_sanitized']))
-            del ctx['fragment_filename_sanitized']
+                self._append_ytdl_journal(ctx)
+            buffered = ctx.pop('fragment_content', None)
+            if buffered is not None:
+                ctx['memory_dl'].release(buffered)
+            else:
+                if not self.params.get('keep_fragments', False):
+                    self.try_remove(encodeFilename(ctx['fragment_filename_sanitized']))
+                del ctx['fragment_filename_sanitized']
 
     def _prepare_frag_download(self, ctx):
         if 'live' not in ctx:
@@ -166,11 +510,17 @@ def _prepare_frag_download(self, ctx):
             total_frags_str = 'unknown (live)'
         self.to_screen(f'[{self.FD_NAME}] Total fragments: {total_frags_str}')
         self.report_destination(ctx['filename'])
-        dl = HttpQuietDownloader(self.ydl, {
+        dl_params = {
             **self.params,
             'noprogress': True,
             'test': False,
-        })
+            # The fragments are already downloaded concurrently
+            'http_connections': 1,
+        }
+        dl = HttpQuietDownloader(self.ydl, dl_params)
+        memory_dl = None
+        if not self.params.get('keep_fragments', False):
+            memory_dl = InMemoryFragmentDownloader(self.ydl, dl_params, self._MAX_BUFFERED_FRAGMENT_BYTES)
         tmpfilename = self.temp_name(ctx['filename'])
         open_mode = 'wb'
         resume_len = 0
@@ -186,29 +536,42 @@ def _prepare_frag_download(self, ctx):
             'fragment_index': 0,
         })
 
+        ytdl_stream = None
         if self.__do_ytdl_file(ctx):
-            if os.path.isfile(encodeFilename(self.ytdl_filename(ctx['filename']))):
+            ytdl_filename = self.ytdl_filename(ctx['filename'])
+            if os.path.isfile(encodeFilename(ytdl_filename)):
                 self._read_ytdl_file(ctx)
+                offset = ctx.get('fragment_offset')
                 is_corrupt = ctx.get('ytdl_corrupt') is True
-                is_inconsistent = ctx['fragment_index'] > 0 and resume_len == 0
+                is_inconsistent = ctx['fragment_index'] > 0 and (
+                    resume_len == 0 if offset is None else resume_len < offset)
                 if is_corrupt or is_inconsistent:
                     message = (
                         '.ytdl file is corrupt' if is_corrupt else
                         'Inconsistent state of incomplete fragment download')
                     self.report_warning(f'{message}. Restarting from the beginning ...')
-                    ctx['fragment_index'] = resume_len = 0
+                    ctx['fragment_index'] = ctx['fragment_offset'] = resume_len = 0
+                    open_mode = 'wb'
                     if 'ytdl_corrupt' in ctx:
                         del ctx['ytdl_corrupt']
-                    self._write_ytdl_file(ctx)
+                elif offset is not None and resume_len > offset:
+                    # Drop what was written after the last fragment that was journaled
+                    os.truncate(encodeFilename(tmpfilename), offset)
+                    resume_len = offset
             else:
-                self._write_ytdl_file(ctx)
                 assert ctx['fragment_index'] == 0
+            ctx['fragment_offset'] = resume_len
+            # Compact the journal
+            self._write_ytdl_file(ctx)
+            ytdl_stream, _ = self.sanitize_open(ytdl_filename, 'a')
 
         dest_stream, tmpfilename = self.sanitize_open(tmpfilename, open_mode)
 
         ctx.update({
             'dl': dl,
+            'memory_dl': memory_dl,
             'dest_stream': dest_stream,
+            'ytdl_stream': ytdl_stream,
             'tmpfilename': tmpfilename,
             # Total complete fragments downloaded so far in bytes
             'complete_frags_downloaded_bytes': resume_len,
@@ -230,64 +593,69 @@ def _start_frag_download(self, ctx, info_dict):
         }
 
         start = time.time()
+        progress = FragmentProgress(resume_len)
         ctx.update({
             'started': start,
-            'fragment_started': start,
-            # Amount of fragment's bytes downloaded by the time of the previous
-            # frag progress hook invocation
-            'prev_frag_downloaded_bytes': 0,
+            'progress': progress,
         })
+        # The hooks may be called from several threads at once
+        hook_lock = threading.Lock()
 
         def frag_progress_hook(s):
             if s['status'] not in ('downloading', 'finished'):
                 return
 
-            if not total_frags and ctx.get('fragment_count'):
-                state['fragment_count'] = ctx['fragment_count']
-
             if ctx_id is not None and s.get('ctx_id') != ctx_id:
                 return
 
-            state['max_progress'] = ctx.get('max_progress')
-            state['progress_idx'] = ctx.get('progress_idx')
-
-            time_now = time.time()
-            state['elapsed'] = time_now - start
-            frag_total_bytes = s.get('total_bytes') or 0
             s['fragment_info_dict'] = s.pop('info_dict', {})
-            if not ctx['live']:
-                estimated_size = (
-                    (ctx['complete_frags_downloaded_bytes'] + frag_total_bytes)
-                    / (state['fragment_index'] + 1) * total_frags)
-                state['total_bytes_estimate'] = estimated_size
-
-            if s['status'] == 'finished':
-                state['fragment_index'] += 1
-                ctx['fragment_index'] = state['fragment_index']
-                state['downloaded_bytes'] += frag_total_bytes - ctx['prev_frag_downloaded_bytes']
-                ctx['complete_frags_downloaded_bytes'] = state['downloaded_bytes']
-                ctx['speed'] = state['speed'] = self.calc_speed(
-                    ctx['fragment_started'], time_now, frag_total_bytes)
-                ctx['fragment_started'] = time.time()
-                ctx['prev_frag_downloaded_bytes'] = 0
-            else:
-                frag_downloaded_bytes = s['downloaded_bytes']
-                state['downloaded_bytes'] += frag_downloaded_bytes - ctx['prev_frag_downloaded_bytes']
-                if not ctx['live']:
-                    state['eta'] = self.calc_eta(
-                        start, time_now, estimated_size - resume_len,
-                        state['downloaded_bytes'] - resume_len)
-                ctx['speed'] = state['speed'] = self.calc_speed(
-                    ctx['fragment_started'], time_now, frag_downloaded_bytes)
-                ctx['prev_frag_downloaded_bytes'] = frag_downloaded_bytes
-            self._hook_progress(state, info_dict)
+            finished = s['status'] == 'finished'
+            frag_downloaded_bytes = (s.get('total_bytes') if finished else s.get('downloaded_bytes')) or 0
+            if not progress.update(
+                    id(s['fragment_info_dict']), frag_downloaded_bytes, finished,
+                    s['fragment_info_dict'].get('frag_index'), speed=None if finished else s.get('speed')):
+                # The fragment was already downloaded by another request
+                return
+
+            with hook_lock:
+                if not total_frags and ctx.get('fragment_count'):
+                    state['fragment_count'] = ctx['fragment_count']
+                state['max_progress'] = ctx.get('max_progress')
+                state['progress_idx'] = ctx.get('progress_idx')
+                state['elapsed'] = time.time() - start
+
+                if finished:
+                    state['fragment_index'] += 1
+                    if not ctx.get('concurrent'):
+                        ctx['fragment_index'] = state['fragment_index']
+                    ctx['complete_frags_downloaded_bytes'] = progress.completed_bytes
+                state['downloaded_bytes'] = progress.downloaded_bytes
+                if not ctx['live'] and state['fragment_index']:
+                    # Assume that the fragments yet to be downloaded are as large as the ones so far
+                    progress.total_bytes_estimate = state['total_bytes_estimate'] = max(
+                        progress.completed_bytes / state['fragment_index'] * total_frags, state['downloaded_bytes'])
+                ctx['speed'] = state['speed'] = progress.speed
+                state['eta'] = progress.eta
+                state['workers'] = progress.workers
+                if ctx.get('progress_total'):
+                    total = ctx['progress_total']
+                    state.update({
+                        'total_downloaded_bytes': total.downloaded_bytes,
+                        'total_speed': total.speed,
+                        'total_eta': total.eta,
+                    })
+                self._hook_progress(state, info_dict)
 
         ctx['dl'].add_progress_hook(frag_progress_hook)
+        if ctx.get('memory_dl'):
+            ctx['memory_dl'].add_progress_hook(frag_progress_hook)
 
         return start
 
     def _finish_frag_download(self, ctx, info_dict):
         ctx['dest_stream'].close()
+        if ctx.get('ytdl_stream'):
+            ctx['ytdl_stream'].close()
         if self.__do_ytdl_file(ctx):
             ytdl_filename = encodeFilename(self.ytdl_filename(ctx['filename']))
             if os.path.isfile(ytdl_filename):
@@ -335,12 +703,25 @@ def _prepare_external_frag_download(self, ctx):
         })
 
     def decrypter(self, info_dict):
-        _key_cache = {}
-
         def _get_key(url):
-            if url not in _key_cache:
-                _key_cache[url] = self.ydl.urlopen(self._prepare_url(info_dict, url)).read()
-            return _key_cache[url]
+            # The fragments may be decrypted by several threads; only one of them fetches
+            # each key, while the others wait for it without holding up the other keys
+            with self._decryption_key_lock:
+                future = self._decryption_keys.get(url)
+                fetch = future is None
+                if fetch:
+                    future = self._decryption_keys[url] = concurrent.futures.Future()
+            if not fetch:
+                return future.result()
+            try:
+                future.set_result(self.ydl.urlopen(sanitized_Request(
+                    url, None, {**(info_dict.get('http_headers') or {}), 'Ytdl-coalesce': '1'})).read())
+            except BaseException as err:
+                with self._decryption_key_lock:
+                    # The next fragment tries again
+                    del self._decryption_keys[url]
+                future.set_exception(err)
+            return future.result()
 
         def decrypt_fragment(fragment, frag_content):
             decrypt_info = fragment.get('decrypt_info')
@@ -370,10 +751,12 @@ def download_and_append_fragments_multiple(self, *args, pack_func=None, finish_f
         if max_progress > 1:
             self._prepare_multiline_status(max_progress)
         is_live = any(traverse_obj(args, (..., 2, 'is_live'), default=[]))
+        progress_total = FragmentProgress(children=[ctx['progress'] for ctx, *_ in args])
 
         def thread_func(idx, ctx, fragments, info_dict, tpe):
             ctx['max_progress'] = max_progress
             ctx['progress_idx'] = idx
+            ctx['progress_total'] = progress_total
             return self.download_and_append_fragments(
                 ctx, fragments, info_dict, pack_func=pack_func, finish_func=finish_func,
                 tpe=tpe, interrupt_trigger=interrupt_trigger)
@@ -404,7 +787,7 @@ def interrupt_trigger_iter(fg):
 
         spins = []
         for idx, (ctx, fragments, info_dict) in enumerate(args):
-            tpe = FTPE(math.ceil(max_workers / max_progress))
+            tpe = FTPE(max_workers if self.params.get('adaptive_fragment_downloads') else math.ceil(max_workers / max_progress))
             job = tpe.submit(thread_func, idx, ctx, interrupt_trigger_iter(fragments), info_dict, tpe)
             spins.append((tpe, job))
 
@@ -422,6 +805,127 @@ def interrupt_trigger_iter(fg):
         # so returning a intermediate result here instead of KeyboardInterrupt on live
         return result
 
+    def _concurrency_controller(self, info_dict):
+        """The ConcurrencyController of the host of the fragments, shared by all the formats"""
+        host = urllib.parse.urlparse(info_dict.get('fragment_base_url') or info_dict.get('url') or '').netloc
+        with self._concurrency_lock:
+            if host not in self._concurrency_controllers:
+                self._concurrency_controllers[host] = ConcurrencyController(
+                    self.params.get('concurrent_fragment_downloads', 1))
+            return self._concurrency_controllers[host]
+
+    def _discard_fragment(self, ctx, frag_result):
+        if frag_result.get('fragment_content') is not None:
+            ctx['memory_dl'].release(frag_result['fragment_content'])
+        elif frag_result.get('fragment_filename_sanitized') and not self.params.get('keep_fragments', False):
+            self.try_remove(encodeFilename(frag_result['fragment_filename_sanitized']))
+
+    @staticmethod
+    def _fragment_size(frag_result):
+        if frag_result.get('fragment_content') is not None:
+            return len(frag_result['fragment_content'])
+        elif frag_result.get('fragment_filename_sanitized'):
+            with contextlib.suppress(OSError):
+                return os.path.getsize(encodeFilename(frag_result['fragment_filename_sanitized']))
+        return None
+
+    def _download_fragments_unordered(self, ctx, fragments, download_func, pool, max_workers, controller=None):
+        """
+        Download the fragments with up to max_workers of them in flight, in any order
+
+        Finished fragments are held until all the ones before them are done, but no more than
+        _REORDER_WINDOW fragments per worker are downloaded ahead of the first unfinished one.
+        If that fragment is much slower than the others, it is requested once more in parallel
+        and whichever request finishes first is used
+
+        @param download_func    Function (fragment, hedged) -> dict of the fragment's ctx items
+        @param controller       ConcurrencyController that further limits the fragments in flight
+        @returns                Generator of (fragment, ctx items) in the order of fragments
+        """
+        fragments = iter(fragments)
+        window = max_workers * self._REORDER_WINDOW
+        pending = {}  # future -> (position, start time)
+        attempts = collections.Counter()  # position -> number of requests in flight
+        started, finished, durations = [], {}, []
+        hedged = set()
+        next_pos, exhausted = 0, False
+
+        def can_submit():
+            return len(pending) < max_workers and (not controller or controller.acquire())
+
+        def release(future, start):
+            frag_result = None if future.cancelled() or future.exception() else future.result()
+            size = frag_result and self._fragment_size(frag_result)
+            controller.release(size, time.time() - start)
+
+        def submit(pos, hedge=False):
+            start = time.time()
+            future = pool.submit(download_func, started[pos], hedge)
+            pending[future] = (pos, start)
+            attempts[pos] += 1
+            if controller:
+                future.add_done_callback(functools.partial(release, start=start))
+
+        try:
+            while True:
+                while next_pos in finished:
+                    yield started[next_pos], finished.pop(next_pos)
+                    started[next_pos] = None
+                    next_pos += 1
+                while not exhausted and len(started) < next_pos + window and can_submit():
+                    fragment = next(fragments, None)
+                    if fragment is None:
+                        exhausted = True
+                        if controller:
+                            controller.release()
+                        break
+                    started.append(fragment)
+                    submit(len(started) - 1)
+                if exhausted and next_pos == len(started):
+                    return
+                elif not pending:
+                    # The controller allows no more requests to the host for now
+                    time.sleep(0.1)
+                    continue
+
+                timeout = None
+                if len(durations) >= max_workers and next_pos not in hedged and attempts[next_pos]:
+                    durations.sort()
+                    delay = max(self._HEDGE_FACTOR * durations[len(durations) // 2], self._HEDGE_MIN_DELAY)
+                    first_start = min(t for p, t in pending.values() if p == next_pos)
+                    timeout = first_start + delay - time.time()
+                    if timeout <= 0 and can_submit():
+                        self.write_debug(f'Requesting fragment {started[next_pos]["frag_index"]} again')
+                        hedged.add(next_pos)
+                        submit(next_pos, hedge=True)
+                        continue
+                    timeout = max(timeout, 0.5)
+
+                done, _ = concurrent.futures.wait(
+                    pending, timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    pos, start = pending.pop(future)
+                    attempts[pos] -= 1
+                    frag_result = future.result()
+                    success = any(v is not None for v in frag_result.values())
+                    if pos < next_pos or pos in finished or not success and attempts[pos]:
+                        self._discard_fragment(ctx, frag_result)
+                        continue
+                    finished[pos] = frag_result
+                    if success:
+                        durations.append(time.time() - start)
+        finally:
+            def discard(future):
+                if not future.cancelled() and not future.exception():
+                    self._discard_fragment(ctx, future.result())
+
+            # Stragglers that lost to their second request are discarded whenever they finish
+            for future in pending:
+                future.cancel()
+                future.add_done_callback(discard)
+            for frag_result in finished.values():
+                self._discard_fragment(ctx, frag_result)
+
     def download_and_append_fragments(
             self, ctx, fragments, info_dict, *, pack_func=None, finish_func=None,
             tpe=None, interrupt_trigger=None):
@@ -460,6 +964,7 @@ def download_fragment(fragment, ctx):
                     # First we try to retry then either skip or abort.
                     # See https://github.com/ytdl-org/youtube-dl/issues/10165,
                     # https://github.com/ytdl-org/youtube-dl/issues/10448).
+                    report_throttling(err)
                     count += 1
                     ctx['last_error'] = err
                     if count <= fragment_retries:
@@ -475,6 +980,10 @@ def download_fragment(fragment, ctx):
                 ctx['dest_stream'].close()
                 self.report_error(f'Giving up after {fragment_retries} fragment retries')
 
+        def report_throttling(err):
+            if controller and getattr(err, 'code', None) in (429, 503):
+                controller.throttled()
+
         def append_fragment(frag_content, frag_index, ctx):
             if frag_content:
                 self._append_fragment(ctx, pack_func(frag_content, frag_index))
@@ -488,23 +997,49 @@ def append_fragment(frag_content, frag_index, ctx):
 
         decrypt_fragment = self.decrypter(info_dict)
 
-        max_workers = math.ceil(
-            self.params.get('concurrent_fragment_downloads', 1) / ctx.get('max_progress', 1))
+        controller = None
+        max_workers = self.params.get('concurrent_fragment_downloads', 1)
+        if max_workers > 1 and self.params.get('adaptive_fragment_downloads'):
+            # The formats share the limit of their host instead of splitting max_workers
+            controller = self._concurrency_controller(info_dict)
+            for dl in filter(None, (ctx['dl'], ctx.get('memory_dl'))):
+                dl.add_retry_hook(report_throttling)
+        else:
+            max_workers = math.ceil(max_workers / ctx.get('max_progress', 1))
+
         if max_workers > 1:
-            def _download_fragment(fragment):
-                ctx_copy = ctx.copy()
+            def _download_fragment(fragment, hedged):
+                ctx_copy = {**ctx, 'hedged': hedged}
+                # These belong to the fragment that may be being appended meanwhile
+                for key in ('fragment_index', 'fragment_content', 'fragment_filename_sanitized', 'fragment_decrypted'):
+                    ctx_copy.pop(key, None)
                 download_fragment(fragment, ctx_copy)
-                return fragment, fragment['frag_index'], ctx_copy.get('fragment_filename_sanitized')
+                # Fragments held in memory are also decrypted by the workers rather than when appended
+                frag_content = ctx_copy.get('fragment_content')
+                if frag_content:
+                    try:
+                        ctx_copy['fragment_content'] = ctx['memory_dl'].replace(
+                            frag_content, decrypt_fragment(fragment, frag_content))
+                    except BaseException:
+                        ctx['memory_dl'].release(frag_content)
+                        raise
+                    ctx_copy['fragment_decrypted'] = True
+                return {key: ctx_copy.get(key) for key in (
+                    'fragment_filename_sanitized', 'fragment_content', 'fragment_decrypted')}
 
-            self.report_warning('The download speed shown is only of one thread. This is a known issue and patches are welcome')
+            ctx['concurrent'] = True
             with tpe or concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
                 try:
-                    for fragment, frag_index, frag_filename in pool.map(_download_fragment, fragments):
+                    for fragment, frag_result in self._download_fragments_unordered(
+                            ctx, fragments, _download_fragment, pool, max_workers, controller):
                         ctx.update({
-                            'fragment_filename_sanitized': frag_filename,
-                            'fragment_index': frag_index,
+                            **frag_result,
+                            'fragment_index': fragment['frag_index'],
                         })
-                        if not append_fragment(decrypt_fragment(fragment, self._read_fragment(ctx)), frag_index, ctx):
+                        frag_content = self._read_fragment(ctx)
+                        if not ctx.pop('fragment_decrypted'):
+                            frag_content = decrypt_fragment(fragment, frag_content)
+                        if not append_fragment(frag_content, ctx['fragment_index'], ctx):
                             return False
                 except KeyboardInterrupt:
                     self._finish_multiline_status()
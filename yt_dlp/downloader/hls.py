@@ -1,6 +1,6 @@
-import binascii
 import io
 import re
+import time
 import urllib.parse
 
 from . import get_suitable_downloader
@@ -8,7 +8,8 @@
 from .fragment import FragmentFD
 from .. import webvtt
 from ..dependencies import Cryptodome_AES
-from ..utils import bug_reports_message, parse_m3u8_attributes, update_url_query
+from ..m3u8 import HlsPlaylist
+from ..utils import bug_reports_message, network_exceptions
 
 
 class HlsFD(FragmentFD):
@@ -19,6 +20,10 @@ class HlsFD(FragmentFD):
     """
 
     FD_NAME = 'hlsnative'
+    # Number of segments before the end of a live playlist to start downloading from
+    _LIVE_START_SEGMENTS = 3
+    # Number of target durations after which a live playlist that stopped changing is considered ended
+    _LIVE_STALL_TIMEOUT = 10
 
     @staticmethod
     def can_download(manifest, info_dict, allow_unplayable_formats=False):
@@ -46,11 +51,71 @@ def can_download(manifest, info_dict, allow_unplayable_formats=False):
                 r'#EXT-X-KEY:METHOD=(?!NONE|AES-128)',  # encrypted streams [1]
             ]
 
-        def check_results():
-            yield not info_dict.get('is_live')
-            for feature in UNSUPPORTED_FEATURES:
-                yield not re.search(feature, manifest)
-        return all(check_results())
+        return not any(re.search(feature, manifest) for feature in UNSUPPORTED_FEATURES)
+
+    @staticmethod
+    def _make_fragment(segment, frag_index):
+        return {
+            'frag_index': frag_index,
+            'url': segment.url,
+            'decrypt_info': segment.decrypt_info or {'METHOD': 'NONE'},
+            'byte_range': dict(zip(('start', 'end'), segment.byte_range or ())),
+            'media_sequence': segment.media_sequence,
+        }
+
+    def _live_fragments(self, playlist, info_dict):
+        """
+        Follow a live media playlist, generating the fragments of its segments as they are added
+
+        The playlist is reloaded as often as allowed by RFC 8216 §6.3.4: one target duration
+        after it has changed, and half of one after it has not. Following stops at the end
+        of the playlist, or once it has not changed for _LIVE_STALL_TIMEOUT target durations
+        """
+        segments, frag_index, init = playlist.segments, 0, None
+        # Start close to the live edge, but no closer than recommended by RFC 8216 §6.3.3
+        media_sequences = [segment.media_sequence for segment in segments if not segment.is_init]
+        first_sequence = media_sequences[max(len(media_sequences) - self._LIVE_START_SEGMENTS, 0)] if media_sequences else 0
+        last_load = last_change = time.time()
+        try:
+            while True:
+                for segment in segments:
+                    if segment.is_init:
+                        # The initialization section may change after a discontinuity
+                        init = segment
+                        continue
+                    elif segment.is_ad or segment.media_sequence < first_sequence:
+                        continue
+                    for fragment_segment in filter(None, (init, segment)):
+                        frag_index += 1
+                        yield self._make_fragment(fragment_segment, frag_index)
+                    init = None
+                if playlist.endlist:
+                    return
+                # The live edge only applies to the initial playlist, since the media
+                # sequence numbers of the refreshes may restart (see HlsPlaylist.feed)
+                first_sequence = 0
+                target_duration = playlist.target_duration or 10
+                delay = target_duration if segments else target_duration / 2
+                # Only the new segments of each refresh are needed
+                playlist.segments.clear()
+
+                time.sleep(max(last_load + delay - time.time(), 0))
+                last_load = time.time()
+                try:
+                    urlh = self.ydl.urlopen(self._prepare_url(info_dict, playlist.base_url))
+                    segments = playlist.feed(urlh.read().decode('utf-8', 'ignore'))
+                except network_exceptions as err:
+                    self.report_warning(f'Unable to refresh the live playlist: {err}')
+                    segments = []
+                if segments:
+                    last_change = last_load
+                elif last_load - last_change > self._LIVE_STALL_TIMEOUT * target_duration:
+                    self.to_screen(
+                        f'[{self.FD_NAME}] The live playlist has not been updated for '
+                        f'{last_load - last_change:.0f} seconds; stopping')
+                    return
+        except KeyboardInterrupt:
+            self.to_screen(f'[{self.FD_NAME}] Interrupted by user; no longer following the live playlist')
 
     def real_download(self, filename, info_dict):
         man_url = info_dict['url']
@@ -60,19 +125,21 @@ def real_download(self, filename, info_dict):
         man_url = urlh.geturl()
         s = urlh.read().decode('utf-8', 'ignore')
 
+        extra_param_to_segment_url = info_dict.get('extra_param_to_segment_url')
+        playlist = HlsPlaylist(
+            man_url, query=extra_param_to_segment_url and urllib.parse.parse_qs(extra_param_to_segment_url))
+        playlist.feed(s)
+        media_segments = [segment for segment in playlist.segments if not segment.is_init]
+
         can_download, message = self.can_download(s, info_dict, self.params.get('allow_unplayable_formats')), None
         if can_download and not Cryptodome_AES and '#EXT-X-KEY:METHOD=AES-128' in s:
             if FFmpegFD.available():
                 can_download, message = False, 'The stream has AES-128 encryption and pycryptodomex is not available'
             else:
                 message = ('The stream has AES-128 encryption and neither ffmpeg nor pycryptodomex are available; '
-                           'Decryption will be performed natively, but will be extremely slow')
+                           'Decryption will be performed natively, but will be slow')
         if not can_download:
-            has_drm = re.search('|'.join([
-                r'#EXT-X-FAXS-CM:',  # Adobe Flash Access
-                r'#EXT-X-(?:SESSION-)?KEY:.*?URI="skd://',  # Apple FairPlay
-            ]), s)
-            if has_drm and not self.params.get('allow_unplayable_formats'):
+            if playlist.has_drm and not self.params.get('allow_unplayable_formats'):
                 self.report_error(
                     'This video is DRM protected; Try selecting another format with --format or '
                     'add --check-formats to automatically fallback to the next best format')
@@ -84,9 +151,10 @@ def real_download(self, filename, info_dict):
         elif message:
             self.report_warning(message)
 
-        is_webvtt = info_dict['ext'] == 'vtt'
-        if is_webvtt:
-            real_downloader = None  # Packing the fragments is not currently supported for external downloader
+        is_webvtt, is_live = info_dict['ext'] == 'vtt', bool(info_dict.get('is_live'))
+        if is_webvtt or is_live:
+            # Packing the fragments or following a live playlist is not currently supported for external downloaders
+            real_downloader = None
         else:
             real_downloader = get_suitable_downloader(
                 info_dict, self.params, None, protocol='m3u8_frag_urls', to_stdout=(filename == '-'))
@@ -95,38 +163,11 @@ def real_download(self, filename, info_dict):
         if real_downloader:
             self.to_screen(f'[{self.FD_NAME}] Fragment downloads will be delegated to {real_downloader.get_basename()}')
 
-        def is_ad_fragment_start(s):
-            return (s.startswith('#ANVATO-SEGMENT-INFO') and 'type=ad' in s
-                    or s.startswith('#UPLYNK-SEGMENT') and s.endswith(',ad'))
-
-        def is_ad_fragment_end(s):
-            return (s.startswith('#ANVATO-SEGMENT-INFO') and 'type=master' in s
-                    or s.startswith('#UPLYNK-SEGMENT') and s.endswith(',segment'))
-
-        fragments = []
-
-        media_frags = 0
-        ad_frags = 0
-        ad_frag_next = False
-        for line in s.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            if line.startswith('#'):
-                if is_ad_fragment_start(line):
-                    ad_frag_next = True
-                elif is_ad_fragment_end(line):
-                    ad_frag_next = False
-                continue
-            if ad_frag_next:
-                ad_frags += 1
-                continue
-            media_frags += 1
-
         ctx = {
             'filename': filename,
-            'total_frags': media_frags,
-            'ad_frags': ad_frags,
+            'total_frags': None if is_live else sum(not segment.is_ad for segment in media_segments),
+            'ad_frags': sum(segment.is_ad for segment in media_segments),
+            'live': is_live,
         }
 
         if real_downloader:
@@ -136,112 +177,29 @@ def is_ad_fragment_end(s):
 
         extra_state = ctx.setdefault('extra_state', {})
 
-        format_index = info_dict.get('format_index')
-        extra_query = None
-        extra_param_to_segment_url = info_dict.get('extra_param_to_segment_url')
-        if extra_param_to_segment_url:
-            extra_query = urllib.parse.parse_qs(extra_param_to_segment_url)
-        i = 0
-        media_sequence = 0
-        decrypt_info = {'METHOD': 'NONE'}
-        byte_range = {}
-        discontinuity_count = 0
-        frag_index = 0
-        ad_frag_next = False
-        for line in s.splitlines():
-            line = line.strip()
-            if line:
-                if not line.startswith('#'):
-                    if format_index and discontinuity_count != format_index:
-                        continue
-                    if ad_frag_next:
-                        continue
-                    frag_index += 1
-                    if frag_index <= ctx['fragment_index']:
-                        continue
-                    frag_url = (
-                        line
-                        if re.match(r'^https?://', line)
-                        else urllib.parse.urljoin(man_url, line))
-                    if extra_query:
-                        frag_url = update_url_query(frag_url, extra_query)
-
-                    fragments.append({
-                        'frag_index': frag_index,
-                        'url': frag_url,
-                        'decrypt_info': decrypt_info,
-                        'byte_range': byte_range,
-                        'media_sequence': media_sequence,
-                    })
-                    media_sequence += 1
-
-                elif line.startswith('#EXT-X-MAP'):
-                    if format_index and discontinuity_count != format_index:
-                        continue
+        if is_live:
+            fragments = self._live_fragments(playlist, info_dict)
+        else:
+            format_index = info_dict.get('format_index')
+            fragments, frag_index = [], 0
+            for segment in playlist.segments:
+                if format_index and segment.discontinuity != format_index:
+                    continue
+                if segment.is_init:
                     if frag_index > 0:
                         self.report_error(
                             'Initialization fragment found after media fragments, unable to download')
                         return False
-                    frag_index += 1
-                    map_info = parse_m3u8_attributes(line[11:])
-                    frag_url = (
-                        map_info.get('URI')
-                        if re.match(r'^https?://', map_info.get('URI'))
-                        else urllib.parse.urljoin(man_url, map_info.get('URI')))
-                    if extra_query:
-                        frag_url = update_url_query(frag_url, extra_query)
-
-                    if map_info.get('BYTERANGE'):
-                        splitted_byte_range = map_info.get('BYTERANGE').split('@')
-                        sub_range_start = int(splitted_byte_range[1]) if len(splitted_byte_range) == 2 else byte_range['end']
-                        byte_range = {
-                            'start': sub_range_start,
-                            'end': sub_range_start + int(splitted_byte_range[0]),
-                        }
-
-                    fragments.append({
-                        'frag_index': frag_index,
-                        'url': frag_url,
-                        'decrypt_info': decrypt_info,
-                        'byte_range': byte_range,
-                        'media_sequence': media_sequence
-                    })
-                    media_sequence += 1
-
-                elif line.startswith('#EXT-X-KEY'):
-                    decrypt_url = decrypt_info.get('URI')
-                    decrypt_info = parse_m3u8_attributes(line[11:])
-                    if decrypt_info['METHOD'] == 'AES-128':
-                        if 'IV' in decrypt_info:
-                            decrypt_info['IV'] = binascii.unhexlify(decrypt_info['IV'][2:].zfill(32))
-                        if not re.match(r'^https?://', decrypt_info['URI']):
-                            decrypt_info['URI'] = urllib.parse.urljoin(
-                                man_url, decrypt_info['URI'])
-                        if extra_query:
-                            decrypt_info['URI'] = update_url_query(decrypt_info['URI'], extra_query)
-                        if decrypt_url != decrypt_info['URI']:
-                            decrypt_info['KEY'] = None
-
-                elif line.startswith('#EXT-X-MEDIA-SEQUENCE'):
-                    media_sequence = int(line[22:])
-                elif line.startswith('#EXT-X-BYTERANGE'):
-                    splitted_byte_range = line[17:].split('@')
-                    sub_range_start = int(splitted_byte_range[1]) if len(splitted_byte_range) == 2 else byte_range['end']
-                    byte_range = {
-                        'start': sub_range_start,
-                        'end': sub_range_start + int(splitted_byte_range[0]),
-                    }
-                elif is_ad_fragment_start(line):
-                    ad_frag_next = True
-                elif is_ad_fragment_end(line):
-                    ad_frag_next = False
-                elif line.startswith('#EXT-X-DISCONTINUITY'):
-                    discontinuity_count += 1
-                i += 1
+                elif segment.is_ad:
+                    continue
+                frag_index += 1
+                if frag_index <= ctx['fragment_index']:
+                    continue
+                fragments.append(self._make_fragment(segment, frag_index))
 
         # We only download the first fragment during the test
         if self.params.get('test', False):
-            fragments = [fragments[0] if fragments else None]
+            fragments = [next(iter(fragments), None)]
 
         if real_downloader:
             info_dict['fragments'] = fragments
@@ -1,4 +1,6 @@
+import concurrent.futures
 import http.client
+import json
 import os
 import random
 import socket
@@ -30,6 +32,22 @@
 
 
 class HttpFD(FileDownloader):
+    """
+    Available options (in addition to those of FileDownloader):
+
+    http_connections:   Number of connections to use for downloading a file
+                        whose size is known, each fetching a byte range of it
+
+    When more than one connection is used, the byte ranges are written at their
+    offsets in the .part file and the download state is kept in a .ytdl file
+    (see FragmentFD), whose "downloader" dictionary contains:
+        segments:       List of [start, end, downloaded bytes] of each byte range
+        total_bytes:    Size of the file
+    """
+
+    # Smallest byte range that is worth a separate connection
+    _MIN_SEGMENT_SIZE = 1024 * 1024
+
     def real_download(self, filename, info_dict):
         url = info_dict['url']
         request_data = info_dict.get('request_data', None)
@@ -72,6 +90,20 @@ class DownloadContext(dict):
 
         ctx.is_resume = ctx.resume_len > 0
 
+        connections = self.params.get('http_connections') or 1
+        if (connections > 1 and not is_test and not chunk_size and req_start is None and req_end is None
+                and ctx.tmpfilename != '-'):
+            result = self._download_segmented(ctx, info_dict, url, request_data, headers, connections)
+            if result is not None:
+                return result
+        if ctx.resume_len and self._read_segments_state(ctx)[0] is not None:
+            # The .part file of a download over several connections is preallocated,
+            # so its size is not the number of bytes that were downloaded
+            self.report_unable_to_resume()
+            self.try_remove(encodeFilename(self.ytdl_filename(ctx.filename)))
+            ctx.resume_len = 0
+            ctx.is_resume = False
+
         count = 0
         retries = self.params.get('retries', 0)
 
@@ -385,3 +417,193 @@ def retry(e):
 
         self.report_error('giving up after %s retries' % retries)
         return False
+
+    def _read_segments_state(self, ctx):
+        try:
+            stream, _ = self.sanitize_open(self.ytdl_filename(ctx.filename), 'r')
+            with stream:
+                state = json.loads(stream.read())['downloader']
+            return [list(map(int, segment)) for segment in state['segments']], int(state['total_bytes'])
+        except Exception:
+            return None, None
+
+    def _write_segments_state(self, ctx, segments, total_bytes):
+        stream, _ = self.sanitize_open(self.ytdl_filename(ctx.filename), 'w')
+        with stream:
+            stream.write(json.dumps({'downloader': {'segments': segments, 'total_bytes': total_bytes}}))
+
+    def _download_segmented(self, ctx, info_dict, url, request_data, headers, connections):
+        """
+        Download the file over several connections, each fetching a byte range of it.
+        Returns None if this is not possible, so that the file is downloaded normally
+        """
+        segments = None
+        if ctx.resume_len:
+            segments, total_bytes = self._read_segments_state(ctx)
+            if segments is None:
+                return None  # Resume the partial file of a single connection download
+
+        try:
+            probe = self.ydl.urlopen(sanitized_Request(url, request_data, {**headers, 'Range': 'bytes=0-0'}))
+        except (urllib.error.URLError, *RESPONSE_READ_EXCEPTIONS):
+            return None
+        with probe:
+            range_start, range_end, content_len = parse_http_range(probe.headers.get('Content-Range'))
+            if (range_start, range_end) != (0, 0) or not content_len:
+                return None  # Byte ranges are not supported
+            probe.read()
+        last_modified = probe.headers.get('last-modified')
+
+        min_data_len = self.params.get('min_filesize')
+        max_data_len = self.params.get('max_filesize')
+        if min_data_len is not None and content_len < min_data_len:
+            self.to_screen(
+                f'\r[download] File is smaller than min-filesize ({content_len} bytes < {min_data_len} bytes). Aborting.')
+            return False
+        if max_data_len is not None and content_len > max_data_len:
+            self.to_screen(
+                f'\r[download] File is larger than max-filesize ({content_len} bytes > {max_data_len} bytes). Aborting.')
+            return False
+
+        if segments is not None and total_bytes != content_len:
+            self.report_unable_to_resume()
+            segments = None
+        if segments is None:
+            count = max(min(connections, content_len // self._MIN_SEGMENT_SIZE), 1)
+            bounds = [content_len * i // count for i in range(count + 1)]
+            segments = [[start, end - 1, 0] for start, end in zip(bounds, bounds[1:])]
+            open_mode = 'wb'
+        else:
+            self.report_resuming_byte(sum(downloaded for _, _, downloaded in segments))
+            open_mode = 'ab'
+
+        self._write_segments_state(ctx, segments, content_len)
+        try:
+            stream, ctx.tmpfilename = self.sanitize_open(ctx.tmpfilename, open_mode)
+            with stream:
+                stream.truncate(content_len)
+        except OSError as err:
+            self.report_error(f'unable to open for writing: {err}')
+            return False
+        ctx.filename = self.undo_temp_name(ctx.tmpfilename)
+        self.report_destination(ctx.filename)
+
+        retries = self.params.get('retries', 0)
+        interrupted = False
+        resume_len = sum(downloaded for _, _, downloaded in segments)
+        start = time.time()
+
+        def downloaded_bytes():
+            return sum(downloaded for _, _, downloaded in segments)
+
+        def download_segment(segment):
+            count, block_size = 0, ctx.block_size
+            with open(encodeFilename(ctx.tmpfilename), 'r+b', buffering=0) as stream:
+                while not interrupted:
+                    offset = segment[0] + segment[2]
+                    if offset > segment[1]:
+                        return True
+                    request = sanitized_Request(
+                        url, request_data, {**headers, 'Range': f'bytes={offset}-{segment[1]}'})
+                    try:
+                        with self.ydl.urlopen(request) as data:
+                            if parse_http_range(data.headers.get('Content-Range'))[0] != offset:
+                                self.to_screen(f'[download] Server did not return the requested range (bytes {offset}-)')
+                                return False
+                            stream.seek(offset)
+                            before = time.time()
+                            while not interrupted and offset <= segment[1]:
+                                data_block = data.read(min(block_size, segment[1] - offset + 1))
+                                if not data_block:
+                                    raise ContentTooShortError(offset, segment[1] + 1)
+                                stream.write(data_block)
+                                offset += len(data_block)
+                                segment[2] += len(data_block)
+                                count = 0
+
+                                now = time.time()
+                                self.slow_down(start, now, downloaded_bytes() - resume_len)
+                                if not self.params.get('noresizebuffer', False):
+                                    block_size = self.best_block_size(now - before, len(data_block))
+                                before = now
+                    except urllib.error.HTTPError as err:
+                        if err.code < 500 or err.code >= 600:
+                            raise
+                        error = err
+                    except urllib.error.URLError as err:
+                        if isinstance(err.reason, ssl.CertificateError):
+                            raise
+                        error = err
+                    except (ContentTooShortError, *RESPONSE_READ_EXCEPTIONS) as err:
+                        error = err
+                    else:
+                        continue
+                    count += 1
+                    if count > retries:
+                        self.to_screen(f'[download] Got server HTTP error: {error}')
+                        return False
+                    self.report_retry(error, count, retries)
+            return False
+
+        self.write_debug(f'Downloading {len(segments)} byte ranges concurrently')
+        success, last_written = False, time.time()
+        with concurrent.futures.ThreadPoolExecutor(len(segments)) as pool:
+            futures = [pool.submit(download_segment, segment) for segment in segments]
+            try:
+                pending = futures
+                while pending:
+                    done, pending = concurrent.futures.wait(pending, timeout=0.5)
+                    if not all(future.result() for future in done):
+                        break
+                    now = time.time()
+                    byte_counter = downloaded_bytes()
+                    speed = self.calc_speed(start, now, byte_counter - resume_len)
+                    self._hook_progress({
+                        'status': 'downloading',
+                        'downloaded_bytes': byte_counter,
+                        'total_bytes': content_len,
+                        'tmpfilename': ctx.tmpfilename,
+                        'filename': ctx.filename,
+                        'eta': self.calc_eta(start, now, content_len - resume_len, byte_counter - resume_len),
+                        'speed': speed,
+                        'elapsed': now - ctx.start_time,
+                        'ctx_id': info_dict.get('ctx_id'),
+                    }, info_dict)
+                    if now - last_written > 1:
+                        self._write_segments_state(ctx, segments, content_len)
+                        last_written = now
+
+                    if speed and speed < (self.params.get('throttledratelimit') or 0):
+                        # The speed must stay below the limit for 3 seconds
+                        if ctx.throttle_start is None:
+                            ctx.throttle_start = now
+                        elif now - ctx.throttle_start > 3:
+                            raise ThrottledDownload()
+                    elif speed:
+                        ctx.throttle_start = None
+                else:
+                    success = True
+            finally:
+                interrupted = True
+                pool.shutdown(wait=True)
+                if not success:
+                    self._write_segments_state(ctx, segments, content_len)
+
+        if not success:
+            self.report_error(f'giving up after {retries} retries')
+            return False
+
+        self.try_remove(encodeFilename(self.ytdl_filename(ctx.filename)))
+        self.try_rename(ctx.tmpfilename, ctx.filename)
+        if self.params.get('updatetime', True):
+            info_dict['filetime'] = self.try_utime(ctx.filename, last_modified)
+
+        self._hook_progress({
+            'downloaded_bytes': content_len,
+            'total_bytes': content_len,
+            'filename': ctx.filename,
+            'status': 'finished',
+            'elapsed': time.time() - ctx.start_time,
+            'ctx_id': info_dict.get('ctx_id'),
+        }, info_dict)
+        return True
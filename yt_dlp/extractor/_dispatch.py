@@ -0,0 +1,182 @@
+import collections
+import functools
+import itertools
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# Length of the substrings used as index keys. Shorter keys are shared by more
+# extractors; longer ones cannot be derived from short literals in _VALID_URL
+KEY_LENGTH = 4
+
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None)} - {None}
+_ZERO_WIDTH = {sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT}
+_ATOMIC_GROUP = getattr(sre_parse, 'ATOMIC_GROUP', None)
+
+_REQUIREMENTS_CACHE = {}
+
+
+def _requirements(parsed):
+    """
+    Return a list of what every match of the parsed pattern must contain.
+    Each item is either an ASCII literal string or a list of alternatives,
+    each of which is a list of requirements itself
+    """
+    reqs, literal = [], []
+    for op, av in parsed:
+        if op is sre_parse.LITERAL and av < 128:
+            literal.append(chr(av))
+            continue
+        elif op in _ZERO_WIDTH:
+            continue
+        if literal:
+            reqs.append(''.join(literal))
+            literal = []
+        if op is sre_parse.SUBPATTERN:
+            reqs.extend(_requirements(av[-1]))
+        elif op in _REPEATS and av[0] >= 1:
+            reqs.extend(_requirements(av[2]))
+        elif op is _ATOMIC_GROUP:
+            reqs.extend(_requirements(av))
+        elif op is sre_parse.BRANCH:
+            reqs.append([_requirements(alt) for alt in av[1]])
+    if literal:
+        reqs.append(''.join(literal))
+    return reqs
+
+
+def _grams(literal):
+    literal = literal.casefold()
+    return (literal[i:i + KEY_LENGTH] for i in range(len(literal) - KEY_LENGTH + 1))
+
+
+def _all_grams(reqs):
+    for req in reqs:
+        if isinstance(req, str):
+            yield from _grams(req)
+        else:
+            for alt in req:
+                yield from _all_grams(alt)
+
+
+def _key_sets(reqs, cost):
+    """Yield sets of keys such that every match must contain at least one key of each set"""
+    for req in reqs:
+        if isinstance(req, str):
+            yield from (frozenset((gram,)) for gram in _grams(req))
+            continue
+        alternatives = [_cheapest(_key_sets(alt, cost), cost) for alt in req]
+        if all(alternatives):
+            yield frozenset().union(*alternatives)
+
+
+def _cheapest(key_sets, cost):
+    return min(key_sets, key=lambda keys: (sum(map(cost, keys)), sorted(keys)), default=None)
+
+
+def _has_default_matcher(ie):
+    """Whether the URL matching of the extractor is decided by _VALID_URL alone"""
+    mro = ie.__mro__
+    return all(
+        next(c for c in mro if attr in c.__dict__) is mro[-2]
+        for attr in ('suitable', '_match_valid_url'))
+
+
+def url_requirements(ie):
+    """
+    Return the requirements (see _requirements) that any URL matched by the extractor
+    must satisfy. An empty list means that the extractor cannot be indexed
+    """
+    ie = ie if isinstance(ie, type) else type(ie)
+    reqs = _REQUIREMENTS_CACHE.get(ie)
+    if reqs is not None:
+        return reqs
+
+    reqs = []
+    if _has_default_matcher(ie):
+        valid_url = ie.__dict__.get('_VALID_URL')
+        # hasattr would make lazy extractors load the real class
+        if not valid_url and any('_make_valid_url' in c.__dict__ for c in ie.__mro__):
+            valid_url = ie._make_valid_url()
+        if isinstance(valid_url, str):
+            try:
+                reqs = _requirements(sre_parse.parse(valid_url))
+            except Exception:
+                pass
+    _REQUIREMENTS_CACHE[ie] = reqs
+    return reqs
+
+
+def _lazy_keys():
+    from . import extractors
+    if not extractors._LAZY_LOADER:
+        return {}
+    from . import lazy_extractors
+    return {getattr(lazy_extractors, name): key
+            for name, key in getattr(lazy_extractors, '_DISPATCH_KEYS', {}).items()}
+
+
+def select_keys(ies, precomputed=None):
+    """
+    Choose the index keys for each of the extractors in ies, preferring the rarest ones
+    @param precomputed  A dict of extractor -> keys that is used instead of parsing _VALID_URL.
+                        Defaults to the keys stored in lazy_extractors
+    @returns            A dict of extractor -> set of keys, at least one of which
+                        must be in any suitable URL (or None if it cannot be indexed)
+    """
+    if precomputed is None:
+        return _select_default_keys(frozenset(ies))
+    reqs = {ie: url_requirements(ie) for ie in ies if ie not in precomputed}
+    counts = collections.Counter(itertools.chain(
+        *(set(_all_grams(r)) for r in reqs.values()),
+        *(keys for keys in precomputed.values() if keys)))
+    return {
+        **{ie: precomputed[ie] and frozenset(precomputed[ie]) for ie in ies if ie in precomputed},
+        **{ie: _cheapest(_key_sets(r, counts.__getitem__), counts.__getitem__) for ie, r in reqs.items()},
+    }
+
+
+@functools.lru_cache(maxsize=8)
+def _select_default_keys(ies):
+    return select_keys(ies, _lazy_keys())
+
+
+class ExtractorIndex:
+    """
+    Index of extractors by substrings their _VALID_URL requires
+
+    Only the extractors one of whose keys is found in the URL (and those that could not
+    be indexed) are candidates, so that only a handful of regexes are tried per URL.
+    The candidates are yielded in the original order of the extractors,
+    so the first suitable one is the same as with a linear scan
+    """
+
+    def __init__(self, ies, precomputed=None):
+        """
+        @param ies          A dict of ie_key -> extractor (class or instance).
+                            The values are looked up lazily, so they may be replaced
+                            by instances of the same extractor afterwards
+        @param precomputed  See select_keys
+        """
+        self._ies = ies
+        self._ie_keys = list(ies)
+        self._unindexed, self._index = [], collections.defaultdict(list)
+        classes = [ie if isinstance(ie, type) else type(ie) for ie in ies.values()]
+        keys = select_keys(classes, precomputed)
+        for idx, ie in enumerate(classes):
+            if not keys[ie]:
+                self._unindexed.append(idx)
+            for key in keys[ie] or ():
+                self._index[key].append(idx)
+
+    def candidates(self, url):
+        """Yield (ie_key, ie) for the extractors that may be suitable for the URL"""
+        url_lower = url.casefold()
+        found = set(self._unindexed)
+        for i in range(len(url_lower) - KEY_LENGTH + 1):
+            found.update(self._index.get(url_lower[i:i + KEY_LENGTH], ()))
+        for idx in sorted(found):
+            ie_key = self._ie_keys[idx]
+            yield ie_key, self._ies[ie_key]
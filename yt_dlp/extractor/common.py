@@ -1,5 +1,6 @@
 import base64
 import collections
+import contextlib
 import getpass
 import hashlib
 import http.client
@@ -12,6 +13,7 @@
 import os
 import random
 import sys
+import threading
 import time
 import urllib.parse
 import urllib.request
@@ -21,6 +23,7 @@
 from ..compat import compat_etree_fromstring, compat_expanduser, compat_os_name
 from ..downloader import FileDownloader
 from ..downloader.f4m import get_base_url, remove_encrypted_media
+from ..m3u8 import HlsPlaylist
 from ..utils import (
     JSON_LD_RE,
     NO_DEFAULT,
@@ -29,6 +32,7 @@
     GeoUtils,
     LenientJSONDecoder,
     RegexNotFoundError,
+    SegmentTemplateFragments,
     UnsupportedError,
     age_restricted,
     base_url,
@@ -55,7 +59,6 @@
     parse_codecs,
     parse_duration,
     parse_iso8601,
-    parse_m3u8_attributes,
     parse_resolution,
     sanitize_filename,
     sanitized_Request,
@@ -173,6 +176,9 @@ class InfoExtractor:
                                             fragment_base_url
                                  * "duration" (optional, int or float)
                                  * "filesize" (optional, int)
+                                 Long DASH manifests can instead give a
+                                 SegmentTemplateFragments, which builds the
+                                 fragments only when they are accessed
                     * is_from_start  Is a live format that can be downloaded
                                 from the start. Boolean
                     * preference Order number of this format. If this field is
@@ -461,7 +467,6 @@ class InfoExtractor:
 
     _ready = False
     _downloader = None
-    _x_forwarded_for_ip = None
     _GEO_BYPASS = True
     _GEO_COUNTRIES = None
     _GEO_IP_BLOCKS = None
@@ -486,10 +491,28 @@ def __init__(self, downloader=None):
         If a downloader is not passed during initialization,
         it must be set using "set_downloader()" before "extract()" is called"""
         self._ready = False
-        self._x_forwarded_for_ip = None
-        self._printed_messages = set()
+        self._ready_lock = threading.RLock()
+        # Videos processed in parallel use the same instance, so the state of an extraction is per thread
+        self._local = threading.local()
+        self._format_sorts = {}
         self.set_downloader(downloader)
 
+    @property
+    def _x_forwarded_for_ip(self):
+        return getattr(self._local, 'x_forwarded_for_ip', None)
+
+    @_x_forwarded_for_ip.setter
+    def _x_forwarded_for_ip(self, ip):
+        self._local.x_forwarded_for_ip = ip
+
+    @property
+    def _printed_messages(self):
+        return vars(self._local).setdefault('printed_messages', set())
+
+    @_printed_messages.setter
+    def _printed_messages(self, messages):
+        self._local.printed_messages = messages
+
     @classmethod
     def _match_valid_url(cls, url):
         # This does not use has/getattr intentionally - we want to know whether
@@ -535,7 +558,11 @@ def initialize(self):
             'countries': self._GEO_COUNTRIES,
             'ip_blocks': self._GEO_IP_BLOCKS,
         })
-        if not self._ready:
+        if self._ready:
+            return
+        with self._ready_lock:
+            if self._ready:
+                return
             self._initialize_pre_login()
             if self.supports_login():
                 username, password = self._get_login_info()
@@ -746,8 +773,10 @@ def _request_webpage(self, url_or_request, video_id, note=None, errnote=None, fa
         if not self._downloader._first_webpage_request:
             sleep_interval = self.get_param('sleep_interval_requests') or 0
             if sleep_interval > 0:
-                self.to_screen('Sleeping %s seconds ...' % sleep_interval)
-                time.sleep(sleep_interval)
+                # Requests of videos processed in parallel are made one sleep apart
+                with getattr(self._downloader, '_sleep_lock', None) or contextlib.nullcontext():
+                    self.to_screen('Sleeping %s seconds ...' % sleep_interval)
+                    time.sleep(sleep_interval)
         else:
             self._downloader._first_webpage_request = False
 
@@ -768,6 +797,12 @@ def _request_webpage(self, url_or_request, video_id, note=None, errnote=None, fa
             if 'X-Forwarded-For' not in headers:
                 headers['X-Forwarded-For'] = self._x_forwarded_for_ip
 
+        # The header is removed by HTTPCacheHandler, see --http-cache
+        if self.ie_key().lower() in map(str.lower, self.get_param('http_cache') or ()):
+            headers = {**headers, 'Ytdl-http-cache': '1'}
+        # Concurrent extractions share the responses to identical requests (see RequestCoalescer)
+        headers = {**headers, 'Ytdl-coalesce': '1'}
+
         try:
             return self._downloader.urlopen(self._create_request(url_or_request, data, headers, query))
         except network_exceptions as err:
@@ -1717,7 +1752,10 @@ class FormatSort:
         def __init__(self, ie, field_preference):
             self._order = []
             self.ydl = ie._downloader
+            # The settings are modified according to the sort order, so each instance needs its own
+            self.settings = {field: dict(setting) for field, setting in self.settings.items()}
             self.evaluate_params(self.ydl.params, field_preference)
+            self._field_keys = tuple(map(self._build_field_key, self._order))
             if ie.get_param('verbose'):
                 self.print_verbose_info(self.ydl.write_debug)
 
@@ -1845,46 +1883,60 @@ def print_verbose_info(self, write_debug):
                 if self._get_field_setting(field, 'limit_text') is not None else '')
                 for field in self._order if self._get_field_setting(field, 'visible')]))
 
-        def _calculate_field_preference_from_value(self, format, field, type, value):
-            reverse = self._get_field_setting(field, 'reverse')
-            closest = self._get_field_setting(field, 'closest')
-            limit = self._get_field_setting(field, 'limit')
+        def _build_field_key(self, field):
+            """Return a function that calculates the preference of a format for the field"""
+            type = self._get_field_setting(field, 'type')
+            reverse, closest, limit, default = (
+                self._get_field_setting(field, key) for key in ('reverse', 'closest', 'limit', 'default'))
+            is_string = self._get_field_setting(field, 'convert') == 'string'
+
+            if type == 'multiple':
+                type = 'field'  # Only 'field' is allowed in multiple for now
+                function = self._get_field_setting(field, 'function')
+                keys = tuple(self._get_field_setting(f, 'field') for f in self._get_field_setting(field, 'field'))
+                get_value = lambda format: function(format.get(key) for key in keys)
+            else:
+                key = self._get_field_setting(field, 'field')
+                get_value = lambda format: format.get(key)
 
             if type == 'extractor':
                 maximum = self._get_field_setting(field, 'max')
-                if value is None or (maximum is not None and value >= maximum):
-                    value = -1
+
+                def convert(value):
+                    return -1 if value is None or (maximum is not None and value >= maximum) else value
             elif type == 'boolean':
                 in_list = self._get_field_setting(field, 'in_list')
                 not_in_list = self._get_field_setting(field, 'not_in_list')
-                value = 0 if ((in_list is None or value in in_list) and (not_in_list is None or value not in not_in_list)) else -1
-            elif type == 'ordered':
-                value = self._resolve_field_value(field, value, True)
-
-            # try to convert to number
-            val_num = float_or_none(value, default=self._get_field_setting(field, 'default'))
-            is_num = self._get_field_setting(field, 'convert') != 'string' and val_num is not None
-            if is_num:
-                value = val_num
-
-            return ((-10, 0) if value is None
-                    else (1, value, 0) if not is_num  # if a field has mixed strings and numbers, strings are sorted higher
-                    else (0, -abs(value - limit), value - limit if reverse else limit - value) if closest
-                    else (0, value, 0) if not reverse and (limit is None or value <= limit)
-                    else (0, -value, 0) if limit is None or (reverse and value == limit) or value > limit
-                    else (-1, value, 0))
-
-        def _calculate_field_preference(self, format, field):
-            type = self._get_field_setting(field, 'type')  # extractor, boolean, ordered, field, multiple
-            get_value = lambda f: format.get(self._get_field_setting(f, 'field'))
-            if type == 'multiple':
-                type = 'field'  # Only 'field' is allowed in multiple for now
-                actual_fields = self._get_field_setting(field, 'field')
 
-                value = self._get_field_setting(field, 'function')(get_value(f) for f in actual_fields)
+                def convert(value):
+                    return 0 if ((in_list is None or value in in_list)
+                                 and (not_in_list is None or value not in not_in_list)) else -1
+            elif type == 'ordered':
+                # The regexes are matched only once for each value
+                convert = functools.lru_cache(maxsize=None)(
+                    lambda value: self._resolve_field_value(field, value, True))
             else:
-                value = get_value(field)
-            return self._calculate_field_preference_from_value(format, field, type, value)
+                convert = None
+
+            def field_key(format):
+                value = get_value(format)
+                if convert:
+                    value = convert(value)
+
+                # try to convert to number
+                val_num = float_or_none(value, default=default)
+                is_num = not is_string and val_num is not None
+                if is_num:
+                    value = val_num
+
+                return ((-10, 0) if value is None
+                        else (1, value, 0) if not is_num  # if a field has mixed strings and numbers, strings are sorted higher
+                        else (0, -abs(value - limit), value - limit if reverse else limit - value) if closest
+                        else (0, value, 0) if not reverse and (limit is None or value <= limit)
+                        else (0, -value, 0) if limit is None or (reverse and value == limit) or value > limit
+                        else (-1, value, 0))
+
+            return field_key
 
         def calculate_preference(self, format):
             # Determine missing protocol
@@ -1913,12 +1965,21 @@ def calculate_preference(self, format):
                 if format.get('acodec') != 'none' and format.get('abr') is None:
                     format['abr'] = format.get('tbr') - format.get('vbr', 0)
 
-            return tuple(self._calculate_field_preference(format, field) for field in self._order)
+            return tuple(field_key(format) for field_key in self._field_keys)
 
     def _sort_formats(self, formats, field_preference=[]):
         if not formats:
             return
-        formats.sort(key=self.FormatSort(self, field_preference).calculate_preference)
+        # The sort order is parsed only once for all the videos
+        cache_key = (
+            tuple(field_preference), tuple(self.get_param('format_sort') or ()),
+            self.get_param('format_sort_force', False), self.get_param('prefer_free_formats', False))
+        format_sort = self._format_sorts.get(cache_key)
+        if format_sort is None:
+            format_sort = self._format_sorts[cache_key] = self.FormatSort(self, field_preference)
+        elif self.get_param('verbose'):
+            format_sort.print_verbose_info(self._downloader.write_debug)
+        formats.sort(key=format_sort.calculate_preference)
 
     def _check_formats(self, formats, video_id):
         if formats:
@@ -2153,17 +2214,12 @@ def _parse_m3u8_formats_and_subtitles(
             video_id=None):
         formats, subtitles = [], {}
 
-        has_drm = re.search('|'.join([
-            r'#EXT-X-FAXS-CM:',  # Adobe Flash Access
-            r'#EXT-X-(?:SESSION-)?KEY:.*?URI="skd://',  # Apple FairPlay
-        ]), m3u8_doc)
-
-        def format_url(url):
-            return url if re.match(r'^https?://', url) else urllib.parse.urljoin(m3u8_url, url)
+        playlist = HlsPlaylist(m3u8_url)
+        playlist.feed(m3u8_doc)
 
         if self.get_param('hls_split_discontinuity', False):
-            def _extract_m3u8_playlist_indices(manifest_url=None, m3u8_doc=None):
-                if not m3u8_doc:
+            def _extract_m3u8_playlist_indices(manifest_url=None, playlist=None):
+                if not playlist:
                     if not manifest_url:
                         return []
                     m3u8_doc = self._download_webpage(
@@ -2171,7 +2227,9 @@ def _extract_m3u8_playlist_indices(manifest_url=None, m3u8_doc=None):
                         note=False, errnote='Failed to download m3u8 playlist information')
                     if m3u8_doc is False:
                         return []
-                return range(1 + sum(line.startswith('#EXT-X-DISCONTINUITY') for line in m3u8_doc.splitlines()))
+                    playlist = HlsPlaylist(manifest_url)
+                    playlist.feed(m3u8_doc)
+                return range(1 + playlist.discontinuities)
 
         else:
             def _extract_m3u8_playlist_indices(*args, **kwargs):
@@ -2193,7 +2251,7 @@ def _extract_m3u8_playlist_indices(*args, **kwargs):
         # media playlist and MUST NOT appear in master playlist thus we can
         # clearly detect media playlist with this criterion.
 
-        if '#EXT-X-TARGETDURATION' in m3u8_doc:  # media playlist, return as is
+        if not playlist.is_master:  # media playlist, return as is
             formats = [{
                 'format_id': join_nonempty(m3u8_id, idx),
                 'format_index': idx,
@@ -2202,16 +2260,15 @@ def _extract_m3u8_playlist_indices(*args, **kwargs):
                 'protocol': entry_protocol,
                 'preference': preference,
                 'quality': quality,
-                'has_drm': has_drm,
-            } for idx in _extract_m3u8_playlist_indices(m3u8_doc=m3u8_doc)]
+                'has_drm': playlist.has_drm,
+            } for idx in _extract_m3u8_playlist_indices(playlist=playlist)]
 
             return formats, subtitles
 
         groups = {}
         last_stream_inf = {}
 
-        def extract_media(x_media_line):
-            media = parse_m3u8_attributes(x_media_line)
+        def extract_media(media):
             # As per [1, 4.3.4.1] TYPE, GROUP-ID and NAME are REQUIRED
             media_type, group_id, name = media.get('TYPE'), media.get('GROUP-ID'), media.get('NAME')
             if not (media_type and group_id and name):
@@ -2225,7 +2282,7 @@ def extract_media(x_media_line):
                 # e.g. NebulaIE; see https://github.com/yt-dlp/yt-dlp/issues/339
                 if not media.get('URI'):
                     return
-                url = format_url(media['URI'])
+                url = playlist.resolve_url(media['URI'])
                 sub_info = {
                     'url': url,
                     'ext': determine_ext(url),
@@ -2242,7 +2299,7 @@ def extract_media(x_media_line):
                 return
             media_url = media.get('URI')
             if media_url:
-                manifest_url = format_url(media_url)
+                manifest_url = playlist.resolve_url(media_url)
                 formats.extend({
                     'format_id': join_nonempty(m3u8_id, group_id, name, idx),
                     'format_note': name,
@@ -2279,92 +2336,83 @@ def build_stream_name():
         # parse EXT-X-MEDIA tags before EXT-X-STREAM-INF in order to have the
         # chance to detect video only formats when EXT-X-STREAM-INF tags
         # precede EXT-X-MEDIA tags in HLS manifest such as [3].
-        for line in m3u8_doc.splitlines():
-            if line.startswith('#EXT-X-MEDIA:'):
-                extract_media(line)
-
-        for line in m3u8_doc.splitlines():
-            if line.startswith('#EXT-X-STREAM-INF:'):
-                last_stream_inf = parse_m3u8_attributes(line)
-            elif line.startswith('#') or not line.strip():
-                continue
-            else:
-                tbr = float_or_none(
-                    last_stream_inf.get('AVERAGE-BANDWIDTH')
-                    or last_stream_inf.get('BANDWIDTH'), scale=1000)
-                manifest_url = format_url(line.strip())
-
-                for idx in _extract_m3u8_playlist_indices(manifest_url):
-                    format_id = [m3u8_id, None, idx]
-                    # Bandwidth of live streams may differ over time thus making
-                    # format_id unpredictable. So it's better to keep provided
-                    # format_id intact.
-                    if not live:
-                        stream_name = build_stream_name()
-                        format_id[1] = stream_name or '%d' % (tbr or len(formats))
-                    f = {
-                        'format_id': join_nonempty(*format_id),
-                        'format_index': idx,
-                        'url': manifest_url,
-                        'manifest_url': m3u8_url,
-                        'tbr': tbr,
-                        'ext': ext,
-                        'fps': float_or_none(last_stream_inf.get('FRAME-RATE')),
-                        'protocol': entry_protocol,
-                        'preference': preference,
-                        'quality': quality,
-                    }
-                    resolution = last_stream_inf.get('RESOLUTION')
-                    if resolution:
-                        mobj = re.search(r'(?P<width>\d+)[xX](?P<height>\d+)', resolution)
-                        if mobj:
-                            f['width'] = int(mobj.group('width'))
-                            f['height'] = int(mobj.group('height'))
-                    # Unified Streaming Platform
-                    mobj = re.search(
-                        r'audio.*?(?:%3D|=)(\d+)(?:-video.*?(?:%3D|=)(\d+))?', f['url'])
+        for media in playlist.media:
+            extract_media(media)
+
+        for last_stream_inf, manifest_url in playlist.streams:
+            tbr = float_or_none(
+                last_stream_inf.get('AVERAGE-BANDWIDTH')
+                or last_stream_inf.get('BANDWIDTH'), scale=1000)
+
+            for idx in _extract_m3u8_playlist_indices(manifest_url):
+                format_id = [m3u8_id, None, idx]
+                # Bandwidth of live streams may differ over time thus making
+                # format_id unpredictable. So it's better to keep provided
+                # format_id intact.
+                if not live:
+                    stream_name = build_stream_name()
+                    format_id[1] = stream_name or '%d' % (tbr or len(formats))
+                f = {
+                    'format_id': join_nonempty(*format_id),
+                    'format_index': idx,
+                    'url': manifest_url,
+                    'manifest_url': m3u8_url,
+                    'tbr': tbr,
+                    'ext': ext,
+                    'fps': float_or_none(last_stream_inf.get('FRAME-RATE')),
+                    'protocol': entry_protocol,
+                    'preference': preference,
+                    'quality': quality,
+                }
+                resolution = last_stream_inf.get('RESOLUTION')
+                if resolution:
+                    mobj = re.search(r'(?P<width>\d+)[xX](?P<height>\d+)', resolution)
                     if mobj:
-                        abr, vbr = mobj.groups()
-                        abr, vbr = float_or_none(abr, 1000), float_or_none(vbr, 1000)
-                        f.update({
-                            'vbr': vbr,
-                            'abr': abr,
-                        })
-                    codecs = parse_codecs(last_stream_inf.get('CODECS'))
-                    f.update(codecs)
-                    audio_group_id = last_stream_inf.get('AUDIO')
-                    # As per [1, 4.3.4.1.1] any EXT-X-STREAM-INF tag which
-                    # references a rendition group MUST have a CODECS attribute.
-                    # However, this is not always respected, for example, [2]
-                    # contains EXT-X-STREAM-INF tag which references AUDIO
-                    # rendition group but does not have CODECS and despite
-                    # referencing an audio group it represents a complete
-                    # (with audio and video) format. So, for such cases we will
-                    # ignore references to rendition groups and treat them
-                    # as complete formats.
-                    if audio_group_id and codecs and f.get('vcodec') != 'none':
-                        audio_group = groups.get(audio_group_id)
-                        if audio_group and audio_group[0].get('URI'):
-                            # TODO: update acodec for audio only formats with
-                            # the same GROUP-ID
-                            f['acodec'] = 'none'
-                    if not f.get('ext'):
-                        f['ext'] = 'm4a' if f.get('vcodec') == 'none' else 'mp4'
-                    formats.append(f)
-
-                    # for DailyMotion
-                    progressive_uri = last_stream_inf.get('PROGRESSIVE-URI')
-                    if progressive_uri:
-                        http_f = f.copy()
-                        del http_f['manifest_url']
-                        http_f.update({
-                            'format_id': f['format_id'].replace('hls-', 'http-'),
-                            'protocol': 'http',
-                            'url': progressive_uri,
-                        })
-                        formats.append(http_f)
-
-                last_stream_inf = {}
+                        f['width'] = int(mobj.group('width'))
+                        f['height'] = int(mobj.group('height'))
+                # Unified Streaming Platform
+                mobj = re.search(
+                    r'audio.*?(?:%3D|=)(\d+)(?:-video.*?(?:%3D|=)(\d+))?', f['url'])
+                if mobj:
+                    abr, vbr = mobj.groups()
+                    abr, vbr = float_or_none(abr, 1000), float_or_none(vbr, 1000)
+                    f.update({
+                        'vbr': vbr,
+                        'abr': abr,
+                    })
+                codecs = parse_codecs(last_stream_inf.get('CODECS'))
+                f.update(codecs)
+                audio_group_id = last_stream_inf.get('AUDIO')
+                # As per [1, 4.3.4.1.1] any EXT-X-STREAM-INF tag which
+                # references a rendition group MUST have a CODECS attribute.
+                # However, this is not always respected, for example, [2]
+                # contains EXT-X-STREAM-INF tag which references AUDIO
+                # rendition group but does not have CODECS and despite
+                # referencing an audio group it represents a complete
+                # (with audio and video) format. So, for such cases we will
+                # ignore references to rendition groups and treat them
+                # as complete formats.
+                if audio_group_id and codecs and f.get('vcodec') != 'none':
+                    audio_group = groups.get(audio_group_id)
+                    if audio_group and audio_group[0].get('URI'):
+                        # TODO: update acodec for audio only formats with
+                        # the same GROUP-ID
+                        f['acodec'] = 'none'
+                if not f.get('ext'):
+                    f['ext'] = 'm4a' if f.get('vcodec') == 'none' else 'mp4'
+                formats.append(f)
+
+                # for DailyMotion
+                progressive_uri = last_stream_inf.get('PROGRESSIVE-URI')
+                if progressive_uri:
+                    http_f = f.copy()
+                    del http_f['manifest_url']
+                    http_f.update({
+                        'format_id': f['format_id'].replace('hls-', 'http-'),
+                        'protocol': 'http',
+                        'url': progressive_uri,
+                    })
+                    formats.append(http_f)
         return formats, subtitles
 
     def _extract_m3u8_vod_duration(
@@ -2379,12 +2427,12 @@ def _extract_m3u8_vod_duration(
         return self._parse_m3u8_vod_duration(m3u8_vod or '', video_id)
 
     def _parse_m3u8_vod_duration(self, m3u8_vod, video_id):
-        if '#EXT-X-PLAYLIST-TYPE:VOD' not in m3u8_vod:
+        playlist = HlsPlaylist()
+        playlist.feed(m3u8_vod)
+        if playlist.playlist_type != 'VOD':
             return None
 
-        return int(sum(
-            float(line[len('#EXTINF:'):].split(',')[0])
-            for line in m3u8_vod.splitlines() if line.startswith('#EXTINF:'))) or None
+        return int(playlist.duration) or None
 
     @staticmethod
     def _xpath_ns(path, namespace=None):
@@ -2779,10 +2827,14 @@ def extract_Initialization(source):
             return ms_info
 
         mpd_duration = parse_duration(mpd_doc.get('mediaPresentationDuration'))
+        # The segments of a live manifest without a SegmentTimeline are available from its start time [1, 5.3.9.5.3]
+        availability_start_time = mpd_doc.get('type') == 'dynamic' and parse_iso8601(mpd_doc.get('availabilityStartTime'))
+        time_shift_buffer_depth = parse_duration(mpd_doc.get('timeShiftBufferDepth'))
         formats, subtitles = [], {}
         stream_numbers = collections.defaultdict(int)
         for period in mpd_doc.findall(_add_ns('Period')):
             period_duration = parse_duration(period.get('duration')) or mpd_duration
+            period_start = parse_duration(period.get('start')) or 0
             period_ms_info = extract_multisegment_info(period, {
                 'start_number': 1,
                 'timescale': 1,
@@ -2929,47 +2981,31 @@ def location_key(location):
                             segment_duration = None
                             if 'total_number' not in representation_ms_info and 'segment_duration' in representation_ms_info:
                                 segment_duration = float_or_none(representation_ms_info['segment_duration'], representation_ms_info['timescale'])
-                                representation_ms_info['total_number'] = int(math.ceil(
-                                    float_or_none(period_duration, segment_duration, default=0)))
-                            representation_ms_info['fragments'] = [{
-                                media_location_key: media_template % {
-                                    'Number': segment_number,
-                                    'Bandwidth': bandwidth,
-                                },
-                                'duration': segment_duration,
-                            } for segment_number in range(
-                                representation_ms_info['start_number'],
-                                representation_ms_info['total_number'] + representation_ms_info['start_number'])]
+                                if period_duration or not availability_start_time:
+                                    representation_ms_info['total_number'] = int(math.ceil(
+                                        float_or_none(period_duration, segment_duration, default=0)))
+                                else:
+                                    # Only the segments that have been completely produced, and are
+                                    # still in the time shift buffer, can be downloaded
+                                    available = max(int(
+                                        (time.time() - availability_start_time - period_start) // segment_duration), 0)
+                                    first = max(available - math.ceil(
+                                        time_shift_buffer_depth / segment_duration), 0) if time_shift_buffer_depth else 0
+                                    representation_ms_info['start_number'] += first
+                                    representation_ms_info['total_number'] = available - first
+                            representation_ms_info['fragments'] = SegmentTemplateFragments(
+                                media_template, media_location_key,
+                                start_number=representation_ms_info['start_number'], bandwidth=bandwidth,
+                                count=representation_ms_info['total_number'], segment_duration=segment_duration)
                         else:
                             # $Number*$ or $Time$ in media template with S list available
                             # Example $Number*$: http://www.svtplay.se/klipp/9023742/stopptid-om-bjorn-borg
                             # Example $Time$: https://play.arkena.com/embed/avp/v2/player/media/b41dda37-d8e7-4d3f-b1b5-9a9db578bdfe/1/129411
-                            representation_ms_info['fragments'] = []
-                            segment_time = 0
-                            segment_d = None
-                            segment_number = representation_ms_info['start_number']
-
-                            def add_segment_url():
-                                segment_url = media_template % {
-                                    'Time': segment_time,
-                                    'Bandwidth': bandwidth,
-                                    'Number': segment_number,
-                                }
-                                representation_ms_info['fragments'].append({
-                                    media_location_key: segment_url,
-                                    'duration': float_or_none(segment_d, representation_ms_info['timescale']),
-                                })
-
-                            for num, s in enumerate(representation_ms_info['s']):
-                                segment_time = s.get('t') or segment_time
-                                segment_d = s['d']
-                                add_segment_url()
-                                segment_number += 1
-                                for r in range(s.get('r', 0)):
-                                    segment_time += segment_d
-                                    add_segment_url()
-                                    segment_number += 1
-                                segment_time += segment_d
+                            representation_ms_info['fragments'] = SegmentTemplateFragments(
+                                media_template, media_location_key,
+                                start_number=representation_ms_info['start_number'], bandwidth=bandwidth,
+                                timescale=representation_ms_info['timescale'],
+                                timeline=[(s['t'], s['d'], s['r']) for s in representation_ms_info['s']])
                     elif 'segment_urls' in representation_ms_info and 's' in representation_ms_info:
                         # No media template
                         # Example: https://www.youtube.com/watch?v=iXZV5uAYMJI
@@ -3012,16 +3048,20 @@ def add_segment_url():
                             # NB: mpd_url may be empty when MPD manifest is parsed from a string
                             'url': mpd_url or base_url,
                             'fragment_base_url': base_url,
-                            'fragments': [],
+                            'fragments': representation_ms_info['fragments'],
                             'protocol': 'http_dash_segments' if mime_type != 'image/jpeg' else 'mhtml',
                         })
                         if 'initialization_url' in representation_ms_info:
                             initialization_url = representation_ms_info['initialization_url']
                             if not f.get('url'):
                                 f['url'] = initialization_url
-                            f['fragments'].append({location_key(initialization_url): initialization_url})
-                        f['fragments'].extend(representation_ms_info['fragments'])
-                        if not period_duration:
+                            initialization = {location_key(initialization_url): initialization_url}
+                            if isinstance(f['fragments'], SegmentTemplateFragments):
+                                f['fragments'] = SegmentTemplateFragments.from_dict({
+                                    **f['fragments'].to_dict(), 'initialization': initialization})
+                            else:
+                                f['fragments'] = [initialization, *f['fragments']]
+                        if not period_duration and not availability_start_time:
                             period_duration = try_get(
                                 representation_ms_info,
                                 lambda r: sum(frag['duration'] for frag in r['fragments']), float)
@@ -0,0 +1,191 @@
+"""
+A streaming parser for HLS playlists <https://tools.ietf.org/html/rfc8216>.
+
+The playlist is read line by line into a compact model that is shared by the
+extractors, which need the variant streams and renditions of master playlists,
+and by the native HLS downloader, which needs the segments of media playlists.
+A live playlist can be fed again every time it is refreshed; only the segments
+that were not seen before are then built.
+"""
+
+import binascii
+import re
+import urllib.parse
+
+from .utils import float_or_none, parse_m3u8_attributes, update_url_query
+
+
+class HlsSegment:
+    """A media segment, or the initialization section of the following segments if is_init is set"""
+
+    __slots__ = ('url', 'duration', 'title', 'media_sequence', 'discontinuity',
+                 'byte_range', 'decrypt_info', 'is_ad', 'is_init')
+
+    def __init__(self, url, *, duration=None, title=None, media_sequence=0, discontinuity=0,
+                 byte_range=None, decrypt_info=None, is_ad=False, is_init=False):
+        self.url, self.duration, self.title = url, duration, title
+        self.media_sequence, self.discontinuity = media_sequence, discontinuity
+        # (start, end) with the end being exclusive
+        self.byte_range = byte_range
+        # The attributes of the EXT-X-KEY tag, shared between the segments it applies to
+        self.decrypt_info = decrypt_info
+        self.is_ad, self.is_init = is_ad, is_init
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.media_sequence}{" (init)" if self.is_init else ""}: {self.url}>'
+
+
+class HlsPlaylist:
+    """
+    Model of a master or media playlist
+
+    @param base_url  URL the relative URIs in the playlist are resolved against
+    @param query     Query (as a dict of lists) to add to the URLs of the segments and keys
+    """
+
+    _DRM_RE = re.compile(r'#EXT-X-FAXS-CM:|#EXT-X-(?:SESSION-)?KEY:.*?URI="skd://')
+    # Relative paths that urljoin would only append to the directory of the playlist
+    _SIMPLE_PATH_RE = re.compile(r'(?!.*(?://|/\.))[^/.?#:][^:]*\Z')
+
+    def __init__(self, base_url=None, *, query=None):
+        self.base_url, self._query = base_url, query
+        self._base_dir = base_url and urllib.parse.urljoin(base_url, '.')
+        if not (self._base_dir or '').endswith('/'):
+            self._base_dir = None
+        self.segments = []
+        # (attributes of the EXT-X-STREAM-INF tag, URL) of the variant streams
+        self.streams = []
+        # Attributes of the EXT-X-MEDIA tags
+        self.media = []
+        self.target_duration = self.playlist_type = None
+        self.media_sequence = self.discontinuities = 0
+        self.endlist = self.has_drm = False
+        self._last_sequence = self._last_init = None
+        # The same key applies to many segments, and to all the refreshes of a live playlist
+        self._decrypt_infos = {}
+
+    @property
+    def is_master(self):
+        # As per [1, 4.3.3.1] EXT-X-TARGETDURATION is REQUIRED for every media playlist and MUST NOT
+        # appear in a master playlist. 1. https://tools.ietf.org/html/draft-pantos-http-live-streaming-21
+        return self.target_duration is None
+
+    @property
+    def duration(self):
+        return sum(segment.duration or 0 for segment in self.segments if not segment.is_init)
+
+    def resolve_url(self, url):
+        if re.match(r'^https?://', url):
+            pass
+        elif self._base_dir and self._SIMPLE_PATH_RE.match(url):
+            url = self._base_dir + url
+        else:
+            url = urllib.parse.urljoin(self.base_url, url)
+        return update_url_query(url, self._query) if self._query else url
+
+    @staticmethod
+    def _is_ad_start(line):
+        return (line.startswith('#ANVATO-SEGMENT-INFO') and 'type=ad' in line
+                or line.startswith('#UPLYNK-SEGMENT') and line.endswith(',ad'))
+
+    @staticmethod
+    def _is_ad_end(line):
+        return (line.startswith('#ANVATO-SEGMENT-INFO') and 'type=master' in line
+                or line.startswith('#UPLYNK-SEGMENT') and line.endswith(',segment'))
+
+    def _parse_key(self, attributes):
+        decrypt_info = parse_m3u8_attributes(attributes)
+        if decrypt_info.get('METHOD') == 'AES-128':
+            if 'IV' in decrypt_info:
+                decrypt_info['IV'] = binascii.unhexlify(decrypt_info['IV'][2:].zfill(32))
+            decrypt_info['URI'] = self.resolve_url(decrypt_info['URI'])
+        return decrypt_info
+
+    def feed(self, doc):
+        """
+        Parse the playlist, or a refresh of it
+        @returns    The segments that were not in the playlist fed before
+        """
+        new_segments, self.streams, self.media = [], [], []
+        media_sequence = index = 0
+        discontinuity, is_ad, has_extinf, stream_inf = 0, False, False, None
+        init, init_pending, after_discontinuity = None, False, False
+        duration = title = byte_range = decrypt_info = None
+        last_end = 0  # End of the last sub-range, where the next one starts by default
+
+        def parse_byte_range(value):
+            nonlocal last_end
+            length, _, offset = value.partition('@')
+            start = int(offset) if offset else last_end
+            last_end = start + int(length)
+            return start, last_end
+
+        for line in doc.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            elif not line.startswith('#'):
+                if self.target_duration is None and not has_extinf:
+                    self.streams.append((stream_inf or {}, self.resolve_url(line)))
+                    stream_inf = None
+                    continue
+                sequence = media_sequence + index
+                index += 1
+                if self._last_sequence is None or sequence > self._last_sequence:
+                    if init_pending:
+                        new_segments.append(init)
+                        self._last_init = init.url, init.byte_range
+                    new_segments.append(HlsSegment(
+                        self.resolve_url(line), duration=duration, title=title, media_sequence=sequence,
+                        discontinuity=discontinuity, byte_range=byte_range, decrypt_info=decrypt_info, is_ad=is_ad))
+                duration = title = byte_range = None
+                has_extinf = init_pending = after_discontinuity = False
+                continue
+            elif line.startswith('#EXTINF:'):
+                duration, _, title = line[8:].partition(',')
+                duration, title, has_extinf = float_or_none(duration), title or None, True
+            elif line.startswith('#EXT-X-BYTERANGE:'):
+                byte_range = parse_byte_range(line[17:])
+            elif line.startswith('#EXT-X-KEY:'):
+                decrypt_info = self._decrypt_infos.get(line)
+                if decrypt_info is None:
+                    decrypt_info = self._decrypt_infos[line] = self._parse_key(line[11:])
+            elif line == '#EXT-X-DISCONTINUITY':
+                discontinuity += 1
+                after_discontinuity = True
+            elif line.startswith('#EXT-X-MAP:'):
+                map_info = parse_m3u8_attributes(line[11:])
+                init = HlsSegment(
+                    self.resolve_url(map_info['URI']), media_sequence=media_sequence + index,
+                    discontinuity=discontinuity, decrypt_info=decrypt_info, is_ad=is_ad, is_init=True,
+                    byte_range=map_info.get('BYTERANGE') and parse_byte_range(map_info['BYTERANGE']))
+                # The tag is repeated in every refresh of a live playlist, so it is only new if it
+                # applies to a new segment, and either changed or follows a discontinuity
+                init_pending = after_discontinuity or (init.url, init.byte_range) != self._last_init
+            elif line.startswith('#EXT-X-STREAM-INF:'):
+                stream_inf = parse_m3u8_attributes(line[18:])
+            elif line.startswith('#EXT-X-MEDIA:'):
+                self.media.append(parse_m3u8_attributes(line[13:]))
+            elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+                media_sequence = int(line[22:])
+                if media_sequence < self.media_sequence:
+                    # The numbering was restarted, e.g. by the encoder of a live stream
+                    self._last_sequence = None
+            elif line.startswith('#EXT-X-TARGETDURATION:'):
+                self.target_duration = float_or_none(line[22:], default=0)
+            elif line.startswith('#EXT-X-PLAYLIST-TYPE:'):
+                self.playlist_type = line[21:]
+            elif line == '#EXT-X-ENDLIST':
+                self.endlist = True
+            elif self._is_ad_start(line):
+                is_ad = True
+            elif self._is_ad_end(line):
+                is_ad = False
+            if not self.has_drm and self._DRM_RE.match(line):
+                self.has_drm = True
+
+        self.media_sequence, self.discontinuities = media_sequence, discontinuity
+        if index:
+            self._last_sequence = max(self._last_sequence or 0, media_sequence + index - 1)
+        self.segments.extend(new_segments)
+        return new_segments
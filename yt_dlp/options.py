@@ -430,6 +430,7 @@ def _alias_callback(option, opt_str, value, parser, opts, nargs):
                 'multistreams', 'no-live-chat', 'playlist-index', 'list-formats', 'no-direct-merge',
                 'no-youtube-channel-redirect', 'no-youtube-unavailable-videos', 'no-attach-info-json', 'embed-metadata',
                 'embed-thumbnail-atomicparsley', 'seperate-video-versions', 'no-clean-infojson', 'no-keep-subs', 'no-certifi',
+                'no-keep-alive',
             }, 'aliases': {
                 'youtube-dl': ['-multistreams', 'all'],
                 'youtube-dlc': ['-no-youtube-channel-redirect', '-no-live-chat', 'all'],
@@ -599,7 +600,10 @@ def _alias_callback(option, opt_str, value, parser, opts, nargs):
     selection.add_option(
         '--download-archive', metavar='FILE',
         dest='download_archive',
-        help='Download only videos not listed in the archive file. Record the IDs of all downloaded videos in it')
+        help=(
+            'Download only videos not listed in the archive file. Record the IDs of all downloaded videos in it. '
+            'Files with a .db, .sqlite or .sqlite3 extension are created as an indexed SQLite database, '
+            'which is faster for large archives'))
     selection.add_option(
         '--no-download-archive',
         dest='download_archive', action="store_const", const=None,
@@ -825,6 +829,29 @@ def _alias_callback(option, opt_str, value, parser, opts, nargs):
         '-N', '--concurrent-fragments',
         dest='concurrent_fragment_downloads', metavar='N', default=1, type=int,
         help='Number of fragments of a dash/hlsnative video that should be downloaded concurrently (default is %default)')
+    downloader.add_option(
+        '--adaptive-fragments',
+        action='store_true', dest='adaptive_fragment_downloads', default=False,
+        help=(
+            'Start with few concurrent fragment downloads and adjust their number per host to the observed '
+            'throughput, latency and rate limiting (HTTP 429/503), up to the value of --concurrent-fragments'))
+    downloader.add_option(
+        '--no-adaptive-fragments',
+        action='store_false', dest='adaptive_fragment_downloads',
+        help='Always download the number of fragments given by --concurrent-fragments concurrently (default)')
+    downloader.add_option(
+        '--parallel-videos',
+        dest='parallel_videos', metavar='N', default=1, type=int,
+        help=(
+            'Number of videos (playlist entries or URLs) to extract, download and post-process in parallel. '
+            'The output of each video is written in order, and --limit-rate and the sleep options apply to them '
+            'all combined (default is %default)'))
+    downloader.add_option(
+        '--http-connections',
+        dest='http_connections', metavar='N', default=1, type=int,
+        help=(
+            'Number of connections to use for downloading a non-fragmented file over HTTP, '
+            'each fetching a different byte range of it (default is %default)'))
     downloader.add_option(
         '-r', '--limit-rate', '--rate-limit',
         dest='ratelimit', metavar='RATE',
@@ -1401,10 +1428,29 @@ def _alias_callback(option, opt_str, value, parser, opts, nargs):
         help='Do not load cookies from browser (default)')
     filesystem.add_option(
         '--cache-dir', dest='cachedir', default=None, metavar='DIR',
-        help='Location in the filesystem where youtube-dl can store some downloaded information (such as client ids and signatures) permanently. By default $XDG_CACHE_HOME/yt-dlp or ~/.cache/yt-dlp')
+        help=(
+            'Location in the filesystem where youtube-dl can store some downloaded information (such as client ids and signatures) permanently. '
+            'A file with a .db, .sqlite or .sqlite3 extension is used as an SQLite database, which can be shared by many processes. '
+            'By default $XDG_CACHE_HOME/yt-dlp or ~/.cache/yt-dlp'))
     filesystem.add_option(
         '--no-cache-dir', action='store_false', dest='cachedir',
         help='Disable filesystem caching')
+    filesystem.add_option(
+        '--http-cache', metavar='IE_KEYS',
+        action='callback', dest='http_cache', type='str', default=[],
+        callback=_list_from_options_callback,
+        help=(
+            'Comma separated list of extractors whose webpages and API responses are cached in the cache dir. '
+            'Cached responses are reused while they are fresh, and revalidated with the server afterwards. '
+            'Requests with cookies or credentials are not cached'))
+    filesystem.add_option(
+        '--cache-max-size', metavar='SIZE', dest='cache_max_size',
+        help=(
+            'Maximum size of the cache dir (e.g. 50K or 4.2M), not counting the HTTP responses of --http-cache. '
+            'The least recently used entries are removed over it (default is 64M)'))
+    filesystem.add_option(
+        '--http-cache-max-size', metavar='SIZE', dest='http_cache_max_size',
+        help='Maximum size of the HTTP responses of --http-cache in the cache dir (default is 64M)')
     filesystem.add_option(
         '--rm-cache-dir',
         action='store_true', dest='rm_cachedir',
@@ -1679,6 +1725,13 @@ def _alias_callback(option, opt_str, value, parser, opts, nargs):
         '--no-force-keyframes-at-cuts',
         action='store_false', dest='force_keyframes_at_cuts',
         help='Do not force keyframes around the chapters when cutting/splitting (default)')
+    postproc.add_option(
+        '--postprocessing-queue',
+        dest='postprocessing_queue', metavar='N', default=0, type=int,
+        help=(
+            'Post-process the videos in the background while the next ones are downloaded, '
+            'letting up to N downloads wait to be post-processed (default is 0: '
+            'post-process each download before starting the next one)'))
     _postprocessor_opts_parser = lambda key, val='': (
         *(item.split('=', 1) for item in (val.split(';') if val else [])),
         ('key', remove_end(key, 'PP')))
@@ -1,9 +1,11 @@
 import atexit
 import base64
 import binascii
+import bisect
 import calendar
 import codecs
 import collections
+import concurrent.futures
 import contextlib
 import ctypes
 import datetime
@@ -29,6 +31,7 @@
 import platform
 import random
 import re
+import select
 import shlex
 import socket
 import ssl
@@ -36,6 +39,7 @@
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import traceback
 import types
@@ -1253,6 +1257,133 @@ def handle_youtubedl_headers(headers):
     return filtered_headers
 
 
+class HTTPConnectionPool:
+    """Idle keep-alive HTTP connections, keyed by scheme, host, tunnel and socks proxy"""
+
+    def __init__(self, max_per_host=8, idle_timeout=30):
+        self.max_per_host, self.idle_timeout = max_per_host, idle_timeout
+        self._idle = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_dropped(conn):
+        # An idle connection must not have anything to read; else the server has closed it
+        if conn.sock is None:
+            return True
+        try:
+            return bool(select.select([conn.sock], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    def _evict(self, now):
+        for key, conns in list(self._idle.items()):
+            while conns and now - conns[0][1] > self.idle_timeout:
+                conns.popleft()[0].close()
+            if not conns:
+                del self._idle[key]
+
+    def get(self, key):
+        """Return an idle connection for the key, or None"""
+        with self._lock:
+            self._evict(time.monotonic())
+            conns = self._idle.get(key)
+            while conns:
+                conn, _ = conns.pop()
+                if not self._is_dropped(conn):
+                    return conn
+                conn.close()
+
+    def put(self, key, conn):
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            conns = self._idle[key]
+            conns.append((conn, now))
+            while len(conns) > self.max_per_host:
+                conns.popleft()[0].close()
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn, _ in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+class _PooledHTTPResponse(http.client.HTTPResponse):
+    """HTTPResponse that releases its connection once the body has been read or the response closed"""
+    _ytdl_release = None
+    _ytdl_complete = False
+
+    def _read_and_discard_trailer(self):
+        super()._read_and_discard_trailer()
+        self._ytdl_complete = True
+
+    def _close_conn(self):
+        # The connection can only be reused if no part of the body is left unread
+        complete = self._ytdl_complete or self.length == 0
+        super()._close_conn()
+        release, self._ytdl_release = self._ytdl_release, None
+        if release:
+            release(complete and not self.will_close)
+
+
+# Errors of a reused connection that the server closed while it was idle
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+# Methods of the requests that can be sent again if a reused connection fails.
+# The server may have already processed e.g. a POST before closing the connection
+_RETRYABLE_METHODS = ('GET', 'HEAD')
+
+
+def _do_pooled_open(ydl_handler, http_class, req, pool_key, **http_conn_args):
+    """Same as urllib.request.AbstractHTTPHandler.do_open, but reuses connections from the pool"""
+    pool = ydl_handler._connection_pool
+    if not req.host:
+        raise urllib.error.URLError('no host given')
+
+    headers = dict(req.unredirected_hdrs)
+    headers.update({k: v for k, v in req.headers.items() if k not in headers})
+    headers['Connection'] = 'keep-alive'
+    headers = {name.title(): val for name, val in headers.items()}
+
+    tunnel_headers = {}
+    if req._tunnel_host and 'Proxy-Authorization' in headers:
+        tunnel_headers['Proxy-Authorization'] = headers.pop('Proxy-Authorization')
+
+    while True:
+        conn = pool.get(pool_key)
+        reused = conn is not None
+        if reused:
+            conn.timeout = req.timeout
+            conn.sock.settimeout(req.timeout)
+        else:
+            conn = http_class(req.host, timeout=req.timeout, **http_conn_args)
+            conn.set_debuglevel(ydl_handler._debuglevel)
+            conn.response_class = _PooledHTTPResponse
+            if req._tunnel_host:
+                conn.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+        try:
+            try:
+                conn.request(req.get_method(), req.selector, req.data, headers,
+                             encode_chunked=req.has_header('Transfer-encoding'))
+            except OSError as err:  # timeout error
+                raise urllib.error.URLError(err)
+            resp = conn.getresponse()
+        except BaseException as err:
+            conn.close()
+            if (reused and req.get_method() in _RETRYABLE_METHODS
+                    and isinstance(getattr(err, 'reason', err), _STALE_CONNECTION_ERRORS)):
+                continue
+            raise
+        break
+
+    if not resp.will_close:
+        resp._ytdl_release = lambda reusable: pool.put(pool_key, conn) if reusable else conn.close()
+    resp.url = req.get_full_url()
+    resp.msg = resp.reason
+    return resp
+
+
 class YoutubeDLHandler(urllib.request.HTTPHandler):
     """Handler for HTTP requests and responses.
 
@@ -1271,9 +1402,10 @@ class YoutubeDLHandler(urllib.request.HTTPHandler):
     public domain.
     """
 
-    def __init__(self, params, *args, **kwargs):
+    def __init__(self, params, *args, connection_pool=None, **kwargs):
         urllib.request.HTTPHandler.__init__(self, *args, **kwargs)
         self._params = params
+        self._connection_pool = connection_pool
 
     def http_open(self, req):
         conn_class = http.client.HTTPConnection
@@ -1282,9 +1414,10 @@ def http_open(self, req):
             conn_class = make_socks_conn_class(conn_class, socks_proxy)
             del req.headers['Ytdl-socks-proxy']
 
-        return self.do_open(functools.partial(
-            _create_http_connection, self, conn_class, False),
-            req)
+        conn_class = functools.partial(_create_http_connection, self, conn_class, False)
+        if self._connection_pool is not None:
+            return _do_pooled_open(self, conn_class, req, ('http', req.host, req._tunnel_host, socks_proxy))
+        return self.do_open(conn_class, req)
 
     @staticmethod
     def deflate(data):
@@ -1421,10 +1554,11 @@ def connect(self):
 
 
 class YoutubeDLHTTPSHandler(urllib.request.HTTPSHandler):
-    def __init__(self, params, https_conn_class=None, *args, **kwargs):
+    def __init__(self, params, https_conn_class=None, *args, connection_pool=None, **kwargs):
         urllib.request.HTTPSHandler.__init__(self, *args, **kwargs)
         self._https_conn_class = https_conn_class or http.client.HTTPSConnection
         self._params = params
+        self._connection_pool = connection_pool
 
     def https_open(self, req):
         kwargs = {}
@@ -1439,9 +1573,12 @@ def https_open(self, req):
             conn_class = make_socks_conn_class(conn_class, socks_proxy)
             del req.headers['Ytdl-socks-proxy']
 
+        conn_class = functools.partial(_create_http_connection, self, conn_class, True)
         try:
-            return self.do_open(
-                functools.partial(_create_http_connection, self, conn_class, True), req, **kwargs)
+            if self._connection_pool is not None:
+                return _do_pooled_open(
+                    self, conn_class, req, ('https', req.host, req._tunnel_host, socks_proxy), **kwargs)
+            return self.do_open(conn_class, req, **kwargs)
         except urllib.error.URLError as e:
             if (isinstance(e.reason, ssl.SSLError)
                     and getattr(e.reason, 'reason', None) == 'SSLV3_ALERT_HANDSHAKE_FAILURE'):
@@ -1657,6 +1794,256 @@ def redirect_request(self, req, fp, code, msg, headers, newurl):
             unverifiable=True, method=m)
 
 
+class _PrefixedReader(io.RawIOBase):
+    """The rest of a stream, preceded by the bytes that were already read from it"""
+
+    def __init__(self, prefix, stream):
+        self._prefix, self._pos, self._stream = prefix, 0, stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._pos < len(self._prefix):
+            data = self._prefix[self._pos:self._pos + len(b)]
+            self._pos += len(data)
+        else:
+            data = self._stream.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._stream.close()
+        super().close()
+
+
+class HTTPCacheHandler(urllib.request.BaseHandler):
+    """
+    Cache of the responses to GET requests with a "Ytdl-http-cache" header
+
+    The responses are stored in the "http" section of a yt-dlp Cache. Fresh responses
+    (RFC 9111 Cache-Control max-age or Expires) are served without making a request, and
+    stale ones are revalidated with If-None-Match/If-Modified-Since. Responses that are
+    neither fresh nor have a validator are not stored, and neither are the responses that
+    set cookies or the responses to requests with cookies or credentials. A stored response
+    is only reused for requests with the same values of the headers listed in its Vary header
+    """
+
+    # Before the HTTP handlers, and before 304 responses are turned into errors
+    handler_order = 400
+    SECTION = 'http'
+    # Responses bigger than this are not stored
+    MAX_SIZE = 4 * 1024 * 1024
+    # Headers that must not be replayed from the cache
+    _UNCACHED_HEADERS = ('set-cookie', 'connection', 'keep-alive', 'transfer-encoding')
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    @staticmethod
+    def _cache_control(headers):
+        directives = {}
+        for directive in ','.join(headers.get_all('Cache-Control') or ()).split(','):
+            name, _, value = directive.strip().partition('=')
+            if name:
+                directives[name.lower()] = value.strip('"')
+        return directives
+
+    @staticmethod
+    def _parse_http_date(value):
+        date = value and email.utils.parsedate_tz(value)
+        return date and email.utils.mktime_tz(date)
+
+    def _expires(self, headers, now):
+        """@returns The time until which the response is fresh, or None if it has to be revalidated"""
+        cache_control = self._cache_control(headers)
+        if 'no-cache' in cache_control:
+            return None
+        if 'max-age' in cache_control:
+            lifetime = int_or_none(cache_control['max-age'], default=0)
+        elif headers.get('Expires'):
+            lifetime = (self._parse_http_date(headers['Expires']) or 0) - (
+                self._parse_http_date(headers.get('Date')) or now)
+        else:
+            return None
+        expires = now + lifetime - (int_or_none(headers.get('Age')) or 0)
+        return expires if expires > now else None
+
+    @staticmethod
+    def _vary(req, headers):
+        """@returns The values in the request of the headers the response varies by"""
+        return {
+            name: req.get_header(name.capitalize())
+            for name in map(str.strip, ','.join(headers.get_all('Vary') or ()).lower().split(',')) if name}
+
+    @staticmethod
+    def _headers(entry):
+        headers = http.client.HTTPMessage()
+        for name, value in entry['headers']:
+            headers[name] = value
+        return headers
+
+    def _cached_response(self, entry):
+        resp = urllib.request.addinfourl(
+            io.BytesIO(base64.b64decode(entry['body'])), self._headers(entry), entry['url'], 200)
+        resp.msg = 'OK'
+        return resp
+
+    def http_open(self, req):
+        if req.headers.pop('Ytdl-http-cache', None) is None or req.get_method() != 'GET' or req.data is not None:
+            return None
+        elif req.has_header('Cookie') or req.has_header('Authorization'):
+            # The response may be specific to the user. The cookies of the cookiejar have
+            # already been added by HTTPCookieProcessor.http_request at this point
+            return None
+        req._http_cache_key = hashlib.sha256(req.get_full_url().encode()).hexdigest()
+        entry = self._cache.load(self.SECTION, req._http_cache_key)
+        if entry and any(req.get_header(name.capitalize()) != value for name, value in entry.get('vary', {}).items()):
+            entry = None
+        req._http_cache_entry = entry
+        if not entry:
+            return None
+        elif entry['expires'] and entry['expires'] > time.time():
+            req._http_cache_key = None
+            return self._cached_response(entry)
+        if entry.get('etag'):
+            req.add_header('If-none-match', entry['etag'])
+        if entry.get('last_modified'):
+            req.add_header('If-modified-since', entry['last_modified'])
+        return None
+
+    def http_response(self, req, resp):
+        key = getattr(req, '_http_cache_key', None)
+        if key is None:
+            return resp
+        entry, now = req._http_cache_entry, time.time()
+        if resp.code == 304 and entry:
+            resp.read()
+            # The stored headers are freshened with those of the 304 response (RFC 9111 §4.3.4)
+            headers = self._headers(entry)
+            # The Age of the stored response no longer applies
+            for name in {name.lower() for name in resp.headers.keys()} | {'age'}:
+                if name in self._UNCACHED_HEADERS or name == 'content-length':
+                    continue
+                del headers[name]
+                for value in resp.headers.get_all(name, ()):
+                    headers[name] = value
+            entry['headers'] = headers.items()
+            entry['expires'] = self._expires(headers, now)
+            entry['etag'] = headers.get('ETag')
+            entry['last_modified'] = headers.get('Last-Modified')
+            self._cache.store(self.SECTION, key, entry)
+            new_resp = self._cached_response(entry)
+            # The cookies are not stored, but are still set by HTTPCookieProcessor.http_response
+            for value in resp.headers.get_all('Set-Cookie', ()):
+                new_resp.headers['Set-Cookie'] = value
+            return new_resp
+
+        cache_control = self._cache_control(resp.headers)
+        vary = self._vary(req, resp.headers)
+        if resp.code != 200 or 'no-store' in cache_control or '*' in vary or resp.headers.get('Set-Cookie'):
+            # A cached response would not set the cookies that the extractor may depend on
+            return resp
+        expires = self._expires(resp.headers, now)
+        etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+        if not (expires or etag or last_modified) or (int_or_none(resp.headers.get('Content-Length')) or 0) > self.MAX_SIZE:
+            return resp
+
+        # The size may not be known in advance, and the response may be a whole video
+        body = resp.read(self.MAX_SIZE + 1)
+        if len(body) > self.MAX_SIZE:
+            new_resp = urllib.request.addinfourl(
+                io.BufferedReader(_PrefixedReader(body, resp)), resp.headers, resp.url, resp.code)
+            new_resp.msg = resp.msg
+            return new_resp
+        new_resp = urllib.request.addinfourl(io.BytesIO(body), resp.headers, resp.url, resp.code)
+        new_resp.msg = resp.msg
+        self._cache.store(self.SECTION, key, {
+            'url': resp.url,
+            'headers': [(name, value) for name, value in resp.headers.items()
+                        if name.lower() not in self._UNCACHED_HEADERS],
+            'body': base64.b64encode(body).decode(),
+            'expires': expires,
+            'etag': etag,
+            'last_modified': last_modified,
+            'vary': vary,
+        })
+        return new_resp
+
+    https_open = http_open
+    https_response = http_response
+
+
+class RequestCoalescer:
+    """
+    Shares the response to a GET request with the identical requests made while it is in flight
+
+    Only the requests with a "Ytdl-coalesce" header are coalesced, since the downloads of
+    media and fragments read their responses themselves. The body is only read into memory
+    when there are requests waiting for it, and is only shared if it is at most MAX_SIZE;
+    otherwise, the waiting requests are made on their own
+    """
+
+    MAX_SIZE = 4 * 1024 * 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    @staticmethod
+    def _key(req):
+        if req.headers.pop('Ytdl-coalesce', None) is None or req.get_method() != 'GET' or req.data is not None:
+            return None
+        return req.get_full_url(), tuple(sorted((name.lower(), value) for name, value in req.header_items()))
+
+    @staticmethod
+    def _response(url, code, msg, headers, body):
+        # Every waiter gets its own copy, since the handlers modify the headers
+        message = http.client.HTTPMessage()
+        for name, value in headers:
+            message[name] = value
+        resp = urllib.request.addinfourl(io.BytesIO(body), message, url, code)
+        resp.msg = msg
+        return resp
+
+    def open(self, open_func, req):
+        """Return open_func(req), or the response to an identical request that is in flight"""
+        key = self._key(req)
+        if key is None:
+            return open_func(req)
+        with self._lock:
+            flight = self._in_flight.get(key)
+            if flight:
+                flight[1] += 1
+            else:
+                self._in_flight[key] = [concurrent.futures.Future(), 0]
+        if flight:
+            shared = flight[0].result()
+            return self._response(*shared) if shared else open_func(req)
+
+        shared = None
+        try:
+            resp = open_func(req)
+            with self._lock:
+                waiters = self._in_flight[key][1]
+            if not waiters or (int_or_none(resp.headers.get('Content-Length')) or 0) > self.MAX_SIZE:
+                return resp
+            # The size may not be known in advance, and the response may be a whole video
+            body = resp.read(self.MAX_SIZE + 1)
+            if len(body) > self.MAX_SIZE:
+                new_resp = urllib.request.addinfourl(
+                    io.BufferedReader(_PrefixedReader(body, resp)), resp.headers, resp.url, resp.code)
+                new_resp.msg = resp.msg
+                return new_resp
+            resp.close()
+            shared = resp.url, resp.code, resp.msg, resp.headers.items(), body
+            return self._response(*shared)
+        finally:
+            with self._lock:
+                future, _ = self._in_flight.pop(key)
+            future.set_result(shared)
+
+
 def extract_timezone(date_str):
     if m := re.search(
         r'''(?x)
@@ -2672,6 +3059,92 @@ def __str__(self):
         return repr(self.exhaust())
 
 
+class SegmentTemplateFragments(collections.abc.Sequence):
+    """Fragments of a DASH SegmentTemplate that are only built when accessed
+
+    A long manifest describes hundreds of thousands of segments with just the
+    media template and a few runs of its SegmentTimeline, so they are kept in that form.
+    Slices are lists and to_dict/from_dict give the compact form used in the info json
+
+    @param template        Media template with %(Number)d, %(Time)d and %(Bandwidth)d fields
+    @param location_key    Key of the location in the fragments ("url" or "path")
+    @param timeline        Runs of the SegmentTimeline as (t, d, r) tuples.
+                           If missing, there are `count` segments of `segment_duration` seconds
+    @param initialization  The fragment of the initialization segment, if any
+    """
+
+    def __init__(self, template, location_key, *, start_number=1, timescale=1, bandwidth=None,
+                 timeline=None, count=0, segment_duration=None, initialization=None):
+        self.template, self.location_key = template, location_key
+        self.start_number, self.timescale, self.bandwidth = start_number, timescale, bandwidth
+        self.timeline = timeline and [tuple(run) for run in timeline]
+        self.segment_duration, self.initialization = segment_duration, initialization
+
+        # (first index, start time, duration, number of segments) of each run
+        self._runs = []
+        if self.timeline is not None:
+            count, segment_time = 0, 0
+            for t, d, r in self.timeline:
+                segment_time = t or segment_time
+                self._runs.append((count, segment_time, d, 1 + max(r, 0)))
+                count += 1 + max(r, 0)
+                segment_time += d * (1 + max(r, 0))
+        self._run_starts = [run[0] for run in self._runs]
+        self.count = count
+        self._offset = int(bool(initialization))
+
+    def _build(self, index):
+        params = {'Number': self.start_number + index, 'Bandwidth': self.bandwidth}
+        duration = self.segment_duration
+        if self.timeline is not None:
+            first, start_time, d, _ = self._runs[bisect.bisect_right(self._run_starts, index) - 1]
+            params['Time'] = start_time + (index - first) * d
+            duration = float_or_none(d, self.timescale)
+        return {
+            self.location_key: self.template % params,
+            'duration': duration,
+        }
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        elif not isinstance(idx, int):
+            raise TypeError('indices must be integers or slices')
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('fragment index out of range')
+        if idx < self._offset:
+            return dict(self.initialization)
+        return self._build(idx - self._offset)
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+    def __len__(self):
+        return self._offset + self.count
+
+    def __repr__(self):
+        return f'<{type(self).__name__} of {len(self)} fragments>'
+
+    def to_dict(self):
+        return {
+            'template': self.template,
+            'location_key': self.location_key,
+            'start_number': self.start_number,
+            'timescale': self.timescale,
+            'bandwidth': self.bandwidth,
+            'timeline': self.timeline,
+            'count': None if self.timeline is not None else self.count,
+            'segment_duration': self.segment_duration,
+            'initialization': self.initialization,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
 class PagedList:
 
     class IndexError(IndexError):
@@ -3503,7 +3976,11 @@ def filter_using_list(row, filterArray):
     return ret
 
 
-def _match_one(filter_part, dct, incomplete):
+@functools.lru_cache(maxsize=256)
+def _compile_match_one(filter_part):
+    """ Parse a single condition of a match filter
+    @returns    A function (dct, is_incomplete) -> bool that evaluates the condition
+    """
     # TODO: Generalize code with YoutubeDL._build_format_filter
     STRING_OPERATORS = {
         '*=': operator.contains,
@@ -3520,11 +3997,6 @@ def _match_one(filter_part, dct, incomplete):
         '=': operator.eq,
     }
 
-    if isinstance(incomplete, bool):
-        is_incomplete = lambda _: incomplete
-    else:
-        is_incomplete = lambda k: k in incomplete
-
     operator_rex = re.compile(r'''(?x)
         (?P<key>[a-z_]+)
         \s*(?P<negation>!\s*)?(?P<op>%s)(?P<none_inclusive>\s*\?)?\s*
@@ -3535,6 +4007,7 @@ def _match_one(filter_part, dct, incomplete):
         ''' % '|'.join(map(re.escape, COMPARISON_OPERATORS.keys())))
     if m := operator_rex.fullmatch(filter_part.strip()):
         m = m.groupdict()
+        key, none_inclusive = m['key'], bool(m['none_inclusive'])
         unnegated_op = COMPARISON_OPERATORS[m['op']]
         if m['negation']:
             op = lambda attr, value: not unnegated_op(attr, value)
@@ -3543,26 +4016,33 @@ def _match_one(filter_part, dct, incomplete):
         comparison_value = m['quotedstrval'] or m['strval'] or m['intval']
         if m['quote']:
             comparison_value = comparison_value.replace(r'\%s' % m['quote'], m['quote'])
-        actual_value = dct.get(m['key'])
-        numeric_comparison = None
-        if isinstance(actual_value, (int, float)):
-            # If the original field is a string and matching comparisonvalue is
-            # a number we should respect the origin of the original field
-            # and process comparison value as a string (see
-            # https://github.com/ytdl-org/youtube-dl/issues/11082)
-            try:
-                numeric_comparison = int(comparison_value)
-            except ValueError:
-                numeric_comparison = parse_filesize(comparison_value)
-                if numeric_comparison is None:
-                    numeric_comparison = parse_filesize(f'{comparison_value}B')
-                if numeric_comparison is None:
-                    numeric_comparison = parse_duration(comparison_value)
-        if numeric_comparison is not None and m['op'] in STRING_OPERATORS:
-            raise ValueError(f"Operator {m['op']} only supports string values!")
-        if actual_value is None:
-            return is_incomplete(m['key']) or m['none_inclusive']
-        return op(actual_value, comparison_value if numeric_comparison is None else numeric_comparison)
+        # If the original field is a string and matching comparisonvalue is
+        # a number we should respect the origin of the original field
+        # and process comparison value as a string (see
+        # https://github.com/ytdl-org/youtube-dl/issues/11082).
+        # So the numeric value is only used for numeric fields
+        try:
+            numeric_comparison = int(comparison_value)
+        except ValueError:
+            numeric_comparison = parse_filesize(comparison_value)
+            if numeric_comparison is None:
+                numeric_comparison = parse_filesize(f'{comparison_value}B')
+            if numeric_comparison is None:
+                numeric_comparison = parse_duration(comparison_value)
+        string_only = m['op'] in STRING_OPERATORS
+
+        def compare(dct, is_incomplete):
+            actual_value = dct.get(key)
+            if numeric_comparison is not None and isinstance(actual_value, (int, float)):
+                if string_only:
+                    raise ValueError(f"Operator {m['op']} only supports string values!")
+                value = numeric_comparison
+            else:
+                value = comparison_value
+            if actual_value is None:
+                return is_incomplete(key) or none_inclusive
+            return op(actual_value, value)
+        return compare
 
     UNARY_OPERATORS = {
         '': lambda v: (v is True) if isinstance(v, bool) else (v is not None),
@@ -3572,15 +4052,36 @@ def _match_one(filter_part, dct, incomplete):
         (?P<op>%s)\s*(?P<key>[a-z_]+)
         ''' % '|'.join(map(re.escape, UNARY_OPERATORS.keys())))
     if m := operator_rex.fullmatch(filter_part.strip()):
-        op = UNARY_OPERATORS[m['op']]
-        actual_value = dct.get(m['key'])
-        if is_incomplete(m['key']) and actual_value is None:
-            return True
-        return op(actual_value)
+        key, op = m['key'], UNARY_OPERATORS[m['op']]
+
+        def check(dct, is_incomplete):
+            actual_value = dct.get(key)
+            if actual_value is None and is_incomplete(key):
+                return True
+            return op(actual_value)
+        return check
 
     raise ValueError('Invalid filter part %r' % filter_part)
 
 
+@functools.lru_cache(maxsize=256)
+def compile_match_str(filter_str):
+    """ Parse a filter for match_str once so that it can be evaluated cheaply
+    @returns    A function (dct, incomplete=False) -> bool equivalent to match_str
+    """
+    conditions = tuple(
+        _compile_match_one(filter_part.replace(r'\&', '&'))
+        for filter_part in re.split(r'(?<!\\)&', filter_str))
+
+    def matches(dct, incomplete=False):
+        if isinstance(incomplete, bool):
+            is_incomplete = lambda _: incomplete
+        else:
+            is_incomplete = incomplete.__contains__
+        return all(condition(dct, is_incomplete) for condition in conditions)
+    return matches
+
+
 def match_str(filter_str, dct, incomplete=False):
     """ Filter a dictionary with a simple string syntax.
     @returns           Whether the filter passes
@@ -3588,9 +4089,7 @@ def match_str(filter_str, dct, incomplete=False):
                        Can be True/False to indicate all/none of the keys may be missing.
                        All conditions on incomplete keys pass if the key is missing
     """
-    return all(
-        _match_one(filter_part.replace(r'\&', '&'), dct, incomplete)
-        for filter_part in re.split(r'(?<!\\)&', filter_str))
+    return compile_match_str(filter_str)(dct, incomplete)
 
 
 def match_filter_func(filters):
@@ -3601,9 +4100,11 @@ def match_filter_func(filters):
     interactive = '-' in filters
     if interactive:
         filters.remove('-')
+    # Invalid filters are only reported when they are used
+    matchers = [functools.partial(match_str, f) for f in filters]
 
     def _match_func(info_dict, incomplete=False):
-        if not filters or any(match_str(f, info_dict, incomplete) for f in filters):
+        if not filters or any(matches(info_dict, incomplete) for matches in matchers):
             return NO_DEFAULT if interactive and not incomplete else None
         video_title = info_dict.get('title') or info_dict.get('id') or 'video'
         filter_str = ') | ('.join(map(str.strip, filters))
@@ -5530,6 +6031,32 @@ def items_(self):
         return self.__dict__.items()
 
 
+class RateLimiter:
+    """Limits the combined speed of the downloads sharing it, across threads"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_time = time.time()
+
+    def slow_down(self, start_time, byte_counter):
+        """Sleep for as long as receiving the bytes since the last call takes at the rate
+        @param start_time      Time the download of the current thread started at
+        @param byte_counter    Number of bytes received since start_time
+        """
+        last_start_time, last_byte_counter = getattr(self._local, 'last', (None, 0))
+        received = byte_counter - (last_byte_counter if last_start_time == start_time else 0)
+        self._local.last = start_time, byte_counter
+        with self._lock:
+            now = time.time()
+            # Up to a second of unused rate may be made up for
+            self._next_time = max(self._next_time, now - 1) + received / self.rate
+            delay = self._next_time - now
+        if delay > 0:
+            time.sleep(delay)
+
+
 # Deprecated
 has_certifi = bool(certifi)
 has_websockets = bool(websockets)